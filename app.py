@@ -1,22 +1,31 @@
-from PIL import Image, ImageTk
-import subprocess
+import os
 import tkinter as tk
+import tkinter.filedialog as tkFileDialog
 import tkinter.font as tkFont
 import ttkbootstrap as ttk
 from enum import Enum
-from threading import Thread
-from queue import Queue
-
-from availablePrograms import AVAILABLE_PROGRAMS
-from customWidgets import ScrollableFrame, ProgramCheckbox, CollapsibleFrame
-
-class OperationType(str, Enum):
-    INSTALL = "install",
-    UNINSTALL = "uninstall"
-
-class WingetQueueSpecialMessage(str, Enum):
-    ENABLE_BUTTONS = "enable buttons",
-    EXIT = "exit"
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from customWidgets import ScrollableFrame, ProgramCheckbox, ProgramSelectionList, CollapsibleFrame, JobLog, JobLogList
+from iconAtlas import IconAtlas
+from appPaths import getDataFilePath
+from jobMetrics import RunMetrics
+from jobProgress import formatDuration
+from profiles import Profile, ProfileError, loadProfile, saveProfile, getProfilesDirectory, PROFILE_FILE_EXTENSION
+from startupTimer import StartupTimer
+from uiEvents import UiEventPump, JobStartedEvent, JobOutputEvent, JobFinishedEvent, AllJobsFinishedEvent, BatchProgressEvent, InstalledStateRefreshedEvent, UpgradeJobsListedEvent, IconAtlasPreparedEvent
+from wingetJobs import OperationType, JobPhase, WingetQueueMessage, DEFAULT_NUM_DOWNLOAD_WORKERS, MAX_NUM_DOWNLOAD_WORKERS
+
+# the engine is imported once the window is shown, see SimpleDownloaderApp.buildInStages
+if TYPE_CHECKING:
+    from engine import EngineOptions
+
+LAST_RUN_METRICS_FILE_NAME = "lastRunMetrics.json"
+LAST_RUN_TRACE_FILE_NAME = "lastRunTrace.json"
+# stages without progress output are estimated from the time they run, so the bar is also updated periodically
+PROGRESS_UPDATE_MILLISECONDS = 1000
+# programs added to the selection per idle callback while the window is built
+STARTUP_CHUNK_NUM_PROGRAMS = 250
 
 class Themes(str, Enum):
     DARKLY = "darkly",
@@ -26,179 +35,352 @@ class Themes(str, Enum):
     FLATLY = "flatly",
     JOURNAL = "journal"
 
-class WingetQueueMessage:
-    def __init__(self, programName : str, wingetId : str, operation : OperationType) -> None:
-        self.programName = programName
-        self.wingetId = wingetId
-        self.operation = operation
-
 class SimpleDownloaderApp:
     """
         Main class for Simple Downloader app
     """
 
-    def __init__(self) -> None:
+    def __init__(self, startupTimer : Optional[StartupTimer] = None) -> None:
+        self.mStartupTimer = startupTimer or StartupTimer()
+
+        # the catalog and the engine are loaded once the window is shown, see buildInStages
+        self.mCatalog = None
+        self.mNumColumns = 1
+        self.mEngine = None
+        self.mJobCounters = None
+        self.mUnfinishedBatch = None
+        self.mInstalledStateCache = None
+        self.mInstalledStateIndex = None
+
         # tkinter widgets and needed tk variables that must be globaly available
-        self.mRootElement = ttk.Window()
+        # the theme is applied when the window is created, switching it later restyles every widget
+        self.mRootElement = ttk.Window(themename=Themes.DARKLY.value)
         self.mRootFrame = ScrollableFrame(self.mRootElement)
+        self.mMainLabel = ttk.Label(self.mRootFrame, text="Loading programs...")
         self.mButtonFrame = ttk.Frame(self.mRootFrame)
         self.mInstallButton = ttk.Button(self.mButtonFrame, text="Install selected", command=self.onInstallButtonClicked)
         self.mUninstallButton = ttk.Button(self.mButtonFrame, text="Uninstall selected", command=self.onUninstallButtonClicked)
+        self.mUpgradeAllButton = ttk.Button(self.mButtonFrame, text="Upgrade all outdated", command=self.onUpgradeAllButtonClicked)
+        self.mResumeButton = ttk.Button(self.mButtonFrame, command=self.onResumeButtonClicked)
         self.mCurrentStatusVar = tk.StringVar()
         self.mCurrentStatusLabel = ttk.Label(self.mRootFrame, textvariable=self.mCurrentStatusVar)
         self.mProgressBarVar = tk.DoubleVar()
+        self.mRemainingTimeVar = tk.StringVar()
+        self.mRemainingTimeLabel = ttk.Label(self.mRootFrame, textvariable=self.mRemainingTimeVar)
         self.mSelectAllVar = tk.BooleanVar(value=False)
         self.mRequireUserInputVar = tk.BooleanVar(value=False)
-        self.mLogFrame = ScrollableFrame(self.mRootFrame, allowHorizontalScroll=False)
-        self.mAllLogsCollapsibleFrame = None
+        self.mNumDownloadWorkersVar = tk.IntVar(value=DEFAULT_NUM_DOWNLOAD_WORKERS)
+        self.mUseImportVar = tk.BooleanVar(value=False)
+        self.mSkipInstalledVar = tk.BooleanVar(value=True)
+        self.mUsePackageCacheVar = tk.BooleanVar(value=False)
+        self.mRetryFailedJobsVar = tk.BooleanVar(value=True)
+        self.mAllLogsCollapsibleFrame = CollapsibleFrame(self.mRootFrame, text='Detailed winget output per program', relief="raised", borderwidth=1)
+        self.mJobLogList = None
+        self.mProgramSelectionList = None
         self.mCurrentThemeVar = tk.StringVar(value=Themes.DARKLY)
+        self.mSearchVar = tk.StringVar()
 
         # other needed variables
-        self.mAllImages = dict()
+        self.mAllImages = None
+        # pending after() callbacks, cancelled when the window is closed
+        self.mIsClosing = False
+        self.mStartupAfterId = None
+        self.mProgressAfterId = None
         self.mProgramCheckboxes = list()
-        self.mNumJobs = 0
-        self.mTotalCompletedJobs = 0
-        self.mSuccessfulJobs = 0
-        self.mFailedJobs = 0
-        
-        # winget thread setup
-        self.wingetQueue = Queue()
-        self.wingetThread = Thread(target=self.wingetThreadFunc)
-        self.wingetThread.daemon = True
-        self.wingetThread.start()
+        self.mProgramCheckboxesBySection = dict()
+        self.mSingleProgramLogs = dict()
 
-        self.setupUI()
+        # timings of the last batch, including how long the main loop spent handling its events
+        self.mRunMetrics = RunMetrics()
+
+        # workers never touch tk widgets, they post events which are handled on the main loop
+        self.mUiEventPump = UiEventPump(self.mRootElement, self.handleUiEvent, recordRefresh=self.mRunMetrics.recordUiRefresh)
+
+        self.setupFirstScreen()
+        self.mStartupAfterId = self.mRootElement.after_idle(self.runStartupStage, self.buildInStages())
 
-    def wingetThreadFunc(self) -> None:
-        while True:
-            message = self.wingetQueue.get()
-            if message == WingetQueueSpecialMessage.EXIT:
-                break
-            elif message == WingetQueueSpecialMessage.ENABLE_BUTTONS:
-                self.enableButtons()
-            else:
-                assert isinstance(message, WingetQueueMessage)
-                self.handleSingleProgram(message.programName, message.wingetId, message.operation)
+    def buildInStages(self) -> Iterator[None]:
+        """
+            Builds everything that is not needed for the first paint, yielding to the main loop
+            between stages so the window stays responsive and is painted while it is built
+        """
+        # imported here because they (and the engine in particular) pull in most of the other modules
+        from catalog import CatalogError, loadProgramCatalog
+        from engine import WingetEngine
+        from jobJournal import JobJournal, loadUnfinishedBatch
+
+        try:
+            self.mCatalog = loadProgramCatalog()
+        except CatalogError as e:
+            self.mMainLabel.configure(text=f"Could not load the program catalog: {e}")
+            return
+        self.mNumColumns = len(self.mCatalog.getSectionNames())
+        self.mStartupTimer.mark("catalog loaded")
+        yield
+
+        # the engine runs the jobs on its worker pool, counters are shared between all workers
+        # jobs are journaled on disk, so a batch interrupted by a crash or reboot can be resumed
+        self.mEngine = WingetEngine(self.mUiEventPump.post, journal=JobJournal(), programCatalog=self.mCatalog, metrics=self.mRunMetrics)
+        self.mUnfinishedBatch = loadUnfinishedBatch()
+        self.mJobCounters = self.mEngine.counters
+
+        # snapshot of installed programs, used to skip jobs that would not change anything
+        self.mInstalledStateCache = self.mEngine.installedStateCache
+        self.mInstalledStateIndex = self.mInstalledStateCache.load()
+        self.mStartupTimer.mark("engine created")
+        yield
+
+        for sectionName in self.mCatalog.getSectionNames():
+            programs = self.mCatalog.getPrograms(sectionName)
+            programCheckboxes = self.mProgramCheckboxesBySection.setdefault(sectionName, list())
+            for firstProgramIndex in range(0, len(programs), STARTUP_CHUNK_NUM_PROGRAMS):
+                programCheckboxes.extend(ProgramCheckbox(program.programName, program.wingetId) for program in programs[firstProgramIndex:firstProgramIndex + STARTUP_CHUNK_NUM_PROGRAMS])
+                yield
+            self.mProgramCheckboxes.extend(programCheckboxes)
+        self.mStartupTimer.mark("programs created")
+
+        self.setupUI()
+        self.mStartupTimer.mark("window built")
+        yield
+
+        self.mUiEventPump.start()
+        self.refreshInstalledState()
+        self.onStartupFinished()
+
+    def runStartupStage(self, startupStages : Iterator[None]) -> None:
+        self.mStartupAfterId = None
+        # the window may have been closed while the previous stage was waiting
+        if self.mIsClosing or not self.mRootElement.winfo_exists():
+            return
+        if next(startupStages, StopIteration) is not StopIteration and not self.mIsClosing:
+            # idle callbacks added while idle callbacks run wait for the next idle pass, after pending events and redraws
+            self.mStartupAfterId = self.mRootElement.after_idle(self.runStartupStage, startupStages)
+
+    def onStartupFinished(self) -> None:
+        timingsPath = self.mStartupTimer.getTimingsPath()
+        if timingsPath is not None:
+            # waits for the window to be painted, then reports the startup and closes the app
+            self.mRootElement.update_idletasks()
+            self.mStartupTimer.mark("startup finished")
+            self.mStartupTimer.write(timingsPath)
+            self.onMainWindowClosed()
 
     def onMainWindowClosed(self) -> None:
-        self.wingetQueue.put(WingetQueueSpecialMessage.EXIT)
+        if self.mIsClosing:
+            return
+        self.mIsClosing = True
+
+        for afterId in (self.mStartupAfterId, self.mProgressAfterId):
+            if afterId is not None:
+                self.mRootElement.after_cancel(afterId)
+        self.mStartupAfterId = None
+        self.mProgressAfterId = None
+
+        if self.mEngine is not None:
+            self.mEngine.stop()
+        self.mUiEventPump.stop()
         self.mRootElement.destroy()
 
+    def refreshInstalledState(self) -> None:
+        self.mInstalledStateCache.refreshInBackground(lambda index: self.mUiEventPump.post(InstalledStateRefreshedEvent(index)))
+
+    def onInstalledStateRefreshed(self, installedStateIndex) -> None:
+        if installedStateIndex is None:
+            return
+
+        self.mInstalledStateIndex = installedStateIndex
+        self.updateInstalledStateBadges()
+
+    def updateInstalledStateBadges(self) -> None:
+        if self.mInstalledStateIndex is None:
+            return
+
+        for programCheckbox in self.mProgramCheckboxes:
+            wingetId = programCheckbox.getWingetId()
+            programCheckbox.setInstalledState(self.mInstalledStateIndex.isInstalled(wingetId), self.mInstalledStateIndex.isUpgradeable(wingetId))
+
     def refreshEntireUI(self) -> None:
         self.mRootElement.update()
         self.mRootElement.update_idletasks()
 
     def resetVariablesAndUI(self) -> None:
-        self.mNumJobs = 0
-        self.mTotalCompletedJobs = 0
-        self.mSuccessfulJobs = 0
-        self.mFailedJobs = 0
+        self.mJobCounters.reset()
+        self.mSingleProgramLogs.clear()
         self.mCurrentStatusVar.set("")
         self.mProgressBarVar.set(0)
+        self.mRemainingTimeVar.set("")
 
-        for widget in self.mLogFrame.innerFrame.winfo_children():
-            widget.destroy()
-
-        self.mAllLogsCollapsibleFrame = CollapsibleFrame(self.mLogFrame, text='Detailed winget output per program', relief="raised", borderwidth=1)
-        self.mAllLogsCollapsibleFrame.grid(row=0, column=0, columnspan=len(AVAILABLE_PROGRAMS), sticky="we")
+        self.mJobLogList.clear()
 
         self.refreshEntireUI()
 
-    def handleSingleProgram(self, programName : str, wingetId : str, operation : OperationType) -> None:
-        singleProgramLog = CollapsibleFrame(self.mAllLogsCollapsibleFrame.subFrame, text=f"{programName}", relief="raised", borderwidth=1)
-        singleProgramLog.grid(pady=2, padx=2, sticky="we")
-
-        wingetOutputTextArea = tk.Text(singleProgramLog.subFrame, wrap=tk.WORD, width=150, height=5)
-        wingetOutputTextArea.grid(padx=10, pady=10)
-
-        handledSuccessfully = False
-
+    def getSingleProgramLog(self, job : WingetQueueMessage) -> JobLog:
+        if job not in self.mSingleProgramLogs:
+            singleProgramLog = JobLog(f"{job.programName}")
+            self.mJobLogList.addJobLog(singleProgramLog)
+            self.mSingleProgramLogs[job] = singleProgramLog
+
+        return self.mSingleProgramLogs[job]
+
+    def handleUiEvent(self, event) -> None:
+        if isinstance(event, JobStartedEvent):
+            self.onJobStarted(event.job, event.phase, event.command)
+        elif isinstance(event, JobOutputEvent):
+            self.getSingleProgramLog(event.job).append(event.text)
+        elif isinstance(event, JobFinishedEvent):
+            self.onJobFinished(event.job, event.handledSuccessfully)
+        elif isinstance(event, BatchProgressEvent):
+            self.updateProgress()
+        elif isinstance(event, AllJobsFinishedEvent):
+            self.updateProgress()
+            self.enableButtons()
+            self.showBatchSummary()
+            self.exportRunMetrics()
+            self.mInstalledStateIndex = None
+            self.refreshInstalledState()
+        elif isinstance(event, InstalledStateRefreshedEvent):
+            self.onInstalledStateRefreshed(event.installedStateIndex)
+        elif isinstance(event, UpgradeJobsListedEvent):
+            self.onUpgradeJobsListed(event.jobs)
+        elif isinstance(event, IconAtlasPreparedEvent):
+            self.mAllImages.loadPreparedAtlas()
+
+    def showBatchSummary(self) -> None:
+        summaryParts = list()
+        if self.mJobCounters.failedJobs:
+            summaryParts.append(f"{self.mJobCounters.failedJobs} of {self.mJobCounters.numJobs} programs failed")
+        if self.mJobCounters.failureCategories:
+            summaryParts.append(", ".join(f"{category}: {count}" for category, count in sorted(self.mJobCounters.failureCategories.items())))
+
+        packageCache = self.mEngine.packageCache
+        if self.mEngine.usePackageCache and packageCache is not None:
+            stats = packageCache.stats.toDict()
+            summaryParts.append(f"Package cache: {stats['hits'] + stats['mirrorHits']} hits ({stats['mirrorHits']} from the mirror), {stats['misses']} misses")
+
+        if summaryParts:
+            self.mCurrentStatusVar.set(" | ".join(summaryParts))
+
+    def exportRunMetrics(self) -> None:
         try:
-            wingetOutputTextArea.insert(tk.END, f"Installing {programName}...\n")
-
-            self.mCurrentStatusVar.set(f"{self.mTotalCompletedJobs + 1}/{self.mNumJobs} Installing {programName}...")
-            self.refreshEntireUI()
-            
-            wingetOptions = ["winget", operation.value, "-e", "--id", wingetId]
-
-            if operation == OperationType.INSTALL:
-                wingetOptions.append("--accept-package-agreements")
-                wingetOptions.append("--accept-source-agreements")
-
-            if self.mRequireUserInputVar.get() == False:
-                wingetOptions.append("--silent")
-                wingetOptions.append("--disable-interactivity")
-
-            wingetOutputTextArea.insert(tk.END, f"Running winget with command:\n\t{' '.join(wingetOptions)}\n")
-
-            process = subprocess.Popen(wingetOptions, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-            
-            while process.poll() is None:
-                output = process.stdout.readline().strip()
-                if output and len(output) > 1:
-                    wingetOutputTextArea.insert(tk.END, f"{output}\n")
-                    self.refreshEntireUI()
-
-            if process.returncode == 0:
-                wingetOutputTextArea.insert(tk.END, f"{programName} has been {operation.value}ed successfully.\n")
-                handledSuccessfully = True
-            else:
-                additionalInfo = "already exists" if operation == OperationType.INSTALL else "does not exist"
-                wingetOutputTextArea.insert(tk.END, f"{programName} was not {operation.value}ed (an error occured or it {additionalInfo}).\n")
-
-        except Exception as e: 
-            wingetOutputTextArea.insert(tk.END, f"Failed to {operation.value} {programName}. Caught exception: {e}\n")
-
-        indicatorIconPath = ""
-        if handledSuccessfully:
-            self.mSuccessfulJobs += 1
-            indicatorIconName = "successIcon"
+            self.mRunMetrics.writeJson(getDataFilePath(LAST_RUN_METRICS_FILE_NAME))
+            self.mRunMetrics.writeChromeTrace(getDataFilePath(LAST_RUN_TRACE_FILE_NAME))
+        except OSError:
+            pass
+
+    def onJobStarted(self, job : WingetQueueMessage, phase : JobPhase, wingetOptions : list) -> None:
+        singleProgramLog = self.getSingleProgramLog(job)
+
+        if phase == JobPhase.DOWNLOAD:
+            singleProgramLog.append(f"Downloading {job.programName}...\n")
+        elif phase == JobPhase.IMPORT:
+            singleProgramLog.append(f"Installing {job.programName} together with all other selected programs...\n")
+            self.mCurrentStatusVar.set(f"Installing {self.mJobCounters.numJobs} programs with a single winget run...")
         else:
-            self.mFailedJobs += 1
-            indicatorIconName = "errorIcon"
-
-        imageLabel = ttk.Label(singleProgramLog.mainFrame, image=self.mAllImages[indicatorIconName])
-        imageLabel.grid(row=0, column=2)
+            operationText = job.operation.getPresentParticiple().capitalize()
+            singleProgramLog.append(f"{operationText} {job.programName}...\n")
+            self.mCurrentStatusVar.set(f"{self.mJobCounters.totalCompletedJobs + 1}/{self.mJobCounters.numJobs} {operationText} {job.programName}...")
+
+        singleProgramLog.append(f"Running winget with command:\n\t{' '.join(wingetOptions)}\n")
+
+    def onJobFinished(self, job : WingetQueueMessage, handledSuccessfully : bool) -> None:
+        self.getSingleProgramLog(job).setResult(handledSuccessfully)
+
+        self.updateProgress()
+
+    def updateProgress(self) -> None:
+        # weighted by the expected duration of every job, so a long download moves the bar while it runs
+        batchProgress = self.mEngine.progress
+        self.mProgressBarVar.set(batchProgress.getFraction() * 100)
+        remainingSeconds = batchProgress.getRemainingSeconds()
+        self.mRemainingTimeVar.set(f"About {formatDuration(remainingSeconds)} left" if remainingSeconds is not None else "")
+
+    def scheduleProgressUpdates(self) -> None:
+        if self.mProgressAfterId is not None:
+            self.mRootElement.after_cancel(self.mProgressAfterId)
+        self.mProgressAfterId = None
+
+        self.updateProgress()
+        if self.mEngine.progress.isRunning():
+            self.mProgressAfterId = self.mRootElement.after(PROGRESS_UPDATE_MILLISECONDS, self.scheduleProgressUpdates)
+
+    def getSelectedJobs(self, operation : OperationType) -> list:
+        return [
+            WingetQueueMessage(programCheckbox.getProgramName(), programCheckbox.getWingetId(), operation)
+            for programCheckbox in self.mProgramCheckboxes if programCheckbox.isChecked()
+        ]
+
+    def getEngineOptions(self, useImport : bool = False) -> "EngineOptions":
+        from engine import EngineOptions
+        return EngineOptions(
+            requireUserInput=self.mRequireUserInputVar.get(),
+            numDownloadWorkers=self.mNumDownloadWorkersVar.get(),
+            useImport=useImport,
+            skipInstalled=self.mSkipInstalledVar.get(),
+            usePackageCache=self.mUsePackageCacheVar.get(),
+            retryFailedJobs=self.mRetryFailedJobsVar.get()
+        )
 
-        self.mTotalCompletedJobs += 1
-        self.mProgressBarVar.set(self.mTotalCompletedJobs * 100 / self.mNumJobs)
-        self.refreshEntireUI()
+    def runSelected(self, operation : OperationType, useImport : bool = False) -> None:
+        batchPlan = self.mEngine.runBatch(self.getSelectedJobs(operation), self.getEngineOptions(useImport), self.mInstalledStateIndex)
+        self.scheduleProgressUpdates()
+        if batchPlan.skippedJobs:
+            self.mCurrentStatusVar.set(f"Skipped {len(batchPlan.skippedJobs)} programs that need no changes")
 
     def installAllSelected(self) -> None:
-        for programCheckbox in self.mProgramCheckboxes:
-            if programCheckbox.isChecked():
-                self.wingetQueue.put(WingetQueueMessage(programCheckbox.getProgramName(), programCheckbox.getWingetId(), OperationType.INSTALL))
-        self.wingetQueue.put(WingetQueueSpecialMessage.ENABLE_BUTTONS)
+        self.runSelected(OperationType.INSTALL, useImport=self.mUseImportVar.get())
 
     def uninstallAllSelected(self) -> None:
-        for programCheckbox in self.mProgramCheckboxes:
-            if programCheckbox.isChecked():
-                self.wingetQueue.put(WingetQueueMessage(programCheckbox.getProgramName(), programCheckbox.getWingetId(), OperationType.UNINSTALL))
-        self.wingetQueue.put(WingetQueueSpecialMessage.ENABLE_BUTTONS)
+        self.runSelected(OperationType.UNINSTALL)
+
+    def upgradeAllOutdated(self) -> None:
+        # listing the outdated programs runs winget when the cached listing is stale, so it is not done on the UI thread
+        self.mCurrentStatusVar.set("Looking for programs with a newer version...")
+        self.mEngine.getUpgradeJobsInBackground(lambda jobs: self.mUiEventPump.post(UpgradeJobsListedEvent(jobs)))
+
+    def onUpgradeJobsListed(self, jobs : Optional[list]) -> None:
+        if not jobs:
+            self.mCurrentStatusVar.set("Could not list the available upgrades" if jobs is None else "All programs are up to date")
+            self.enableButtons()
+            return
+
+        self.mEngine.runBatch(jobs, self.getEngineOptions(), self.mInstalledStateIndex)
+        self.scheduleProgressUpdates()
+
+    def resumeUnfinishedBatch(self, unfinishedBatch) -> None:
+        from engine import EngineOptions
+        self.mEngine.runBatch(unfinishedBatch.jobs, EngineOptions.fromDict(unfinishedBatch.options), self.mInstalledStateIndex)
+        self.scheduleProgressUpdates()
+
+    def onResumeButtonClicked(self) -> None:
+        unfinishedBatch = self.mUnfinishedBatch
+        self.disableButtons()
+        self.resumeUnfinishedBatch(unfinishedBatch)
 
     def onInstallButtonClicked(self) -> None:
         self.disableButtons()
-        for programCheckbox in self.mProgramCheckboxes:
-            if programCheckbox.isChecked():
-                self.mNumJobs += 1
         self.installAllSelected()
 
     def onUninstallButtonClicked(self) -> None:
         self.disableButtons()
-        for programCheckbox in self.mProgramCheckboxes:
-            if programCheckbox.isChecked():
-                self.mNumJobs += 1
         self.uninstallAllSelected()
 
+    def onUpgradeAllButtonClicked(self) -> None:
+        self.disableButtons()
+        self.upgradeAllOutdated()
+
     def enableButtons(self) -> None:
         self.mInstallButton['state'] = tk.NORMAL
         self.mUninstallButton['state'] = tk.NORMAL
-        self.refreshEntireUI()
+        self.mUpgradeAllButton['state'] = tk.NORMAL
+        self.updateResumeButton()
 
     def disableButtons(self) -> None:
         self.resetVariablesAndUI()
         self.mInstallButton['state'] = tk.DISABLED
         self.mUninstallButton['state'] = tk.DISABLED
+        self.mUpgradeAllButton['state'] = tk.DISABLED
+        self.mUnfinishedBatch = None
+        self.updateResumeButton()
         self.refreshEntireUI()
 
     def selectAllPrograms(self) -> None:
@@ -209,27 +391,83 @@ class SimpleDownloaderApp:
         for checkbox in self.mProgramCheckboxes:
             checkbox.uncheck()
 
+    def getCurrentProfile(self, name : str) -> Profile:
+        selectedWingetIds = [programCheckbox.getWingetId() for programCheckbox in self.mProgramCheckboxes if programCheckbox.isChecked()]
+        return Profile(name, selectedWingetIds, OperationType.INSTALL, self.getEngineOptions(self.mUseImportVar.get()).toDict())
+
+    def applyProfile(self, profile : Profile) -> None:
+        from engine import EngineOptions
+        wingetIds = {wingetId.lower() for wingetId in profile.wingetIds}
+        for programCheckbox in self.mProgramCheckboxes:
+            programCheckbox.setChecked(programCheckbox.getWingetId().lower() in wingetIds)
+        self.mSelectAllVar.set(False)
+
+        options = EngineOptions.fromDict(profile.options)
+        self.mRequireUserInputVar.set(options.requireUserInput)
+        self.mNumDownloadWorkersVar.set(options.numDownloadWorkers)
+        self.mUseImportVar.set(options.useImport)
+        self.mSkipInstalledVar.set(options.skipInstalled)
+        self.mUsePackageCacheVar.set(options.usePackageCache)
+        self.mRetryFailedJobsVar.set(options.retryFailedJobs)
+
+        unknownWingetIds = wingetIds - {programCheckbox.getWingetId().lower() for programCheckbox in self.mProgramCheckboxes}
+        if unknownWingetIds:
+            self.mCurrentStatusVar.set(f"Loaded profile {profile.name}, {len(unknownWingetIds)} of its programs are not in the catalog")
+        else:
+            self.mCurrentStatusVar.set(f"Loaded profile {profile.name}")
+
+    def onSaveProfileButtonClicked(self) -> None:
+        profilePath = tkFileDialog.asksaveasfilename(
+            parent=self.mRootElement,
+            title="Save profile",
+            initialdir=getProfilesDirectory(),
+            defaultextension=PROFILE_FILE_EXTENSION,
+            filetypes=[("Profiles", f"*{PROFILE_FILE_EXTENSION}")]
+        )
+        if not profilePath:
+            return
+
+        profile = self.getCurrentProfile(os.path.splitext(os.path.basename(profilePath))[0])
+        try:
+            saveProfile(profile, profilePath)
+            self.mCurrentStatusVar.set(f"Saved profile {profile.name} with {len(profile.wingetIds)} programs")
+        except ProfileError as e:
+            self.mCurrentStatusVar.set(f"Could not save the profile: {e}")
+
+    def onLoadProfileButtonClicked(self) -> None:
+        profilePath = tkFileDialog.askopenfilename(
+            parent=self.mRootElement,
+            title="Load profile",
+            initialdir=getProfilesDirectory(),
+            filetypes=[("Profiles", f"*{PROFILE_FILE_EXTENSION}")]
+        )
+        if not profilePath:
+            return
+
+        try:
+            self.applyProfile(loadProfile(profilePath))
+        except ProfileError as e:
+            self.mCurrentStatusVar.set(f"Could not load the profile: {e}")
+
     def configureStyle(self) -> None:
         defaultFont = tkFont.nametofont("TkDefaultFont")
         defaultFont.configure(size=12)
 
     def loadResources(self) -> None:
-        # load all program icons
-        for _, progToWingetIdMap in AVAILABLE_PROGRAMS.items():
-            for programName, wingetId in progToWingetIdMap.items():
-                self.mAllImages[programName] = ImageTk.PhotoImage(Image.open(f"icons/{wingetId}.ico"))
-
-        # load other icons
-        self.mAllImages['successIcon'] = ImageTk.PhotoImage(Image.open("icons/success.ico"))
-        self.mAllImages['errorIcon'] = ImageTk.PhotoImage(Image.open("icons/error.ico"))
+        # icons are cut out of the atlas lazily, the first time a widget needs them,
+        # the atlas itself is checked (or built) in the background while the window is built
+        self.mAllImages = IconAtlas()
+        self.mAllImages.prepareInBackground(lambda: self.mUiEventPump.post(IconAtlasPreparedEvent()))
 
     def setTheme(self, themeName : str) -> None:
-        self.mRootElement.style.theme_use(themename=themeName)
+        # switching the theme restyles every widget, choosing the current one again does nothing
+        if themeName != self.mRootElement.style.theme_use():
+            self.mRootElement.style.theme_use(themename=themeName)
         self.mCurrentThemeVar.set(themeName)
 
     def setupTopBar(self) -> None:
         topBarFrame = ttk.Frame(self.mRootFrame)
-        topBarFrame.grid(row=0, column=0, sticky='w', columnspan=len(AVAILABLE_PROGRAMS))
+        topBarFrame.grid(row=0, column=0, sticky='w', columnspan=self.mNumColumns)
 
         themeLabel = ttk.Label(topBarFrame, text="Select theme:")
         themeLabel.grid(row=0, column=0)
@@ -244,9 +482,26 @@ class SimpleDownloaderApp:
         )
         themeOptions.grid(row=0, column=1)
 
+        searchLabel = ttk.Label(topBarFrame, text="Search:")
+        searchLabel.grid(row=0, column=2, padx=(20, 0))
+
+        searchEntry = ttk.Entry(topBarFrame, textvariable=self.mSearchVar, width=30)
+        searchEntry.grid(row=0, column=3)
+        self.mSearchVar.trace_add("write", lambda *_: self.filterPrograms(self.mSearchVar.get()))
+
+        saveProfileButton = ttk.Button(topBarFrame, text="Save profile", command=self.onSaveProfileButtonClicked)
+        saveProfileButton.grid(row=0, column=4, padx=(20, 0))
+
+        loadProfileButton = ttk.Button(topBarFrame, text="Load profile", command=self.onLoadProfileButtonClicked)
+        loadProfileButton.grid(row=0, column=5, padx=(5, 0))
+
+    def filterPrograms(self, query : str) -> None:
+        # only the list of rows is rebuilt, the row widgets are reused
+        self.mProgramSelectionList.setVisiblePrograms(self.mCatalog.search(query))
+
     def setupOptionsFrame(self) -> None:
         optionFrame = ttk.Frame(self.mRootFrame)
-        optionFrame.grid(row=2, column=0, columnspan=len(AVAILABLE_PROGRAMS))
+        optionFrame.grid(row=2, column=0, columnspan=self.mNumColumns)
 
         selectAllCheckbutton = tk.Checkbutton(
             optionFrame,
@@ -267,39 +522,80 @@ class SimpleDownloaderApp:
         )
         requireUserInputCheckutton.grid(row=1, column=1)
 
-    def setupProgramSelectionFrame(self) -> None:
-        allProgramSectionsFrame = ttk.Frame(self.mRootFrame)
-        allProgramSectionsFrame.grid(row=3, column=0, columnspan=len(AVAILABLE_PROGRAMS))
+        numDownloadWorkersLabel = ttk.Label(optionFrame, text="Parallel downloads:")
+        numDownloadWorkersLabel.grid(row=1, column=2)
 
-        currentSectionColumn = 0
-        for sectionName, progToWingetIdMap in AVAILABLE_PROGRAMS.items():
-            singleSectionFrame = ttk.LabelFrame(allProgramSectionsFrame)
-            singleSectionFrame.grid(row=0, column=currentSectionColumn, sticky="ns", padx=5, pady=10)
+        numDownloadWorkersSpinbox = ttk.Spinbox(
+            optionFrame,
+            from_=1,
+            to=MAX_NUM_DOWNLOAD_WORKERS,
+            width=3,
+            textvariable=self.mNumDownloadWorkersVar,
+            state="readonly"
+        )
+        numDownloadWorkersSpinbox.grid(row=1, column=3)
 
-            sectionLabel = ttk.Label(singleSectionFrame, text=sectionName)
-            sectionLabel.grid(row=0, column=0)
+        useImportCheckbutton = tk.Checkbutton(
+            optionFrame,
+            text="Install all selected programs with a single winget run",
+            variable=self.mUseImportVar,
+            onvalue=True,
+            offvalue=False
+        )
+        useImportCheckbutton.grid(row=1, column=4)
 
-            singleProgramRow = 1
-            for programName, wingetId in progToWingetIdMap.items():
-                checkboxAndIconFrame = ttk.Frame(singleSectionFrame)
-                checkboxAndIconFrame.grid(row=singleProgramRow, column=0, sticky="we")
+        skipInstalledCheckbutton = tk.Checkbutton(
+            optionFrame,
+            text="Skip programs that need no changes",
+            variable=self.mSkipInstalledVar,
+            onvalue=True,
+            offvalue=False
+        )
+        skipInstalledCheckbutton.grid(row=1, column=5)
 
-                imageLabel = ttk.Label(checkboxAndIconFrame, image=self.mAllImages[programName])
-                imageLabel.grid(row=0, column=0)
+        usePackageCacheCheckbutton = tk.Checkbutton(
+            optionFrame,
+            text="Install from the package cache",
+            variable=self.mUsePackageCacheVar,
+            onvalue=True,
+            offvalue=False
+        )
+        usePackageCacheCheckbutton.grid(row=1, column=6)
 
-                # checkboxes will have (row=0, column=1)
-                self.mProgramCheckboxes.append(ProgramCheckbox(programName, wingetId, checkboxAndIconFrame))
+        retryFailedJobsCheckbutton = tk.Checkbutton(
+            optionFrame,
+            text="Retry installs that failed for a transient reason",
+            variable=self.mRetryFailedJobsVar,
+            onvalue=True,
+            offvalue=False
+        )
+        retryFailedJobsCheckbutton.grid(row=1, column=7)
 
-                singleProgramRow += 1
-            
-            currentSectionColumn += 1
+    def setupProgramSelectionFrame(self) -> None:
+        # widgets are only created for the rows that are visible
+        self.mProgramSelectionList = ProgramSelectionList(self.mRootFrame, self.mProgramCheckboxesBySection, self.mAllImages.getImage, height=500)
+        self.mProgramSelectionList.grid(row=3, column=0, columnspan=self.mNumColumns, sticky="we", padx=5, pady=10)
 
     def setupButtonFrame(self) -> None:
-        self.mButtonFrame.grid(row=4, column=0, columnspan=len(AVAILABLE_PROGRAMS))
+        self.mButtonFrame.grid(row=4, column=0, columnspan=self.mNumColumns)
         self.mInstallButton.grid(row=0, column=0)
         self.mUninstallButton.grid(row=0, column=1)
+        self.mUpgradeAllButton.grid(row=0, column=2)
+        self.mResumeButton.grid(row=0, column=3)
+        self.updateResumeButton()
+
+    def updateResumeButton(self) -> None:
+        # only shown when the previous run was interrupted in the middle of a batch
+        if self.mUnfinishedBatch is None:
+            self.mResumeButton.grid_remove()
+        else:
+            self.mResumeButton.configure(text=f"Resume {len(self.mUnfinishedBatch.jobs)} unfinished jobs")
+            self.mResumeButton.grid()
 
-    def setupUI(self) -> None:
+    def setupFirstScreen(self) -> None:
+        """
+            The window with a loading message, shown before anything else is loaded
+        """
         self.loadResources()
         self.configureStyle()
 
@@ -307,23 +603,32 @@ class SimpleDownloaderApp:
         self.mRootElement.geometry("1920x1080")
         self.mRootElement.protocol("WM_DELETE_WINDOW", self.onMainWindowClosed)
         self.mRootFrame.pack(fill=tk.BOTH, expand=True)
-        self.setTheme(self.mCurrentThemeVar.get())
-        
+        self.mMainLabel.grid(row=1, column=0)
+
+        self.refreshEntireUI()
+        self.mStartupTimer.mark("first paint")
+
+    def setupUI(self) -> None:
         self.setupTopBar()
 
-        mainLabel = ttk.Label(self.mRootFrame, text="Select programs you wish to download:")
-        mainLabel.grid(row=1, column=0, columnspan=len(AVAILABLE_PROGRAMS))
+        self.mMainLabel.configure(text="Select programs you wish to download:")
+        self.mMainLabel.grid(row=1, column=0, columnspan=self.mNumColumns)
 
         self.setupOptionsFrame()
         self.setupProgramSelectionFrame()
+        self.updateInstalledStateBadges()
         self.setupButtonFrame()
 
         self.mCurrentStatusLabel.grid(row=4, column=0, sticky="we")
+        self.mRemainingTimeLabel.grid(row=4, column=self.mNumColumns - 1, sticky="e")
 
         progressBar = ttk.Progressbar(self.mRootFrame, orient=tk.HORIZONTAL, variable=self.mProgressBarVar)
-        progressBar.grid(row=5, column=0, sticky="we", columnspan=len(AVAILABLE_PROGRAMS), padx=10, pady=10)
+        progressBar.grid(row=5, column=0, sticky="we", columnspan=self.mNumColumns, padx=10, pady=10)
 
-        self.mLogFrame.grid(row=6, column=0, sticky="we", columnspan=len(AVAILABLE_PROGRAMS))
+        self.mAllLogsCollapsibleFrame.grid(row=6, column=0, sticky="we", columnspan=self.mNumColumns)
+        self.mJobLogList = JobLogList(self.mAllLogsCollapsibleFrame.subFrame, self.mAllImages.getImage, height=400)
+        self.mJobLogList.grid(row=0, column=0, sticky="nsew")
+        self.mAllLogsCollapsibleFrame.subFrame.columnconfigure(0, weight=1)
 
     def run(self) -> None:
         self.mRootElement.mainloop()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+DATA_DIRECTORY_ENVIRONMENT_VARIABLE = "SIMPLE_DOWNLOADER_DATA_DIR"
+
+def getDataDirectory() -> str:
+    """
+        Directory for caches and other files the app keeps between runs.
+        Can be overridden with the SIMPLE_DOWNLOADER_DATA_DIR environment variable.
+    """
+    dataDirectory = os.environ.get(DATA_DIRECTORY_ENVIRONMENT_VARIABLE)
+
+    if not dataDirectory:
+        if sys.platform == "win32":
+            dataDirectory = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "SimpleDownloader")
+        else:
+            dataDirectory = os.path.join(os.path.expanduser("~"), ".simpleDownloader")
+
+    os.makedirs(dataDirectory, exist_ok=True)
+    return dataDirectory
+
+def getDataFilePath(fileName : str) -> str:
+    return os.path.join(getDataDirectory(), fileName)
@@ -1,72 +0,0 @@
-# Available programs orgranized by sections
-# In every section, a mapping of "program name" to its "winget id" is stored
-
-AVAILABLE_PROGRAMS = {
-    "Dev editors" : {
-        "Android Studio" : "Google.AndroidStudio",
-        "Atom" : "GitHub.Atom",
-        "GNU Emacs" : "GNU.Emacs",
-        "IntelliJ IDEA Community Edition" : "JetBrains.IntelliJIDEA.Community",
-        "Neovim" : "Neovim.Neovim",
-        "Notepad++" : "Notepad++.Notepad++",
-        "PyCharm Community Edition"  : "JetBrains.PyCharm.Community",
-        "Vim" : "vim.vim",
-        "Visual Studio Community 2022" : "Microsoft.VisualStudio.2022.Community",
-        "VS Code" : "Microsoft.VisualStudioCode",
-    },
-    "Dev tools" : {
-        "Git" : "Git.Git",
-        "Java 8" : "Oracle.JavaRuntimeEnvironment",
-        "Node.js" : "OpenJS.NodeJS",
-        "Postman" : "Postman.Postman",
-        "PuTTY" : "PuTTY.PuTTY",
-        "Python 3.12" : "Python.Python.3.12",
-        "Python 2.7" : "Python.Python.2",
-        "Windows Terminal" : "Microsoft.WindowsTerminal",
-    },
-    "Communication" : {
-        "Cisco webex" : "Cisco.WebexTeams",
-        "Discord" : "Discord.Discord",
-        "Microsoft Teams" : "Microsoft.Teams",
-        "Skype" : "Microsoft.Skype",
-        "Slack" : "SlackTechnologies.Slack",
-        "Telegram Desktop" : "Telegram.TelegramDesktop",
-        "Zoom" : "Zoom.Zoom",
-    },
-    "Game launchers" : {
-        "EA app" : "ElectronicArts.EADesktop",
-        "Epic Games Launcher" : "EpicGames.EpicGamesLauncher",
-        "Steam" : "Valve.Steam",
-    },
-    "Media" : {
-        "OBS Studio" : "OBSProject.OBSStudio",
-        "Spotify" : "Spotify.Spotify",
-        "VLC media player" : "VideoLAN.VLC",
-    },
-    "Browsers" : {
-        "Google Chrome" : "Google.Chrome",
-        "Mozilla Firefox" : "Mozilla.Firefox",
-        "Opera GX" : "Opera.OperaGX",
-    },
-    "Other" : {
-        "Adobe Acrobat Reader DC (64-bit)" : "Adobe.Acrobat.Reader.64-bit",
-        "7-Zip" : "7zip.7zip",
-        "CinebenchR23" : "Maxon.CinebenchR23",
-        "Display Driver Uninstaller" : "Wagnardsoft.DisplayDriverUninstaller",
-        "Heaven Benchmark" : "Unigine.HeavenBenchmark",
-        "HWiNFO" : "REALiX.HWiNFO",
-        "LibreOffice" : "TheDocumentFoundation.LibreOffice",
-        "Lightshot" : "Skillbrains.Lightshot",
-        "MSI Afterburner" : "Guru3D.Afterburner",
-        "Notion" : "Notion.Notion",
-        "NVIDIA GeForce Experience" : "Nvidia.GeForceExperience",
-        "NZXT CAM" : "NZXT.CAM",
-        "qBittorrent" : "qBittorrent.qBittorrent",
-        "QTTabBar" : "QTTabBar.QTTabBar",
-        "Rivatuner Statistics Server" : "Guru3D.RTSS",
-        "Rufus" : "Rufus.Rufus",
-        "SignalRgb" : "WhirlwindFX.SignalRgb",
-        "VMware Workstation Player" : "VMware.WorkstationPlayer",
-        "WinRAR" : "RARLab.WinRAR",
-    },
-}
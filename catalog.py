@@ -0,0 +1,230 @@
+import bisect
+import json
+import os
+import re
+from typing import Iterable, List, Optional
+
+DEFAULT_CATALOG_PATH = os.path.join("catalogs", "default.json")
+CATALOGS_ENVIRONMENT_VARIABLE = "SIMPLE_DOWNLOADER_CATALOGS"
+
+TOKEN_SEPARATOR_PATTERN = re.compile(r"[^0-9a-z+#]+")
+
+class CatalogError(ValueError):
+    pass
+
+class ProgramEntry:
+    def __init__(self, programName : str, wingetId : str, sectionName : str, dependsOn : Iterable[str] = (),
+                 expectedDurationSeconds : Optional[float] = None, exclusiveGroup : Optional[str] = None) -> None:
+        self.programName = programName
+        self.wingetId = wingetId
+        self.sectionName = sectionName
+        # winget ids of prerequisites, they do not have to be part of a catalog
+        self.dependsOn = list(dependsOn)
+        self.expectedDurationSeconds = expectedDurationSeconds
+        # programs of the same exclusive group are never downloaded or installed at the same time
+        self.exclusiveGroup = exclusiveGroup
+
+    @classmethod
+    def fromCatalogProgram(cls, program : dict, sectionName : str) -> "ProgramEntry":
+        return cls(program["name"], program["id"], sectionName, program.get("dependsOn", ()),
+                   program.get("expectedDurationSeconds"), program.get("exclusiveGroup"))
+
+def tokenize(text : str) -> List[str]:
+    return [token for token in TOKEN_SEPARATOR_PATTERN.split(text.lower()) if token]
+
+def validateCatalog(data, sourceName : str) -> None:
+    """
+        Raises CatalogError describing the first problem found in a parsed catalog file
+    """
+    def fail(location : str, problem : str) -> None:
+        raise CatalogError(f"{sourceName}: {location}: {problem}")
+
+    if not isinstance(data, dict) or not isinstance(data.get("sections"), list):
+        fail("top level", "expected an object with a \"sections\" list")
+
+    seenWingetIds = set()
+    for sectionIndex, section in enumerate(data["sections"]):
+        sectionLocation = f"sections[{sectionIndex}]"
+        if not isinstance(section, dict):
+            fail(sectionLocation, "expected an object")
+        if not isinstance(section.get("name"), str) or not section["name"].strip():
+            fail(sectionLocation, "\"name\" must be a non empty string")
+        if not isinstance(section.get("programs"), list):
+            fail(sectionLocation, "\"programs\" must be a list")
+
+        for programIndex, program in enumerate(section["programs"]):
+            programLocation = f"{sectionLocation}.programs[{programIndex}]"
+            if not isinstance(program, dict):
+                fail(programLocation, "expected an object")
+            if not isinstance(program.get("name"), str) or not program["name"].strip():
+                fail(programLocation, "\"name\" must be a non empty string")
+            if not isinstance(program.get("id"), str) or not program["id"] or any(character.isspace() for character in program["id"]):
+                fail(programLocation, "\"id\" must be a winget id without whitespace")
+            if program["id"].lower() in seenWingetIds:
+                fail(programLocation, f"duplicate id {program['id']}")
+            seenWingetIds.add(program["id"].lower())
+
+            dependsOn = program.get("dependsOn", [])
+            if not isinstance(dependsOn, list) or not all(isinstance(dependencyId, str) and dependencyId and not any(character.isspace() for character in dependencyId) for dependencyId in dependsOn):
+                fail(programLocation, "\"dependsOn\" must be a list of winget ids")
+            if program["id"].lower() in (dependencyId.lower() for dependencyId in dependsOn):
+                fail(programLocation, "a program can not depend on itself")
+
+            expectedDurationSeconds = program.get("expectedDurationSeconds", 1)
+            if isinstance(expectedDurationSeconds, bool) or not isinstance(expectedDurationSeconds, (int, float)) or expectedDurationSeconds <= 0:
+                fail(programLocation, "\"expectedDurationSeconds\" must be a positive number")
+
+            if not isinstance(program.get("exclusiveGroup", ""), str):
+                fail(programLocation, "\"exclusiveGroup\" must be a string")
+
+def loadCatalogFile(catalogPath : str) -> dict:
+    """
+        Loads and validates a single JSON or TOML catalog file
+    """
+    try:
+        if catalogPath.endswith(".toml"):
+            # tomllib is only part of the standard library from python 3.11
+            import tomllib
+            with open(catalogPath, "rb") as catalogFile:
+                data = tomllib.load(catalogFile)
+        else:
+            with open(catalogPath, encoding="utf-8") as catalogFile:
+                data = json.load(catalogFile)
+    except ImportError:
+        raise CatalogError(f"{catalogPath}: TOML catalogs need python 3.11 or newer")
+    except (OSError, ValueError) as e:
+        raise CatalogError(f"{catalogPath}: {e}")
+
+    validateCatalog(data, catalogPath)
+    return data
+
+class ProgramCatalog:
+    """
+        Indexed catalog of all available programs.
+        Programs are indexed by winget id, by section and by name/id tokens,
+        the sorted token list allows prefix search with a binary search.
+    """
+
+    def __init__(self, programs : Iterable[ProgramEntry] = ()) -> None:
+        self.programsById = dict()
+        self.programsBySection = dict()
+        for program in programs:
+            self.addProgram(program)
+        self.tokenIndex = None
+        self.sortedTokens = None
+
+    @classmethod
+    def fromCatalogData(cls, catalogs : Iterable[dict]) -> "ProgramCatalog":
+        """
+            Merges parsed catalogs in order, a program from a later catalog replaces
+            a program with the same winget id from an earlier one
+        """
+        programCatalog = cls()
+        for data in catalogs:
+            for section in data["sections"]:
+                for program in section["programs"]:
+                    programCatalog.addProgram(ProgramEntry.fromCatalogProgram(program, section["name"]))
+        return programCatalog
+
+    @classmethod
+    def fromFiles(cls, catalogPaths : Iterable[str]) -> "ProgramCatalog":
+        return cls.fromCatalogData([loadCatalogFile(catalogPath) for catalogPath in catalogPaths])
+
+    def addProgram(self, program : ProgramEntry) -> None:
+        previousProgram = self.programsById.pop(program.wingetId.lower(), None)
+        if previousProgram is not None:
+            self.programsBySection[previousProgram.sectionName].remove(previousProgram)
+
+        self.programsById[program.wingetId.lower()] = program
+        self.programsBySection.setdefault(program.sectionName, list()).append(program)
+        self.tokenIndex = None
+
+    def __len__(self) -> int:
+        return len(self.programsById)
+
+    def getSectionNames(self) -> List[str]:
+        return [sectionName for sectionName, programs in self.programsBySection.items() if programs]
+
+    def getPrograms(self, sectionName : str) -> List[ProgramEntry]:
+        return self.programsBySection.get(sectionName, [])
+
+    def getProgram(self, wingetId : str) -> Optional[ProgramEntry]:
+        return self.programsById.get(wingetId.lower())
+
+    def getAllPrograms(self) -> List[ProgramEntry]:
+        return [program for sectionName in self.getSectionNames() for program in self.programsBySection[sectionName]]
+
+    def findDependencyCycle(self) -> Optional[List[str]]:
+        """
+            Returns the winget ids of a dependency cycle between programs, if there is one
+        """
+        visitedIds = set()
+
+        def visit(wingetId : str, path : List[str]) -> Optional[List[str]]:
+            if wingetId in path:
+                return path[path.index(wingetId):] + [wingetId]
+            if wingetId in visitedIds or wingetId not in self.programsById:
+                return None
+            visitedIds.add(wingetId)
+            for dependencyId in self.programsById[wingetId].dependsOn:
+                cycle = visit(dependencyId.lower(), path + [wingetId])
+                if cycle is not None:
+                    return cycle
+            return None
+
+        for wingetId in self.programsById:
+            cycle = visit(wingetId, [])
+            if cycle is not None:
+                return cycle
+        return None
+
+    def buildTokenIndex(self) -> None:
+        self.tokenIndex = dict()
+        for wingetId, program in self.programsById.items():
+            for token in set(tokenize(program.programName) + tokenize(program.wingetId)):
+                self.tokenIndex.setdefault(token, list()).append(wingetId)
+        self.sortedTokens = sorted(self.tokenIndex)
+
+    def findByTokenPrefix(self, prefix : str) -> set:
+        matchingIds = set()
+        tokenIndex = bisect.bisect_left(self.sortedTokens, prefix)
+        while tokenIndex < len(self.sortedTokens) and self.sortedTokens[tokenIndex].startswith(prefix):
+            matchingIds.update(self.tokenIndex[self.sortedTokens[tokenIndex]])
+            tokenIndex += 1
+        return matchingIds
+
+    def search(self, query : str) -> set:
+        """
+            Returns the (lower case) winget ids of programs that have a name or id
+            token starting with every word of the query
+        """
+        queryTokens = tokenize(query)
+        if not queryTokens:
+            return set(self.programsById)
+
+        if self.tokenIndex is None:
+            self.buildTokenIndex()
+
+        matchingIds = self.findByTokenPrefix(queryTokens[0])
+        for queryToken in queryTokens[1:]:
+            if not matchingIds:
+                break
+            matchingIds &= self.findByTokenPrefix(queryToken)
+        return matchingIds
+
+def getCatalogPaths() -> List[str]:
+    """
+        The default catalog followed by the catalogs listed in the
+        SIMPLE_DOWNLOADER_CATALOGS environment variable (os.pathsep separated)
+    """
+    additionalCatalogPaths = os.environ.get(CATALOGS_ENVIRONMENT_VARIABLE, "").split(os.pathsep)
+    return [DEFAULT_CATALOG_PATH] + [catalogPath for catalogPath in additionalCatalogPaths if catalogPath]
+
+def loadProgramCatalog(catalogPaths : Optional[List[str]] = None) -> ProgramCatalog:
+    programCatalog = ProgramCatalog.fromFiles(catalogPaths or getCatalogPaths())
+
+    # dependencies can point into other catalogs, so cycles are only checked on the merged catalog
+    dependencyCycle = programCatalog.findDependencyCycle()
+    if dependencyCycle is not None:
+        raise CatalogError(f"dependency cycle between {' -> '.join(dependencyCycle)}")
+    return programCatalog
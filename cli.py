@@ -0,0 +1,349 @@
+import argparse
+import json
+import sys
+import time
+from queue import SimpleQueue
+from typing import List, Optional
+
+from catalog import CatalogError, ProgramCatalog, loadProgramCatalog
+from engine import EngineOptions, WingetEngine
+from fleet import FleetError, FleetRun, TargetProgress, TargetStatus, loadFleet, HEADLESS_PROFILE_OPTIONS
+from jobJournal import JobJournal, loadUnfinishedBatch
+from jobMetrics import RunMetrics
+from jobProgress import formatDuration
+from packageCache import PackageCache
+from profiles import Profile, ProfileError, loadProfile
+from uiEvents import JobStartedEvent, JobOutputEvent, JobFinishedEvent, AllJobsFinishedEvent
+from wingetJobs import OperationType, JobPhase, WingetQueueMessage, DEFAULT_NUM_DOWNLOAD_WORKERS, MAX_NUM_DOWNLOAD_WORKERS
+
+def parseArguments(arguments : List[str], profileOptions : Optional[dict] = None) -> argparse.Namespace:
+    """
+        The options of a profile are the defaults of the matching command line options
+    """
+    parser = argparse.ArgumentParser(
+        prog="SimpleDownloader --headless",
+        description="Installs, uninstalls or upgrades programs with winget without showing a window. "
+                    "Progress is printed to stderr, a JSON summary to stdout."
+    )
+    parser.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("wingetIds", nargs="*", metavar="ID", help="winget ids of the programs")
+    parser.add_argument("--profile", help="profile file with the programs (and operation) to run")
+    parser.add_argument("--resume", action="store_true",
+                        help="run the unfinished jobs of the last interrupted batch, with its options")
+    parser.add_argument("--uninstall", action="store_true", help="uninstall instead of install")
+    parser.add_argument("--upgrade", action="store_true", help="upgrade instead of install")
+    parser.add_argument("--upgrade-all", dest="upgradeAll", action="store_true",
+                        help="upgrade every program of the catalog that has a newer version available")
+    parser.add_argument("--refresh-upgrades", dest="refreshUpgrades", action="store_true",
+                        help="list the available upgrades with winget even if the cached listing is still fresh")
+    parser.add_argument("--workers", type=int, default=DEFAULT_NUM_DOWNLOAD_WORKERS,
+                        help=f"number of parallel downloads (1-{MAX_NUM_DOWNLOAD_WORKERS})")
+    parser.add_argument("--import", dest="useImport", action="store_true",
+                        help="install all programs with a single winget import run")
+    parser.add_argument("--no-skip", dest="skipInstalled", action="store_false",
+                        help="run winget even for programs that need no changes")
+    parser.add_argument("--package-cache", dest="usePackageCache", action="store_true",
+                        help="install from the local package cache, adding downloaded installers to it")
+    parser.add_argument("--cache-dir", dest="cacheDirectory", help="directory of the package cache, can be a shared directory")
+    parser.add_argument("--mirror", help="shared directory or http(s) url of another package cache to fetch installers from")
+    parser.add_argument("--no-retry", dest="retryFailedJobs", action="store_false",
+                        help="do not retry installs that failed for a transient reason (network, busy installer)")
+    parser.add_argument("--dry-run", dest="dryRun", action="store_true",
+                        help="only print the planned schedule and its estimated duration")
+    parser.add_argument("--fleet", help="provision every target of this fleet file instead of this machine")
+    parser.add_argument("--max-parallel-targets", dest="maxParallelTargets", type=int,
+                        help="number of fleet targets provisioned at once, overrides the fleet file")
+    parser.add_argument("--max-runs-per-host", dest="maxRunsPerHost", type=int,
+                        help="number of fleet targets provisioned at once on the same host, overrides the fleet file")
+    parser.add_argument("--verbose", action="store_true", help="also print the output of winget")
+    parser.add_argument("--summary", help="write the JSON summary to this file instead of stdout")
+    parser.add_argument("--metrics", help="write the phase timestamps and output sizes of every job to this JSON file")
+    parser.add_argument("--trace", help="write a Chrome trace event file of the batch (chrome://tracing, ui.perfetto.dev)")
+    parser.add_argument("--prometheus", help="write the metrics of the batch to this file in the Prometheus text format")
+
+    if profileOptions:
+        options = EngineOptions.fromDict(profileOptions)
+        parser.set_defaults(
+            workers=options.numDownloadWorkers,
+            useImport=options.useImport,
+            skipInstalled=options.skipInstalled,
+            usePackageCache=options.usePackageCache,
+            retryFailedJobs=options.retryFailedJobs
+        )
+        # the command line options of the headless mode a fleet profile carries, see runHeadless
+        parser.set_defaults(**{key : profileOptions[key] for key in HEADLESS_PROFILE_OPTIONS if key in profileOptions})
+    return parser.parse_args(arguments)
+
+def loadCatalogOrNone() -> Optional[ProgramCatalog]:
+    try:
+        return loadProgramCatalog()
+    except CatalogError as e:
+        print(f"Could not load the program catalog, showing programs by id without scheduling them: {e}", file=sys.stderr)
+        return None
+
+def buildJobs(wingetIds : List[str], operation : OperationType, programCatalog : Optional[ProgramCatalog]) -> List[WingetQueueMessage]:
+    # ids that are not in the catalog are still valid winget ids, they are shown by id
+    jobs = list()
+    for wingetId in dict.fromkeys(wingetIds):
+        program = programCatalog.getProgram(wingetId) if programCatalog is not None else None
+        jobs.append(WingetQueueMessage(program.programName if program else wingetId, program.wingetId if program else wingetId, operation))
+    return jobs
+
+class HeadlessRun:
+    """
+        Runs a single batch on the engine and reports it on the console
+    """
+
+    def __init__(self, jobs : List[WingetQueueMessage], options : EngineOptions, verbose : bool = False,
+                 packageCache : Optional[PackageCache] = None, programCatalog : Optional[ProgramCatalog] = None) -> None:
+        self.jobs = jobs
+        self.options = options
+        self.verbose = verbose
+        self.eventQueue = SimpleQueue()
+        self.engine = WingetEngine(self.eventQueue.put, journal=JobJournal(), packageCache=packageCache, programCatalog=programCatalog)
+        self.results = dict()
+        self.startTimes = dict()
+        self.durations = dict()
+        self.skippedJobs = list()
+
+    def printProgress(self, text : str) -> None:
+        # the windowed release executable has no console to print to
+        if sys.stderr is not None:
+            print(text, file=sys.stderr, flush=True)
+
+    def getInstalledStateIndex(self):
+        if not self.options.skipInstalled:
+            return None
+        # the upgrade listing has every package an upgrade can change, so `winget list` is not run as well
+        if self.jobs and all(job.operation == OperationType.UPGRADE for job in self.jobs):
+            return self.engine.availableUpgradesCache.get()
+        return self.engine.installedStateCache.get()
+
+    def printPlan(self) -> None:
+        batchPlan = self.engine.planBatch(self.jobs, self.options, self.getInstalledStateIndex())
+        self.engine.stop()
+
+        if sys.stdout is not None:
+            print(batchPlan.schedule.format())
+            if batchPlan.skippedJobs:
+                print(f"Skipped, they need no changes: {', '.join(job.programName for job in batchPlan.skippedJobs)}")
+
+    def run(self) -> dict:
+        startTime = time.perf_counter()
+        if not self.jobs:
+            self.engine.stop()
+            return self.getSummary(0.0)
+
+        batchPlan = self.engine.runBatch(self.jobs, self.options, self.getInstalledStateIndex())
+        # prerequisites may have been added to the batch
+        self.jobs = batchPlan.jobsToRun + batchPlan.skippedJobs
+        self.skippedJobs = batchPlan.skippedJobs
+
+        while True:
+            event = self.eventQueue.get()
+            if isinstance(event, AllJobsFinishedEvent):
+                break
+            self.handleEvent(event)
+
+        self.engine.stop()
+        return self.getSummary(time.perf_counter() - startTime)
+
+    def handleEvent(self, event) -> None:
+        job = getattr(event, "job", None)
+
+        if isinstance(event, JobStartedEvent):
+            self.startTimes.setdefault(job, time.perf_counter())
+            if event.phase == JobPhase.DOWNLOAD:
+                self.printProgress(f"Downloading {job.programName}...")
+            elif event.phase == JobPhase.IMPORT:
+                self.printProgress(f"Installing {job.programName} with a single winget import run...")
+            else:
+                self.printProgress(f"{job.operation.getPresentParticiple().capitalize()} {job.programName}...")
+        elif isinstance(event, JobOutputEvent):
+            if self.verbose:
+                for line in event.text.splitlines():
+                    self.printProgress(f"    {job.programName}: {line}")
+        elif isinstance(event, JobFinishedEvent):
+            self.results[job] = event.handledSuccessfully
+            if job in self.startTimes:
+                self.durations[job] = time.perf_counter() - self.startTimes[job]
+            result = "skipped" if job in self.skippedJobs else ("done" if event.handledSuccessfully else "FAILED")
+            self.printProgress(f"[{len(self.results)}/{len(self.jobs)}] {job.programName}: {result}{self.getRemainingTimeText()}")
+
+    def getRemainingTimeText(self) -> str:
+        remainingSeconds = self.engine.progress.getRemainingSeconds()
+        if remainingSeconds is None or len(self.results) == len(self.jobs):
+            return ""
+        return f" ({self.engine.progress.getFraction():.0%}, about {formatDuration(remainingSeconds)} left)"
+
+    def getJobResult(self, job : WingetQueueMessage) -> str:
+        if job in self.skippedJobs:
+            return "skipped"
+        return "succeeded" if self.results.get(job) else "failed"
+
+    def getSummary(self, durationSeconds : float) -> dict:
+        jobSummaries = [
+            {
+                "id" : job.wingetId,
+                "name" : job.programName,
+                "operation" : job.operation.value,
+                "result" : self.getJobResult(job),
+                "failureCategory" : job.failureCategory.value if job.failureCategory is not None else None,
+                "retries" : job.numRetries,
+                "durationSeconds" : round(self.durations.get(job, 0.0), 3),
+            }
+            for job in self.jobs
+        ]
+        summary = {
+            "numJobs" : len(self.jobs),
+            "succeeded" : sum(1 for jobSummary in jobSummaries if jobSummary["result"] == "succeeded"),
+            "failed" : sum(1 for jobSummary in jobSummaries if jobSummary["result"] == "failed"),
+            "skipped" : sum(1 for jobSummary in jobSummaries if jobSummary["result"] == "skipped"),
+            "durationSeconds" : round(durationSeconds, 3),
+            "failureCategories" : dict(self.engine.counters.failureCategories),
+            "jobs" : jobSummaries,
+        }
+        if self.options.usePackageCache:
+            summary["packageCache"] = self.engine.packageCache.stats.toDict()
+        return summary
+
+def runHeadless(arguments : Optional[List[str]] = None) -> int:
+    """
+        Entry point of the headless mode, returns the process exit code:
+        0 when every job succeeded or was skipped, 1 when a job failed, 2 for invalid arguments
+    """
+    arguments = sys.argv[1:] if arguments is None else arguments
+    args = parseArguments(arguments)
+
+    if args.resume:
+        unfinishedBatch = loadUnfinishedBatch()
+        if unfinishedBatch is None:
+            print("There is no interrupted batch to resume", file=sys.stderr)
+            return 0
+        headlessRun = HeadlessRun(unfinishedBatch.jobs, EngineOptions.fromDict(unfinishedBatch.options), args.verbose, getPackageCache(args), loadCatalogOrNone())
+        summary = headlessRun.run()
+        exportMetrics(headlessRun.engine.metrics, args)
+        return reportSummary(summary, args.summary)
+
+    wingetIds = list(args.wingetIds)
+    operation = OperationType.UNINSTALL if args.uninstall else OperationType.UPGRADE if args.upgrade or args.upgradeAll else OperationType.INSTALL
+    profileName = "command line"
+    if args.profile:
+        try:
+            profile = loadProfile(args.profile)
+        except ProfileError as e:
+            print(e, file=sys.stderr)
+            return 2
+        wingetIds.extend(profile.wingetIds)
+        profileName = profile.name
+        if not (args.uninstall or args.upgrade or args.upgradeAll):
+            operation = profile.operation
+        if profile.options:
+            args = parseArguments(arguments, profile.options)
+        # an upgrade profile without programs upgrades every outdated program
+        if operation == OperationType.UPGRADE and not wingetIds:
+            args.upgradeAll = True
+
+    if args.upgradeAll and wingetIds:
+        print("--upgrade-all takes no programs, use --upgrade to upgrade only some of them", file=sys.stderr)
+        return 2
+    if not wingetIds and not args.upgradeAll:
+        print("No programs given, pass winget ids, --profile or --upgrade-all", file=sys.stderr)
+        return 2
+
+    options = EngineOptions(
+        requireUserInput=False,
+        numDownloadWorkers=args.workers,
+        useImport=args.useImport,
+        skipInstalled=args.skipInstalled,
+        retryFailedJobs=args.retryFailedJobs,
+        usePackageCache=args.usePackageCache or bool(args.cacheDirectory or args.mirror)
+    )
+    if args.fleet:
+        profileOptions = options.toDict()
+        profileOptions.update({key : getattr(args, key) for key in HEADLESS_PROFILE_OPTIONS if getattr(args, key)})
+        return runFleet(Profile(profileName, list(dict.fromkeys(wingetIds)), operation, profileOptions), args)
+
+    programCatalog = loadCatalogOrNone()
+    headlessRun = HeadlessRun(buildJobs(wingetIds, operation, programCatalog), options, args.verbose, getPackageCache(args), programCatalog)
+    if args.upgradeAll:
+        upgradeJobs = headlessRun.engine.getUpgradeJobs(args.refreshUpgrades)
+        if upgradeJobs is None:
+            headlessRun.engine.stop()
+            print("Could not list the available upgrades with winget", file=sys.stderr)
+            return 1
+        headlessRun.jobs = upgradeJobs
+        headlessRun.printProgress(f"Programs with a newer version available: {len(upgradeJobs)}")
+    if args.dryRun:
+        headlessRun.printPlan()
+        return 0
+    summary = headlessRun.run()
+    exportMetrics(headlessRun.engine.metrics, args)
+    return reportSummary(summary, args.summary)
+
+def runFleet(profile : Profile, args : argparse.Namespace) -> int:
+    try:
+        fleet = loadFleet(args.fleet)
+    except FleetError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.maxParallelTargets:
+        fleet.maxParallelTargets = max(1, args.maxParallelTargets)
+    if args.maxRunsPerHost:
+        fleet.maxRunsPerHost = max(1, args.maxRunsPerHost)
+
+    fleetRun = FleetRun(fleet, profile)
+    if args.dryRun:
+        if sys.stdout is not None:
+            for target in fleet.targets:
+                print(f"{target.name}: {' '.join(fleetRun.getArguments(target))}")
+        return 0
+
+    def printProgress(targetProgress : TargetProgress) -> None:
+        if sys.stderr is not None:
+            print(f"[{fleetRun.progress.formatStatus()}] {targetProgress.format()}", file=sys.stderr, flush=True)
+
+    fleetRun.onProgress = printProgress
+    startTime = time.perf_counter()
+    targetProgress = fleetRun.run()
+    if sys.stderr is not None:
+        print(fleetRun.progress.format(), file=sys.stderr, flush=True)
+
+    numUnreachable = sum(1 for progress in targetProgress if progress.status == TargetStatus.UNREACHABLE)
+    summary = {
+        "numTargets" : len(targetProgress),
+        "succeeded" : sum(1 for progress in targetProgress if progress.status == TargetStatus.SUCCEEDED),
+        # unreachable targets are failed as well
+        "failed" : sum(1 for progress in targetProgress if progress.status == TargetStatus.FAILED) + numUnreachable,
+        "unreachable" : numUnreachable,
+        "durationSeconds" : round(time.perf_counter() - startTime, 3),
+        "targets" : [progress.toDict() for progress in targetProgress],
+    }
+    return reportSummary(summary, args.summary)
+
+def getPackageCache(args : argparse.Namespace) -> PackageCache:
+    # the command line options take precedence over the environment variables
+    packageCache = PackageCache.fromEnvironment()
+    if args.cacheDirectory:
+        packageCache = PackageCache(args.cacheDirectory, packageCache.maxBytes, packageCache.mirror)
+    if args.mirror:
+        packageCache.mirror = args.mirror
+    return packageCache
+
+def exportMetrics(runMetrics : RunMetrics, args : argparse.Namespace) -> None:
+    if args.metrics:
+        runMetrics.writeJson(args.metrics)
+    if args.trace:
+        runMetrics.writeChromeTrace(args.trace)
+    if args.prometheus:
+        runMetrics.writePrometheusText(args.prometheus)
+
+def reportSummary(summary : dict, summaryPath : Optional[str]) -> int:
+    if summaryPath:
+        with open(summaryPath, "w", encoding="utf-8") as summaryFile:
+            json.dump(summary, summaryFile, indent=4)
+    elif sys.stdout is not None:
+        json.dump(summary, sys.stdout, indent=4)
+        print()
+
+    return 0 if summary["failed"] == 0 else 1
@@ -1,6 +1,10 @@
+import bisect
+import sys
 import tkinter as tk
 from ttkbootstrap import ttk
 
+from logBuffer import DEFAULT_MAX_BUFFERED_LINES, RingBufferLog
+
 class ScrollableFrame:
     """
         A frame with both vertical and horizontal scrolling.
@@ -44,35 +48,192 @@ class ScrollableFrame:
             return getattr(self.innerFrame, item)
 
     def on_frame_configure(self, event=None):
-        _, _, x2, y2 = self.canvas.bbox("all")
+        # the inner frame is the only item on the canvas, so its size is the scroll region
+        x2 = event.width if event else self.innerFrame.winfo_reqwidth()
+        y2 = event.height if event else self.innerFrame.winfo_reqheight()
         height = self.canvas.winfo_height()
         width = self.canvas.winfo_width()
         self.canvas.config(scrollregion = (0,0, max(x2, width), max(y2, height)))
 
+class VirtualList:
+    """
+        A vertically scrollable list that only creates widgets for the visible rows.
+        Row widgets are created with createRow(parent) and recycled while scrolling,
+        bindRow(rowWidget, item) fills a row widget with the data of an item and
+        getRowHeight(item) returns the height of an item in pixels and the optional
+        unbindRow(rowWidget) is called when a row widget stops showing an item.
+        Layout cost and the number of widgets depend on the height of the list,
+        not on the number of items.
+    """
+
+    SCROLL_UNIT_PIXELS = 30
+
+    def __init__(self, root, createRow, bindRow, getRowHeight, *args, unbindRow=None, **kwargs):
+        width = kwargs.pop('width', None)
+        height = kwargs.pop('height', None)
+
+        self.createRow = createRow
+        self.bindRow = bindRow
+        self.getRowHeight = getRowHeight
+        self.unbindRow = unbindRow
+
+        self.outerFrame = tk.Frame(root, *args, **kwargs)
+        self.outerFrame.rowconfigure(0, weight=1)
+        self.outerFrame.columnconfigure(0, weight=1)
+
+        self.viewport = tk.Frame(self.outerFrame, width=width, height=height)
+        self.viewport.grid(row=0, column=0, sticky='nsew')
+
+        self.verticalScrollbar = ttk.Scrollbar(self.outerFrame, orient=tk.VERTICAL, command=self.yview)
+        self.verticalScrollbar.grid(row=0, column=1, sticky='ns')
+
+        self.items = list()
+        # itemOffsets[i] is the y position of item i, the last entry is the total height
+        self.itemOffsets = [0]
+        self.scrollTop = 0
+        self.boundRows = dict()
+        self.freeRows = list()
+
+        self.viewport.bind("<Configure>", lambda event: self.render())
+        self.outerFrame.bind("<Enter>", lambda event: self.bindMouseWheel())
+        self.outerFrame.bind("<Leave>", lambda event: self.unbindMouseWheel())
+
+        self.outerFrameAttributes = set(dir(tk.Widget))
+
+    def __getattr__(self, item):
+        if item in self.outerFrameAttributes:
+            return getattr(self.outerFrame, item)
+        raise AttributeError(item)
+
+    def bindMouseWheel(self) -> None:
+        if sys.platform.startswith("linux"):
+            self.outerFrame.bind_all("<Button-4>", lambda event: self.yview("scroll", -1, "units"))
+            self.outerFrame.bind_all("<Button-5>", lambda event: self.yview("scroll", 1, "units"))
+        else:
+            self.outerFrame.bind_all("<MouseWheel>", lambda event: self.yview("scroll", -1 if event.delta > 0 else 1, "units"))
+
+    def unbindMouseWheel(self) -> None:
+        for sequence in ("<Button-4>", "<Button-5>", "<MouseWheel>"):
+            self.outerFrame.unbind_all(sequence)
+
+    def setItems(self, items) -> None:
+        self.items = list(items)
+        self.recomputeOffsets()
+        self.releaseAllRows()
+        self.render()
+
+    def appendItem(self, item) -> None:
+        self.items.append(item)
+        self.itemOffsets.append(self.itemOffsets[-1] + self.getRowHeight(item))
+        self.render()
+
+    def refreshRowHeights(self) -> None:
+        """
+            Should be called after the height of any item changed
+        """
+        self.recomputeOffsets()
+        self.render()
+
+    def refreshVisibleRows(self) -> None:
+        """
+            Binds the visible rows again, e.g. after the data of their items changed
+        """
+        for itemIndex, rowWidget in self.boundRows.items():
+            self.bindRow(rowWidget, self.items[itemIndex])
+
+    def recomputeOffsets(self) -> None:
+        self.itemOffsets = [0]
+        for item in self.items:
+            self.itemOffsets.append(self.itemOffsets[-1] + self.getRowHeight(item))
+
+    def releaseRow(self, itemIndex : int) -> None:
+        rowWidget = self.boundRows.pop(itemIndex)
+        rowWidget.place_forget()
+        if self.unbindRow is not None:
+            self.unbindRow(rowWidget)
+        self.freeRows.append(rowWidget)
+
+    def releaseAllRows(self) -> None:
+        for itemIndex in list(self.boundRows):
+            self.releaseRow(itemIndex)
+
+    def getTotalHeight(self) -> int:
+        return self.itemOffsets[-1]
+
+    def clampScrollTop(self, viewportHeight : int) -> None:
+        self.scrollTop = max(0, min(self.scrollTop, self.getTotalHeight() - viewportHeight))
+
+    def yview(self, *args) -> None:
+        viewportHeight = self.viewport.winfo_height()
+
+        if args[0] == "moveto":
+            self.scrollTop = int(float(args[1]) * self.getTotalHeight())
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            self.scrollTop += amount * (viewportHeight if args[2] == "pages" else VirtualList.SCROLL_UNIT_PIXELS)
+
+        self.clampScrollTop(viewportHeight)
+        self.render()
+
+    def render(self) -> None:
+        viewportHeight = self.viewport.winfo_height()
+        self.clampScrollTop(viewportHeight)
+
+        firstVisibleIndex = max(0, bisect.bisect_right(self.itemOffsets, self.scrollTop) - 1)
+        lastVisibleIndex = bisect.bisect_left(self.itemOffsets, self.scrollTop + viewportHeight, firstVisibleIndex)
+        visibleIndexes = range(firstVisibleIndex, min(lastVisibleIndex, len(self.items)))
+
+        # recycle rows that scrolled out of view before creating any new ones
+        for itemIndex in [itemIndex for itemIndex in self.boundRows if itemIndex not in visibleIndexes]:
+            self.releaseRow(itemIndex)
+
+        for itemIndex in visibleIndexes:
+            rowWidget = self.boundRows.get(itemIndex)
+            if rowWidget is None:
+                rowWidget = self.freeRows.pop() if self.freeRows else self.createRow(self.viewport)
+                self.bindRow(rowWidget, self.items[itemIndex])
+                self.boundRows[itemIndex] = rowWidget
+
+            rowTop = self.itemOffsets[itemIndex] - self.scrollTop
+            rowWidget.place(x=0, y=rowTop, relwidth=1, height=self.itemOffsets[itemIndex + 1] - self.itemOffsets[itemIndex])
+
+        totalHeight = self.getTotalHeight()
+        if totalHeight > 0:
+            self.verticalScrollbar.set(self.scrollTop / totalHeight, min(1, (self.scrollTop + viewportHeight) / totalHeight))
+        else:
+            self.verticalScrollbar.set(0, 1)
+
 class ProgramCheckbox:
     """
-        Class that wraps a program to it's associated checkbox
+        Class that wraps a program to it's checked state.
+        The widgets of a program only exist while it is visible, a ProgramCell is
+        bound to the program during that time and shows its state.
     """
 
-    def __init__(self, programName : str, wingetId : str, root) -> None:
+    def __init__(self, programName : str, wingetId : str) -> None:
         self.programName = programName
         self.wingetId = wingetId
-
-        self.checkBoxVar = tk.BooleanVar()
-        checkbox = ttk.Checkbutton(root, text=self.programName, variable=self.checkBoxVar)
-        checkbox.grid(row=0, column=1)
+        self.checked = False
+        self.isInstalled = False
+        self.isUpgradeable = False
+        self.boundCell = None
 
     def isChecked(self) -> bool:
-        return self.checkBoxVar.get() == True
-    
+        return self.checked == True
+
+    def setChecked(self, checked : bool) -> None:
+        self.checked = checked
+        if self.boundCell is not None:
+            self.boundCell.refresh()
+
     def check(self) -> None:
-        self.checkBoxVar.set(True)
+        self.setChecked(True)
 
     def uncheck(self) -> None:
-        self.checkBoxVar.set(False)
+        self.setChecked(False)
 
     def toggle(self) -> None:
-        self.checkBoxVar.set(not self.checkBoxVar.get())
+        self.setChecked(not self.checked)
 
     def getProgramName(self) -> str:
         return self.programName
@@ -80,13 +241,172 @@ class ProgramCheckbox:
     def getWingetId(self) -> str:
         return self.wingetId
 
+    def setInstalledState(self, isInstalled : bool, isUpgradeable : bool) -> None:
+        self.isInstalled = isInstalled
+        self.isUpgradeable = isUpgradeable
+        if self.boundCell is not None:
+            self.boundCell.refresh()
+
+class ProgramCell(ttk.Frame):
+    """
+        Icon, checkbox and installed state badge of the ProgramCheckbox bound to it
+    """
+
+    def __init__(self, parent, getImage) -> None:
+        ttk.Frame.__init__(self, parent)
+
+        self.getImage = getImage
+        self.programCheckbox = None
+        self.checkBoxVar = tk.BooleanVar()
+
+        self.imageLabel = ttk.Label(self)
+        self.imageLabel.grid(row=0, column=0)
+
+        self.checkbox = ttk.Checkbutton(self, variable=self.checkBoxVar, command=self.onCheckboxToggled)
+        self.checkbox.grid(row=0, column=1)
+
+        self.installedStateLabel = ttk.Label(self, text="")
+        self.installedStateLabel.grid(row=0, column=2, padx=(5, 0))
+
+    def showProgram(self, programCheckbox : ProgramCheckbox) -> None:
+        self.clearProgram()
+        self.programCheckbox = programCheckbox
+        programCheckbox.boundCell = self
+
+        self.imageLabel.configure(image=self.getImage(programCheckbox.wingetId))
+        self.checkbox.configure(text=programCheckbox.programName)
+        self.refresh()
+
+    def clearProgram(self) -> None:
+        if self.programCheckbox is not None and self.programCheckbox.boundCell is self:
+            self.programCheckbox.boundCell = None
+        self.programCheckbox = None
+
+    def refresh(self) -> None:
+        self.checkBoxVar.set(self.programCheckbox.checked)
+
+        if self.programCheckbox.isUpgradeable:
+            self.installedStateLabel.configure(text="(update available)", bootstyle="warning")
+        elif self.programCheckbox.isInstalled:
+            self.installedStateLabel.configure(text="(installed)", bootstyle="success")
+        else:
+            self.installedStateLabel.configure(text="", bootstyle="default")
+
+    def onCheckboxToggled(self) -> None:
+        if self.programCheckbox is not None:
+            self.programCheckbox.checked = self.checkBoxVar.get()
+
+class ProgramRow(ttk.Frame):
+    """
+        A row of the program selection list, either a section header or up to numColumns programs
+    """
+
+    def __init__(self, parent, getImage, cellWidth : int) -> None:
+        ttk.Frame.__init__(self, parent)
+
+        self.getImage = getImage
+        self.cellWidth = cellWidth
+        self.cells = list()
+
+        self.sectionLabel = ttk.Label(self, font="-weight bold")
+        self.sectionLabel.grid(row=0, column=0, columnspan=100, sticky="w", padx=5)
+
+    def showItem(self, item) -> None:
+        if isinstance(item, str):
+            self.sectionLabel.configure(text=item)
+            self.sectionLabel.grid()
+            item = []
+        else:
+            self.sectionLabel.grid_remove()
+
+        while len(self.cells) < len(item):
+            cell = ProgramCell(self, self.getImage)
+            cell.grid(row=0, column=len(self.cells), sticky="w")
+            self.columnconfigure(len(self.cells), minsize=self.cellWidth)
+            self.cells.append(cell)
+
+        for cellIndex, cell in enumerate(self.cells):
+            if cellIndex < len(item):
+                cell.showProgram(item[cellIndex])
+                cell.grid()
+            else:
+                cell.clearProgram()
+                cell.grid_remove()
+
+    def clearItem(self) -> None:
+        for cell in self.cells:
+            cell.clearProgram()
+
+class ProgramSelectionList:
+    """
+        Virtualized grid of program checkboxes grouped by sections.
+        Programs are laid out in as many columns as fit the width of the list,
+        filtering only rebuilds the list of rows, never the widgets.
+    """
+
+    ROW_HEIGHT = 40
+    CELL_WIDTH = 420
+
+    def __init__(self, root, programCheckboxesBySection : dict, getImage, height=None) -> None:
+        self.programCheckboxesBySection = programCheckboxesBySection
+        self.getImage = getImage
+        self.visibleWingetIds = None
+        self.numColumns = 1
+
+        self.virtualList = VirtualList(
+            root,
+            lambda parent: ProgramRow(parent, self.getImage, ProgramSelectionList.CELL_WIDTH),
+            lambda row, item: row.showItem(item),
+            lambda item: ProgramSelectionList.ROW_HEIGHT,
+            unbindRow=lambda row: row.clearItem(),
+            height=height
+        )
+        self.virtualList.viewport.bind("<Configure>", self.onViewportConfigure, add="+")
+        self.rebuildRows()
+
+    def __getattr__(self, item):
+        return getattr(self.virtualList, item)
+
+    def onViewportConfigure(self, event) -> None:
+        numColumns = max(1, event.width // ProgramSelectionList.CELL_WIDTH)
+        if numColumns != self.numColumns:
+            self.numColumns = numColumns
+            self.rebuildRows()
+
+    def setVisiblePrograms(self, visibleWingetIds) -> None:
+        """
+            Shows only the programs whose lower case winget id is in visibleWingetIds, None shows all
+        """
+        self.visibleWingetIds = visibleWingetIds
+        self.rebuildRows()
+
+    def rebuildRows(self) -> None:
+        rows = list()
+        for sectionName, programCheckboxes in self.programCheckboxesBySection.items():
+            if self.visibleWingetIds is not None:
+                programCheckboxes = [programCheckbox for programCheckbox in programCheckboxes if programCheckbox.wingetId.lower() in self.visibleWingetIds]
+            if not programCheckboxes:
+                continue
+
+            rows.append(sectionName)
+            for firstProgramIndex in range(0, len(programCheckboxes), self.numColumns):
+                rows.append(programCheckboxes[firstProgramIndex:firstProgramIndex + self.numColumns])
+
+        self.virtualList.setItems(rows)
+
 class CollapsibleFrame(tk.Frame):
     """
         A collapsible frame that can hold other widgets inside of it
     """
 
-    def __init__(self, parent, text="", *args, **kwargs) -> None:
+    def __init__(self, parent, text="", *args, createContent=None, **kwargs) -> None:
         tk.Frame.__init__(self, parent, *args, **kwargs)
+        self.columnconfigure(0, weight=1)
+
+        # optional callback filling subFrame, it is only called the first time the frame is expanded
+        self.createContent = createContent
+        self.contentCreated = False
+        self.rowconfigure(1, weight=1)
 
         self.show = tk.BooleanVar()
         self.show.set(False)
@@ -98,15 +418,148 @@ class CollapsibleFrame(tk.Frame):
                                             variable=self.show, style='Toolbutton')
         self.toggleButton.grid(row=0, column=0)
 
-        ttk.Label(self.mainFrame, text=text).grid(row=0, column=1)
+        self.titleLabel = ttk.Label(self.mainFrame, text=text)
+        self.titleLabel.grid(row=0, column=1)
 
         # insert all sub elements into this subFrame
         self.subFrame = tk.Frame(self, relief="sunken", borderwidth=1)
+        self.subFrame.grid(row=1, column=0, sticky="nsew")
+        self.subFrame.grid_remove()
 
     def toggle(self) -> None:
-        if self.show.get():
+        self.setExpanded(self.show.get())
+
+    def setExpanded(self, expanded : bool) -> None:
+        self.show.set(expanded)
+        if expanded:
+            if self.createContent is not None and not self.contentCreated:
+                self.createContent(self.subFrame)
+                self.contentCreated = True
             self.subFrame.grid()
             self.toggleButton.configure(text='-')
         else:
-            self.subFrame.grid_forget()
+            self.subFrame.grid_remove()
             self.toggleButton.configure(text='+')
+
+class JobLog:
+    """
+        Output and result of a single job.
+        A JobLogRow is bound to it while it is visible in the JobLogList.
+    """
+
+    def __init__(self, title : str, maxBufferedLines : int = DEFAULT_MAX_BUFFERED_LINES) -> None:
+        self.title = title
+        self.buffer = RingBufferLog(maxBufferedLines, spillName=title)
+        self.handledSuccessfully = None
+        self.expanded = False
+        self.boundRow = None
+
+    def append(self, text : str) -> None:
+        self.buffer.append(text)
+        if self.boundRow is not None:
+            self.boundRow.appendText(text)
+
+    def getText(self) -> str:
+        return self.buffer.getText()
+
+    def setResult(self, handledSuccessfully : bool) -> None:
+        self.handledSuccessfully = handledSuccessfully
+        if self.boundRow is not None:
+            self.boundRow.refreshStatus()
+
+class JobLogRow(CollapsibleFrame):
+    """
+        Collapsible output of the JobLog bound to it.
+        The text widget is only created when the row is first expanded
+        and only holds text while the row is expanded.
+    """
+
+    def __init__(self, parent, getImage, onToggled) -> None:
+        CollapsibleFrame.__init__(self, parent, relief="raised", borderwidth=1, createContent=self.createTextArea)
+
+        self.getImage = getImage
+        self.onToggled = onToggled
+        self.jobLog = None
+
+        self.statusLabel = ttk.Label(self.mainFrame)
+        self.statusLabel.grid(row=0, column=2)
+        self.textArea = None
+
+    def createTextArea(self, subFrame) -> None:
+        subFrame.columnconfigure(0, weight=1)
+        subFrame.rowconfigure(0, weight=1)
+        self.textArea = tk.Text(subFrame, wrap=tk.WORD, height=5)
+        self.textArea.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+
+    def showJobLog(self, jobLog : JobLog) -> None:
+        self.clearJobLog()
+        self.jobLog = jobLog
+        jobLog.boundRow = self
+
+        self.titleLabel.configure(text=jobLog.title)
+        self.setExpanded(jobLog.expanded)
+        self.refreshText()
+        self.refreshStatus()
+
+    def clearJobLog(self) -> None:
+        if self.jobLog is not None and self.jobLog.boundRow is self:
+            self.jobLog.boundRow = None
+        self.jobLog = None
+
+    def refreshText(self) -> None:
+        if self.textArea is None:
+            return
+        self.textArea.delete("1.0", tk.END)
+        if self.jobLog.expanded:
+            self.textArea.insert(tk.END, self.jobLog.getText())
+
+    def appendText(self, text : str) -> None:
+        if self.textArea is None or not self.jobLog.expanded:
+            return
+        self.textArea.insert(tk.END, text)
+
+        # keep the widget bounded the same way as the buffer behind it
+        numExtraLines = int(self.textArea.index("end-1c").split(".")[0]) - self.jobLog.buffer.lines.maxlen
+        if numExtraLines > 0:
+            self.textArea.delete("1.0", f"{numExtraLines + 1}.0")
+
+    def refreshStatus(self) -> None:
+        if self.jobLog.handledSuccessfully is None:
+            self.statusLabel.configure(image="")
+        else:
+            self.statusLabel.configure(image=self.getImage("success" if self.jobLog.handledSuccessfully else "error"))
+
+    def toggle(self) -> None:
+        CollapsibleFrame.toggle(self)
+        if self.jobLog is not None:
+            self.jobLog.expanded = self.show.get()
+            self.refreshText()
+            self.onToggled()
+
+class JobLogList:
+    """
+        Virtualized list of per job logs, the text of a job is only
+        put into a widget while the job is visible and expanded
+    """
+
+    COLLAPSED_ROW_HEIGHT = 40
+    EXPANDED_ROW_HEIGHT = 180
+
+    def __init__(self, root, getImage, height=None) -> None:
+        self.virtualList = VirtualList(
+            root,
+            lambda parent: JobLogRow(parent, getImage, self.virtualList.refreshRowHeights),
+            lambda row, jobLog: row.showJobLog(jobLog),
+            lambda jobLog: JobLogList.EXPANDED_ROW_HEIGHT if jobLog.expanded else JobLogList.COLLAPSED_ROW_HEIGHT,
+            unbindRow=lambda row: row.clearJobLog(),
+            height=height
+        )
+
+    def __getattr__(self, item):
+        return getattr(self.virtualList, item)
+
+    def addJobLog(self, jobLog : JobLog) -> None:
+        self.virtualList.appendItem(jobLog)
+
+    def clear(self) -> None:
+        self.virtualList.setItems([])
@@ -0,0 +1,106 @@
+import json
+from threading import Lock
+from typing import Optional, Tuple
+
+from appPaths import getDataFilePath
+from jobMetrics import RunMetrics, writeFileAtomically
+from wingetJobs import JobPhase, WingetQueueMessage
+
+DURATION_HISTORY_FILE_NAME = "durationHistory.json"
+# weight of the newest run in the smoothed durations
+DURATION_HISTORY_SMOOTHING = 0.3
+
+class PackageDurations:
+    """
+        Smoothed durations of the download and install phase of a package
+    """
+
+    def __init__(self, downloadSeconds : Optional[float] = None, installSeconds : Optional[float] = None, numRuns : int = 0) -> None:
+        self.downloadSeconds = downloadSeconds
+        self.installSeconds = installSeconds
+        self.numRuns = numRuns
+
+    def addRun(self, downloadSeconds : Optional[float], installSeconds : Optional[float]) -> None:
+        self.downloadSeconds = smoothDuration(self.downloadSeconds, downloadSeconds)
+        self.installSeconds = smoothDuration(self.installSeconds, installSeconds)
+        self.numRuns += 1
+
+class DurationHistory:
+    """
+        Durations of the previous runs of every package, kept in the data directory.
+        Used to order batches, to weight the progress of their jobs and to estimate
+        how long a batch still takes. Durations are per operation, since uninstalling
+        usually takes a fraction of the time of installing.
+    """
+
+    def __init__(self, historyPath : Optional[str] = None) -> None:
+        self.historyPath = historyPath or getDataFilePath(DURATION_HISTORY_FILE_NAME)
+        self.lock = Lock()
+        self.durations = self.load()
+
+    @staticmethod
+    def getKey(job : WingetQueueMessage) -> str:
+        return f"{job.operation.value}:{job.wingetId.lower()}"
+
+    def load(self) -> dict:
+        try:
+            with open(self.historyPath, encoding="utf-8") as historyFile:
+                return {key : PackageDurations(**durations) for key, durations in json.load(historyFile).items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return dict()
+
+    def save(self) -> None:
+        with self.lock:
+            data = {key : vars(durations) for key, durations in self.durations.items()}
+        try:
+            writeFileAtomically(self.historyPath, json.dumps(data))
+        except OSError:
+            pass
+
+    def get(self, job : WingetQueueMessage) -> Optional[PackageDurations]:
+        with self.lock:
+            return self.durations.get(DurationHistory.getKey(job))
+
+    def getExpectedDuration(self, job : WingetQueueMessage) -> Optional[float]:
+        durations = self.get(job)
+        if durations is None or durations.installSeconds is None:
+            return None
+        return (durations.downloadSeconds or 0.0) + durations.installSeconds
+
+    def recordBatch(self, runMetrics : RunMetrics) -> None:
+        """
+            Adds the phase durations of the jobs of a batch that succeeded. Jobs of a
+            winget import run are left out, they share a single process.
+        """
+        with self.lock:
+            for jobMetrics in runMetrics.getAllJobMetrics():
+                processes = [processMetrics for processMetrics in jobMetrics.processes if processMetrics.exitTime is not None]
+                if not jobMetrics.handledSuccessfully or jobMetrics.skipped or any(processMetrics.phase == JobPhase.IMPORT for processMetrics in processes):
+                    continue
+
+                # the download phase runs no process when the installer came from the package cache
+                downloadSeconds = [processMetrics.exitTime - processMetrics.startTime for processMetrics in processes if processMetrics.phase == JobPhase.DOWNLOAD]
+                installSeconds = [processMetrics.exitTime - processMetrics.startTime for processMetrics in processes if processMetrics.phase == JobPhase.INSTALL]
+                if not installSeconds:
+                    continue
+
+                durations = self.durations.setdefault(DurationHistory.getKey(jobMetrics.job), PackageDurations())
+                durations.addRun(sum(downloadSeconds) if downloadSeconds else None, sum(installSeconds))
+
+def smoothDuration(previousSeconds : Optional[float], seconds : Optional[float]) -> Optional[float]:
+    if seconds is None:
+        return previousSeconds
+    if previousSeconds is None:
+        return seconds
+    return previousSeconds + DURATION_HISTORY_SMOOTHING * (seconds - previousSeconds)
+
+def splitExpectedDuration(job : WingetQueueMessage, expectedSeconds : float, downloadShare : float,
+                          durations : Optional[PackageDurations] = None) -> Tuple[float, float]:
+    """
+        Expected download and install seconds of a job, from its history when it has one
+    """
+    if not job.operation.downloadsInstaller():
+        return 0.0, expectedSeconds
+    if durations is not None and durations.downloadSeconds is not None and durations.installSeconds is not None:
+        return durations.downloadSeconds, durations.installSeconds
+    return expectedSeconds * downloadShare, expectedSeconds * (1 - downloadShare)
@@ -0,0 +1,443 @@
+import os
+import tempfile
+from threading import Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from catalog import ProgramCatalog
+from durationHistory import DurationHistory, splitExpectedDuration
+from installedState import AvailableUpgradesCache, InstalledStateCache, InstalledStateIndex, buildUpgradeJobs, skipNoOpJobs
+from jobFailures import FailureCategory, FailureClassifier, RetryPolicy, getFailureDescription, DEFAULT_RETRY_POLICIES
+from jobJournal import JobJournal
+from jobMetrics import RunMetrics
+from jobProgress import BatchProgress, ProgressStage, WingetProgressParser
+from packageCache import CachedInstaller, PackageCache, SUCCESSFUL_INSTALLER_EXIT_CODES, buildInstallerCommand, buildWingetShowCommand, findDownloadedInstaller, parseInstallerManifest, parseWingetShow
+from processRunner import StreamingProcess
+from scheduler import Schedule, addPrerequisiteJobs, buildSchedule, getCatalogDuration, DEFAULT_EXPECTED_DURATION_SECONDS, ESTIMATED_DOWNLOAD_SHARE
+from uiEvents import JobStartedEvent, JobOutputEvent, JobFinishedEvent, AllJobsFinishedEvent, BatchProgressEvent
+from wingetBatch import ImportOutputParser, ImportResult, buildWingetImportCommand, writeImportManifest
+from wingetJobs import OperationType, JobPhase, WingetQueueMessage, WingetWorkerPool, buildWingetCommand, DEFAULT_NUM_DOWNLOAD_WORKERS
+
+class EngineOptions:
+    """
+        Options of a single batch of jobs
+    """
+
+    def __init__(self, requireUserInput : bool = False, numDownloadWorkers : int = DEFAULT_NUM_DOWNLOAD_WORKERS,
+                 useImport : bool = False, skipInstalled : bool = True, usePackageCache : bool = False,
+                 retryFailedJobs : bool = True) -> None:
+        self.requireUserInput = requireUserInput
+        self.numDownloadWorkers = numDownloadWorkers
+        self.useImport = useImport
+        self.skipInstalled = skipInstalled
+        self.usePackageCache = usePackageCache
+        self.retryFailedJobs = retryFailedJobs
+
+    @classmethod
+    def fromDict(cls, data : dict) -> "EngineOptions":
+        return cls(**{key : value for key, value in data.items() if key in (
+            "requireUserInput", "numDownloadWorkers", "useImport", "skipInstalled", "usePackageCache", "retryFailedJobs"
+        )})
+
+    def toDict(self) -> dict:
+        return {
+            "requireUserInput" : self.requireUserInput,
+            "numDownloadWorkers" : self.numDownloadWorkers,
+            "useImport" : self.useImport,
+            "skipInstalled" : self.skipInstalled,
+            "usePackageCache" : self.usePackageCache,
+            "retryFailedJobs" : self.retryFailedJobs,
+        }
+
+class BatchPlan:
+    """
+        Jobs of a batch in the order they will be submitted, and the jobs that are skipped
+    """
+
+    def __init__(self, jobsToRun : List[WingetQueueMessage], skippedJobs : List[WingetQueueMessage], schedule : Schedule) -> None:
+        self.jobsToRun = jobsToRun
+        self.skippedJobs = skippedJobs
+        self.schedule = schedule
+
+class WingetEngine:
+    """
+        Plans and runs winget jobs, independent of any UI.
+        Progress is reported by posting JobStartedEvent, JobOutputEvent, JobFinishedEvent
+        and AllJobsFinishedEvent to postEvent, which is called from worker threads.
+        The GUI forwards these events to its UiEventPump, the headless CLI reads them from a queue.
+        With a journal, every job is recorded as planned, started and finished so an
+        interrupted batch can be resumed. Programs are installed with winget install, only with
+        usePackageCache installers are prefetched in parallel, taken from (and added to) the package
+        cache and run directly from the cached file. winget install is the fallback for installers
+        that can not be run directly or that fail.
+        With a catalog, prerequisites of the selected programs are added to the batch
+        and the batch is ordered by the scheduler.
+        The timings of every batch are collected in metrics and added to the duration history,
+        which the scheduler and the progress of the next batches are based on.
+        The progress of the running batch is kept in progress, BatchProgressEvent is posted
+        whenever the progress parsed from the output of a job changed.
+        Failed commands are classified from their exit code and output, installs that
+        failed for a transient reason are retried according to retryPolicies.
+        The packages with a newer version are taken from a cached `winget upgrade` listing,
+        compared against the catalog by getUpgradeJobs.
+    """
+
+    def __init__(self, postEvent : Callable[[object], None], installedStateCache : Optional[InstalledStateCache] = None,
+                 wingetExecutable : List[str] = ["winget"], journal : Optional[JobJournal] = None,
+                 packageCache : Optional[PackageCache] = None, programCatalog : Optional[ProgramCatalog] = None,
+                 metrics : Optional[RunMetrics] = None, durationHistory : Optional[DurationHistory] = None,
+                 retryPolicies : Optional[Dict[FailureCategory, RetryPolicy]] = None,
+                 availableUpgradesCache : Optional[AvailableUpgradesCache] = None) -> None:
+        self.postEvent = postEvent
+        self.programCatalog = programCatalog
+        self.wingetExecutable = wingetExecutable
+        self.installedStateCache = installedStateCache or InstalledStateCache(wingetExecutable=wingetExecutable)
+        self.availableUpgradesCache = availableUpgradesCache or AvailableUpgradesCache(wingetExecutable=wingetExecutable)
+        self.journal = journal
+        self.packageCache = packageCache
+        self.metrics = metrics or RunMetrics()
+        self.durationHistory = durationHistory or DurationHistory()
+        self.progress = BatchProgress(self.getExpectedDurations)
+        self.retryPolicies = retryPolicies or DEFAULT_RETRY_POLICIES
+        self.requireUserInput = False
+        self.usePackageCache = False
+        self.retryFailedJobs = True
+
+        self.pool = WingetWorkerPool(
+            self.handleSingleProgram,
+            self.onWorkerJobFinished,
+            self.onAllJobsFinished,
+            DEFAULT_NUM_DOWNLOAD_WORKERS,
+            self.handleImportBatch,
+            self.getRetryDelay,
+            self.metrics.recordJobQueued
+        )
+        self.counters = self.pool.counters
+
+    def stop(self) -> None:
+        self.pool.stop()
+
+    def getExpectedDuration(self, job : WingetQueueMessage) -> Optional[float]:
+        return self.durationHistory.getExpectedDuration(job) or getCatalogDuration(job, self.programCatalog)
+
+    def getExpectedDurations(self, job : WingetQueueMessage) -> Tuple[float, float]:
+        """
+            Expected download and install seconds of a job
+        """
+        expectedSeconds = self.getExpectedDuration(job) or DEFAULT_EXPECTED_DURATION_SECONDS
+        return splitExpectedDuration(job, expectedSeconds, ESTIMATED_DOWNLOAD_SHARE, self.durationHistory.get(job))
+
+    def getUpgradeJobs(self, refresh : bool = False) -> Optional[List[WingetQueueMessage]]:
+        """
+            Upgrade jobs for every program of the catalog that has a newer version available.
+            The cached `winget upgrade` listing is used unless it is stale or refresh is set.
+            Returns None if winget could not be run.
+        """
+        upgradesIndex = self.availableUpgradesCache.refresh() if refresh else self.availableUpgradesCache.get()
+        if upgradesIndex is None:
+            return None
+        return buildUpgradeJobs(upgradesIndex, self.programCatalog)
+
+    def getUpgradeJobsInBackground(self, onListed : Callable[[Optional[List[WingetQueueMessage]]], None], refresh : bool = False) -> None:
+        Thread(target=lambda: onListed(self.getUpgradeJobs(refresh)), daemon=True).start()
+
+    def planBatch(self, jobs : List[WingetQueueMessage], options : EngineOptions,
+                  installedStateIndex : Optional[InstalledStateIndex]) -> BatchPlan:
+        """
+            Adds the prerequisites of the selected programs, splits off the jobs that can
+            be skipped and orders the rest. Does not run anything, so it doubles as a dry run.
+        """
+        if self.programCatalog is not None:
+            jobs = addPrerequisiteJobs(jobs, self.programCatalog)
+
+        jobsToRun, skippedJobs = jobs, []
+        if options.skipInstalled:
+            jobsToRun, skippedJobs = skipNoOpJobs(jobs, installedStateIndex)
+
+        schedule = buildSchedule(jobsToRun, self.programCatalog, options.numDownloadWorkers, self.getExpectedDuration)
+        return BatchPlan(schedule.getJobs(), skippedJobs, schedule)
+
+    def runBatch(self, jobs : List[WingetQueueMessage], options : EngineOptions,
+                 installedStateIndex : Optional[InstalledStateIndex] = None) -> BatchPlan:
+        """
+            Starts a batch of jobs and returns its plan.
+            Returns immediately, AllJobsFinishedEvent is posted once the batch is done.
+        """
+        self.counters.reset()
+        self.requireUserInput = options.requireUserInput
+        self.usePackageCache = options.usePackageCache
+        self.retryFailedJobs = options.retryFailedJobs
+        if self.usePackageCache:
+            if self.packageCache is None:
+                self.packageCache = PackageCache.fromEnvironment()
+            self.packageCache.stats.reset()
+        self.pool.setNumDownloadWorkers(options.numDownloadWorkers)
+        # winget install downloads the installer itself, a prefetched one is only used from the package cache
+        self.pool.prefetchInstallers = self.usePackageCache
+
+        batchPlan = self.planBatch(jobs, options, installedStateIndex)
+        self.metrics.startBatch(batchPlan.jobsToRun + batchPlan.skippedJobs)
+        self.progress.startBatch(batchPlan.jobsToRun, batchPlan.schedule.makespanSeconds)
+        if self.journal is not None:
+            self.journal.startBatch(batchPlan.jobsToRun + batchPlan.skippedJobs, options.toDict())
+
+        for job in batchPlan.skippedJobs:
+            additionalInfo = {
+                OperationType.INSTALL : "already installed and up to date",
+                OperationType.UNINSTALL : "not installed",
+                OperationType.UPGRADE : "up to date or not installed",
+            }[job.operation]
+            self.postEvent(JobOutputEvent(job, f"Skipped {job.programName}, it is {additionalInfo}.\n"))
+            self.postEvent(JobFinishedEvent(job, True))
+            self.metrics.recordJobFinished(job, True, skipped=True)
+            if self.journal is not None:
+                self.journal.recordFinished(job, True, skipped=True)
+
+        self.pool.submitBatch(batchPlan.jobsToRun, useImport=options.useImport)
+        return batchPlan
+
+    def handleSingleProgram(self, job : WingetQueueMessage, phase : JobPhase) -> bool:
+        # runs on a worker thread
+        handledSuccessfully = self.handlePhase(job, phase)
+        self.metrics.recordPhaseFinished(job, phase, handledSuccessfully)
+        if phase == JobPhase.DOWNLOAD and handledSuccessfully:
+            self.progress.finishStage(job, ProgressStage.DOWNLOAD)
+        return handledSuccessfully
+
+    def handlePhase(self, job : WingetQueueMessage, phase : JobPhase) -> bool:
+        try:
+            if phase == JobPhase.DOWNLOAD:
+                return self.prefetchInstaller(job)
+
+            if phase == JobPhase.INSTALL and job.installer is not None:
+                installerCommand = buildInstallerCommand(job.installer, self.requireUserInput)
+                if installerCommand is not None:
+                    try:
+                        if self.runCachedInstaller(job, installerCommand):
+                            return True
+                        # e.g. a per machine installer that needs the elevation winget asks for
+                        self.postEvent(JobOutputEvent(job, f"Running winget {job.operation.value} instead.\n"))
+                    except OSError as e:
+                        self.postEvent(JobOutputEvent(job, f"Could not run the prefetched installer ({e}), running winget {job.operation.value} instead.\n"))
+
+            return self.runWingetPhase(job, phase)
+        except Exception as e:
+            self.postEvent(JobOutputEvent(job, f"Failed to {phase.value} {job.programName}. Caught exception: {e}\n"))
+            return False
+
+    def runCommand(self, job : WingetQueueMessage, phase : JobPhase, command : List[str], stage : ProgressStage) -> int:
+        """
+            Runs a command of a job, streaming its output as events, and returns its exit code.
+            The progress of the job is parsed from the output, starting at the given stage.
+        """
+        self.postEvent(JobStartedEvent(job, phase, command))
+        if self.journal is not None:
+            self.journal.recordStarted(job, phase)
+
+        progressParser = WingetProgressParser(stage)
+        self.progress.startStage(job, stage)
+
+        def onStdoutText(text : str) -> None:
+            # runs on the stdout reader thread of the process
+            if progressParser.feed(text):
+                self.progress.setParsedProgress(job, progressParser)
+                self.postEvent(BatchProgressEvent())
+
+        processMetrics = self.metrics.startProcess(job, phase)
+        failureClassifier = FailureClassifier()
+        process = StreamingProcess(command, onStdoutText=onStdoutText)
+
+        for output in process.lines():
+            self.metrics.recordProcessOutput(processMetrics)
+            output = output.strip()
+            failureClassifier.feed(output)
+            if len(output) > 1:
+                self.postEvent(JobOutputEvent(job, f"{output}\n"))
+
+        job.returncode = process.returncode
+        job.failureCategory = failureClassifier.classify(process.returncode) if process.returncode != 0 else None
+        self.metrics.recordProcessSpawned(processMetrics, process.spawnTime)
+        self.metrics.recordProcessExited(processMetrics, process.returncode, process.numOutputBytes)
+        return process.returncode
+
+    def runWingetPhase(self, job : WingetQueueMessage, phase : JobPhase) -> bool:
+        programName = job.programName
+        operation = job.operation
+        postEvent = self.postEvent
+
+        # winget install and upgrade download the installer before they install it
+        stage = ProgressStage.DOWNLOAD if phase == JobPhase.DOWNLOAD or operation.downloadsInstaller() else ProgressStage.INSTALL
+        returncode = self.runCommand(job, phase, buildWingetCommand(job, phase, self.requireUserInput, self.wingetExecutable), stage)
+
+        if returncode == 0:
+            if phase == JobPhase.DOWNLOAD:
+                postEvent(JobOutputEvent(job, f"{programName} has been downloaded successfully.\n"))
+            else:
+                postEvent(JobOutputEvent(job, f"{programName} has been {operation.getPastTense()} successfully.\n"))
+            return True
+
+        if phase == JobPhase.DOWNLOAD:
+            postEvent(JobOutputEvent(job, f"{programName} could not be downloaded ahead of time, winget {operation.value} will download it.\n"))
+            return False
+
+        if self.retryPolicies.get(job.failureCategory, RetryPolicy()).succeeded:
+            postEvent(JobOutputEvent(job, f"{programName} needs no changes, {getFailureDescription(job.failureCategory)}.\n"))
+            return True
+
+        postEvent(JobOutputEvent(job, f"{programName} was not {operation.getPastTense()}, {getFailureDescription(job.failureCategory)} (exit code {returncode}).\n"))
+        return False
+
+    def prefetchInstaller(self, job : WingetQueueMessage) -> bool:
+        """
+            Download phase with the package cache: the installer is taken from the cache
+            (or its mirror) when winget reports a version and hash that is cached,
+            otherwise it is downloaded with winget and added to the cache
+        """
+        showProcess = StreamingProcess(buildWingetShowCommand(job.wingetId, self.wingetExecutable), encoding="utf-8")
+        packageInfo = parseWingetShow(job.wingetId, showProcess.lines())
+
+        if packageInfo is None:
+            self.packageCache.stats.recordMiss()
+        else:
+            installer = self.packageCache.lookup(packageInfo)
+            if installer is not None:
+                job.installer = self.packageCache.materialize(installer, job.downloadDirectory)
+                self.postEvent(JobOutputEvent(job, f"{job.programName} {packageInfo.version} was found in the package cache.\n"))
+                return True
+
+        if not self.runWingetPhase(job, JobPhase.DOWNLOAD):
+            return False
+
+        job.installer = self.getDownloadedInstaller(job, packageInfo.installerType if packageInfo is not None else None)
+        if packageInfo is not None and job.installer is not None:
+            if self.packageCache.store(packageInfo, job.installer.installerPath, job.installer.installerType, job.installer.silentSwitch) is not None:
+                self.postEvent(JobOutputEvent(job, f"{job.programName} {packageInfo.version} has been added to the package cache.\n"))
+        return True
+
+    def getDownloadedInstaller(self, job : WingetQueueMessage, defaultInstallerType : Optional[str] = None) -> Optional[CachedInstaller]:
+        """
+            Installer written to the download directory by `winget download`, with the installer type
+            and silent switch of the manifest next to it. None if the installer type is not known,
+            such an installer is left to winget.
+        """
+        installerPath, manifestPath = findDownloadedInstaller(job.downloadDirectory)
+        if installerPath is None:
+            return None
+
+        installerType, silentSwitch = None, None
+        if manifestPath is not None:
+            with open(manifestPath, encoding="utf-8", errors="replace") as manifestFile:
+                installerType, silentSwitch = parseInstallerManifest(manifestFile.read())
+
+        installerType = installerType or defaultInstallerType
+        return CachedInstaller(installerPath, installerType, silentSwitch) if installerType else None
+
+    def runCachedInstaller(self, job : WingetQueueMessage, installerCommand : List[str]) -> bool:
+        returncode = self.runCommand(job, JobPhase.INSTALL, installerCommand, ProgressStage.INSTALL)
+
+        if returncode in SUCCESSFUL_INSTALLER_EXIT_CODES:
+            restartInfo = " A restart is required to finish it." if job.failureCategory == FailureCategory.REBOOT_REQUIRED else ""
+            self.postEvent(JobOutputEvent(job, f"{job.programName} has been {job.operation.getPastTense()} successfully from the prefetched installer.{restartInfo}\n"))
+            return True
+
+        self.postEvent(JobOutputEvent(job, f"{job.programName} was not {job.operation.getPastTense()}, {getFailureDescription(job.failureCategory)} (its installer exited with code {returncode}).\n"))
+        return False
+
+    def getRetryDelay(self, job : WingetQueueMessage, phase : JobPhase) -> Optional[float]:
+        # runs on the install thread after a failed install phase
+        retryPolicy = self.retryPolicies.get(job.failureCategory)
+        if not self.retryFailedJobs or retryPolicy is None or job.numRetries >= retryPolicy.maxRetries:
+            return None
+
+        job.numRetries += 1
+        retryDelay = retryPolicy.getDelay(job.numRetries)
+        self.postEvent(JobOutputEvent(job, f"Retrying to {phase.value} {job.programName} in {retryDelay:.0f} s "
+                                           f"({job.failureCategory.value}, retry {job.numRetries} of {retryPolicy.maxRetries}).\n"))
+        return retryDelay
+
+    def handleImportBatch(self, jobs : List[WingetQueueMessage]) -> Dict[WingetQueueMessage, Optional[bool]]:
+        # runs on the install thread
+        jobsByWingetId = {job.wingetId : job for job in jobs}
+        postEvent = self.postEvent
+
+        manifestFileDescriptor, manifestPath = tempfile.mkstemp(prefix="simpleDownloader-", suffix=".json")
+        os.close(manifestFileDescriptor)
+
+        try:
+            writeImportManifest(jobs, manifestPath)
+            wingetOptions = buildWingetImportCommand(manifestPath, self.requireUserInput, self.wingetExecutable)
+            for job in jobs:
+                postEvent(JobStartedEvent(job, JobPhase.IMPORT, wingetOptions))
+                if self.journal is not None:
+                    self.journal.recordStarted(job, JobPhase.IMPORT)
+
+            importOutputParser = ImportOutputParser(list(jobsByWingetId))
+            failureClassifiers = {job : FailureClassifier() for job in jobs}
+            processMetrics = {job : self.metrics.startProcess(job, JobPhase.IMPORT) for job in jobs}
+            # the output of the single import process is split between its jobs, so are its bytes
+            numOutputBytes = {job : 0 for job in jobs}
+            process = StreamingProcess(wingetOptions)
+
+            for output in process.lines():
+                output = output.strip()
+                wingetId = importOutputParser.feed(output)
+                if wingetId is not None:
+                    job = jobsByWingetId[wingetId]
+                    # winget imports the packages one after the other
+                    self.progress.startStage(job, ProgressStage.INSTALL)
+                    self.metrics.recordProcessOutput(processMetrics[job])
+                    failureClassifiers[job].feed(output)
+                    numOutputBytes[job] += len(output.encode("utf-8")) + 1
+                    if len(output) > 1:
+                        postEvent(JobOutputEvent(job, f"{output}\n"))
+
+            results = importOutputParser.getResults(process.returncode)
+            for job in jobs:
+                job.returncode = process.returncode
+                self.metrics.recordProcessSpawned(processMetrics[job], process.spawnTime)
+                self.metrics.recordProcessExited(processMetrics[job], process.returncode, numOutputBytes[job])
+                self.metrics.recordPhaseFinished(job, JobPhase.IMPORT, results.get(job.wingetId) == ImportResult.INSTALLED)
+        finally:
+            os.remove(manifestPath)
+
+        handledJobs = dict()
+        for wingetId, result in results.items():
+            job = jobsByWingetId[wingetId]
+            if result == ImportResult.INSTALLED:
+                job.failureCategory = None
+                postEvent(JobOutputEvent(job, f"{job.programName} has been installed successfully.\n"))
+                handledJobs[job] = True
+                continue
+
+            # the exit code of the import is shared by all of its packages, only the output of this one is used
+            job.failureCategory = failureClassifiers[job].classify(None)
+            if result == ImportResult.ALREADY_INSTALLED and job.failureCategory == FailureCategory.UNKNOWN:
+                job.failureCategory = FailureCategory.ALREADY_INSTALLED
+
+            if self.retryPolicies.get(job.failureCategory, RetryPolicy()).succeeded:
+                postEvent(JobOutputEvent(job, f"{job.programName} needs no changes, {getFailureDescription(job.failureCategory)}.\n"))
+                handledJobs[job] = True
+            else:
+                postEvent(JobOutputEvent(job, f"{job.programName} was not installed by the batch, {getFailureDescription(job.failureCategory)}, retrying it with a separate winget run.\n"))
+                handledJobs[job] = None
+
+        return handledJobs
+
+    def onWorkerJobFinished(self, job : WingetQueueMessage, handledSuccessfully : bool) -> None:
+        # whatever the outcome, the installed state snapshot can not be trusted anymore
+        self.installedStateCache.invalidate()
+        if handledSuccessfully:
+            self.availableUpgradesCache.discard(job.wingetId)
+        if self.journal is not None:
+            self.journal.recordFinished(job, handledSuccessfully)
+        self.metrics.recordJobFinished(job, handledSuccessfully)
+        self.progress.finishJob(job)
+        self.postEvent(JobFinishedEvent(job, handledSuccessfully))
+
+    def onAllJobsFinished(self) -> None:
+        self.metrics.finishBatch()
+        self.progress.finishBatch()
+        self.durationHistory.recordBatch(self.metrics)
+        self.durationHistory.save()
+        if self.journal is not None:
+            self.journal.finishBatch()
+        self.postEvent(AllJobsFinishedEvent())
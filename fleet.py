@@ -0,0 +1,408 @@
+import json
+import os
+import re
+import sys
+from abc import ABC, abstractmethod
+from enum import Enum
+from threading import Condition, Lock, Thread
+from typing import Callable, Dict, List, Optional
+
+from engine import EngineOptions
+from processRunner import StreamingProcess
+from profiles import Profile
+from wingetJobs import OperationType
+
+DEFAULT_MAX_PARALLEL_TARGETS = 8
+# installers can not overlap on a single machine, so a second run on the same host would only wait
+DEFAULT_MAX_RUNS_PER_HOST = 1
+
+# options of the headless mode that are not engine options, carried in the options of a fleet profile
+# and passed on to every target with these command line flags, flags without a value are switches
+HEADLESS_PROFILE_OPTIONS = {
+    "cacheDirectory" : "--cache-dir",
+    "mirror" : "--mirror",
+    "refreshUpgrades" : "--refresh-upgrades",
+    "verbose" : "--verbose",
+}
+HEADLESS_PROFILE_SWITCHES = ("refreshUpgrades", "verbose")
+
+# printed by the headless mode for every finished program, e.g. "[3/10] Git: done (45%, about 2 min 10 s left)"
+HEADLESS_PROGRESS_PATTERN = re.compile(
+    r"^\[(?P<numFinished>\d+)/(?P<numJobs>\d+)\] (?P<programName>.*): (?P<result>done|skipped|FAILED)"
+    r"(?: \((?P<percent>\d+)%, about (?P<remainingTime>.+) left\))?$"
+)
+
+class FleetError(ValueError):
+    pass
+
+class FleetTarget:
+    """
+        A machine to provision and how to reach it.
+        command, when given, is the command line that starts the headless mode on the target,
+        see CommandExecutor. Without it the target is provisioned by a local subprocess
+        with environment added to its environment variables.
+    """
+
+    def __init__(self, name : str, host : Optional[str] = None, command : Optional[List[str]] = None,
+                 environment : Optional[Dict[str, str]] = None, numDownloadWorkers : Optional[int] = None) -> None:
+        self.name = name
+        self.host = host or name
+        self.command = command
+        self.environment = environment or dict()
+        self.numDownloadWorkers = numDownloadWorkers
+
+    @classmethod
+    def fromDict(cls, data, sourceName : str, defaultCommand : Optional[List[str]] = None) -> "FleetTarget":
+        if isinstance(data, str):
+            data = {"name" : data}
+        if not isinstance(data, dict) or not isinstance(data.get("name"), str) or not data["name"]:
+            raise FleetError(f"{sourceName}: every target needs a \"name\"")
+
+        command = data.get("command", defaultCommand)
+        if command is not None and (not isinstance(command, list) or not command or not all(isinstance(part, str) for part in command)):
+            raise FleetError(f"{sourceName}: \"command\" of {data['name']} must be a list of strings")
+
+        environment = data.get("environment", dict())
+        if not isinstance(environment, dict) or not all(isinstance(value, str) for value in environment.values()):
+            raise FleetError(f"{sourceName}: \"environment\" of {data['name']} must be an object of strings")
+
+        numDownloadWorkers = data.get("workers")
+        if numDownloadWorkers is not None and (not isinstance(numDownloadWorkers, int) or numDownloadWorkers < 1):
+            raise FleetError(f"{sourceName}: \"workers\" of {data['name']} must be a positive number")
+
+        return cls(data["name"], data.get("host"), command, environment, numDownloadWorkers)
+
+class Fleet:
+    """
+        Targets that are provisioned together, and how many of them run at once
+    """
+
+    def __init__(self, targets : List[FleetTarget], maxParallelTargets : int = DEFAULT_MAX_PARALLEL_TARGETS,
+                 maxRunsPerHost : int = DEFAULT_MAX_RUNS_PER_HOST) -> None:
+        self.targets = targets
+        self.maxParallelTargets = max(1, maxParallelTargets)
+        self.maxRunsPerHost = max(1, maxRunsPerHost)
+
+    @classmethod
+    def fromDict(cls, data, sourceName : str) -> "Fleet":
+        if not isinstance(data, dict) or not isinstance(data.get("targets"), list) or not data["targets"]:
+            raise FleetError(f"{sourceName}: expected an object with a list of \"targets\"")
+
+        targets = [FleetTarget.fromDict(targetData, sourceName, data.get("command")) for targetData in data["targets"]]
+        if len({target.name for target in targets}) != len(targets):
+            raise FleetError(f"{sourceName}: target names must be unique")
+
+        limits = dict()
+        for key in ("maxParallelTargets", "maxRunsPerHost"):
+            if key in data:
+                if not isinstance(data[key], int) or data[key] < 1:
+                    raise FleetError(f"{sourceName}: \"{key}\" must be a positive number")
+                limits[key] = data[key]
+
+        return cls(targets, **limits)
+
+def loadFleet(fleetPath : str) -> Fleet:
+    """
+        Loads a fleet file, e.g.
+        {"maxParallelTargets" : 8, "command" : ["ssh", "{host}", "python", "C:/SimpleDownloader/main.py", "--headless"],
+         "targets" : [{"name" : "pc-1", "host" : "pc-1.example.com"}, {"name" : "pc-2", "workers" : 2}]}
+    """
+    try:
+        with open(fleetPath, encoding="utf-8") as fleetFile:
+            data = json.load(fleetFile)
+    except (OSError, ValueError) as e:
+        raise FleetError(f"{fleetPath}: {e}")
+
+    return Fleet.fromDict(data, fleetPath)
+
+class RemoteExecutor(ABC):
+    """
+        Runs the headless mode of SimpleDownloader on a target.
+        run() calls onStdoutText with the standard output of the run, which ends with its
+        JSON summary, and onLine with every line of output as it arrives, from the calling
+        thread. It returns the exit code of the headless mode and raises OSError when
+        the target can not be reached.
+    """
+
+    @abstractmethod
+    def run(self, target : FleetTarget, arguments : List[str], onStdoutText : Callable[[str], None], onLine : Callable[[str], None]) -> int:
+        pass
+
+class CommandExecutor(RemoteExecutor):
+    """
+        Starts the headless mode with a command line such as
+        ["ssh", "{host}", "python", "C:/SimpleDownloader/main.py", "--headless"],
+        in which {host} and {name} are replaced by those of the target. The arguments
+        of the run are appended to it.
+    """
+
+    def __init__(self, commandTemplate : List[str], encoding : Optional[str] = None) -> None:
+        self.commandTemplate = commandTemplate
+        self.encoding = encoding
+
+    def buildCommand(self, target : FleetTarget, arguments : List[str]) -> List[str]:
+        return [part.replace("{host}", target.host).replace("{name}", target.name) for part in self.commandTemplate] + arguments
+
+    def getEnvironment(self, target : FleetTarget) -> Optional[Dict[str, str]]:
+        return None
+
+    def run(self, target : FleetTarget, arguments : List[str], onStdoutText : Callable[[str], None], onLine : Callable[[str], None]) -> int:
+        process = StreamingProcess(self.buildCommand(target, arguments), self.encoding, onStdoutText, self.getEnvironment(target))
+        for line in process.lines():
+            onLine(line)
+        return process.returncode
+
+class LocalSubprocessExecutor(CommandExecutor):
+    """
+        Runs the headless mode in a subprocess on this machine, with the environment variables
+        of the target on top of the current ones, e.g. to try out a fleet with the fake winget
+        and a data directory per target
+    """
+
+    def __init__(self) -> None:
+        if getattr(sys, "frozen", False):
+            commandTemplate = [sys.executable, "--headless"]
+        else:
+            commandTemplate = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), "--headless"]
+        super().__init__(commandTemplate, encoding="utf-8")
+
+    def getEnvironment(self, target : FleetTarget) -> Optional[Dict[str, str]]:
+        environment = dict(os.environ)
+        environment.update(target.environment)
+        environment["PYTHONIOENCODING"] = "utf-8"
+        return environment
+
+def getDefaultExecutor(target : FleetTarget) -> RemoteExecutor:
+    return CommandExecutor(target.command) if target.command is not None else LocalSubprocessExecutor()
+
+def buildHeadlessArguments(profile : Profile, numDownloadWorkers : Optional[int] = None) -> List[str]:
+    """
+        Command line arguments of the headless mode that run the profile, so the targets
+        do not need a copy of the profile file
+    """
+    options = EngineOptions.fromDict(profile.options)
+    arguments = ["--workers", str(numDownloadWorkers or options.numDownloadWorkers)]
+
+    if profile.operation == OperationType.UNINSTALL:
+        arguments.append("--uninstall")
+    elif profile.operation == OperationType.UPGRADE:
+        # every target lists its own outdated programs
+        arguments.append("--upgrade" if profile.wingetIds else "--upgrade-all")
+    if options.useImport:
+        arguments.append("--import")
+    if not options.skipInstalled:
+        arguments.append("--no-skip")
+    if options.usePackageCache:
+        arguments.append("--package-cache")
+    if not options.retryFailedJobs:
+        arguments.append("--no-retry")
+    for key, flag in HEADLESS_PROFILE_OPTIONS.items():
+        value = profile.options.get(key)
+        if value and key in HEADLESS_PROFILE_SWITCHES:
+            arguments.append(flag)
+        elif value:
+            arguments.extend([flag, str(value)])
+
+    return arguments + profile.wingetIds
+
+class TargetStatus(str, Enum):
+    PENDING = "pending",
+    RUNNING = "running",
+    SUCCEEDED = "succeeded",
+    FAILED = "failed",
+    UNREACHABLE = "unreachable"
+
+class TargetProgress:
+    """
+        Progress of the run on a single target, taken from the progress lines of its headless mode
+    """
+
+    def __init__(self, target : FleetTarget) -> None:
+        self.target = target
+        self.status = TargetStatus.PENDING
+        self.numFinished = 0
+        self.numJobs = 0
+        self.fraction = 0.0
+        self.remainingTime = None
+        self.lastLine = ""
+        self.returncode = None
+        self.summary = None
+        self.error = None
+
+    def isFinished(self) -> bool:
+        return self.status not in (TargetStatus.PENDING, TargetStatus.RUNNING)
+
+    def format(self) -> str:
+        remainingTime = f", about {self.remainingTime} left" if self.remainingTime and not self.isFinished() else ""
+        details = self.error or self.lastLine
+        return f"{self.target.name}: {self.status.value} {self.numFinished}/{self.numJobs} ({self.fraction:.0%}{remainingTime}) {details}".rstrip()
+
+    def toDict(self) -> dict:
+        return {
+            "name" : self.target.name,
+            "host" : self.target.host,
+            "result" : self.status.value,
+            "returncode" : self.returncode,
+            "error" : self.error,
+            "summary" : self.summary,
+        }
+
+class FleetProgress:
+    """
+        Aggregated progress of all targets of a fleet, updated from the threads that run them
+    """
+
+    def __init__(self, targets : List[FleetTarget]) -> None:
+        self.lock = Lock()
+        self.targetProgress = {target : TargetProgress(target) for target in targets}
+
+    def startTarget(self, target : FleetTarget) -> None:
+        with self.lock:
+            self.targetProgress[target].status = TargetStatus.RUNNING
+
+    def recordLine(self, target : FleetTarget, line : str) -> bool:
+        """
+            Returns True when the line is a progress line of the target
+        """
+        match = HEADLESS_PROGRESS_PATTERN.match(line.strip())
+        if match is None:
+            return False
+
+        with self.lock:
+            targetProgress = self.targetProgress[target]
+            targetProgress.numFinished = int(match.group("numFinished"))
+            targetProgress.numJobs = int(match.group("numJobs"))
+            # the last program of a run prints no estimate
+            if match.group("percent") is not None:
+                targetProgress.fraction = int(match.group("percent")) / 100
+            elif targetProgress.numFinished == targetProgress.numJobs:
+                targetProgress.fraction = 1.0
+            targetProgress.remainingTime = match.group("remainingTime")
+            targetProgress.lastLine = f"{match.group('programName')}: {match.group('result')}"
+        return True
+
+    def finishTarget(self, target : FleetTarget, returncode : Optional[int], summary : Optional[dict], error : Optional[str] = None) -> None:
+        with self.lock:
+            targetProgress = self.targetProgress[target]
+            targetProgress.returncode = returncode
+            targetProgress.summary = summary
+            targetProgress.error = error
+            if error is not None:
+                targetProgress.status = TargetStatus.UNREACHABLE
+            else:
+                targetProgress.status = TargetStatus.SUCCEEDED if returncode == 0 else TargetStatus.FAILED
+                targetProgress.fraction = 1.0
+            if summary is not None:
+                targetProgress.numJobs = summary.get("numJobs", targetProgress.numJobs)
+                targetProgress.numFinished = targetProgress.numJobs
+
+    def getTargetProgress(self) -> List[TargetProgress]:
+        with self.lock:
+            return list(self.targetProgress.values())
+
+    def getFraction(self) -> float:
+        with self.lock:
+            return sum(1.0 if targetProgress.isFinished() else targetProgress.fraction for targetProgress in self.targetProgress.values()) / len(self.targetProgress)
+
+    def formatStatus(self) -> str:
+        fraction = self.getFraction()
+        targetProgress = self.getTargetProgress()
+        numFinished = sum(1 for progress in targetProgress if progress.isFinished())
+        numFailed = sum(1 for progress in targetProgress if progress.status in (TargetStatus.FAILED, TargetStatus.UNREACHABLE))
+        numRunning = sum(1 for progress in targetProgress if progress.status == TargetStatus.RUNNING)
+        failedText = f", {numFailed} failed" if numFailed else ""
+        return f"fleet {fraction:.0%}: {numFinished}/{len(targetProgress)} targets finished{failedText}, {numRunning} running"
+
+    def format(self) -> str:
+        return "\n".join([self.formatStatus()] + [f"    {targetProgress.format()}" for targetProgress in self.getTargetProgress()])
+
+class FleetRun:
+    """
+        Pushes a profile to every target of a fleet. Each target runs the profile as
+        a batch of its own headless mode, with its own download workers. At most
+        maxParallelTargets targets run at once and at most maxRunsPerHost of them on
+        the same host, a target whose host is busy waits while other hosts go ahead.
+        onProgress(targetProgress) is called from the thread of a target whenever it
+        finishes a program or its whole run.
+    """
+
+    def __init__(self, fleet : Fleet, profile : Profile, getExecutor : Callable[[FleetTarget], RemoteExecutor] = getDefaultExecutor,
+                 onProgress : Optional[Callable[[TargetProgress], None]] = None) -> None:
+        self.fleet = fleet
+        self.profile = profile
+        self.getExecutor = getExecutor
+        self.onProgress = onProgress
+        self.progress = FleetProgress(fleet.targets)
+
+        self.condition = Condition()
+        self.pendingTargets = list(fleet.targets)
+        self.numRunsPerHost = dict()
+
+    def getArguments(self, target : FleetTarget) -> List[str]:
+        return buildHeadlessArguments(self.profile, target.numDownloadWorkers)
+
+    def run(self) -> List[TargetProgress]:
+        workerThreads = [Thread(target=self.workerThreadFunc, daemon=True) for _ in range(min(self.fleet.maxParallelTargets, len(self.fleet.targets)))]
+        for workerThread in workerThreads:
+            workerThread.start()
+        for workerThread in workerThreads:
+            workerThread.join()
+        return self.progress.getTargetProgress()
+
+    def takeNextTarget(self) -> Optional[FleetTarget]:
+        with self.condition:
+            while self.pendingTargets:
+                for target in self.pendingTargets:
+                    if self.numRunsPerHost.get(target.host, 0) < self.fleet.maxRunsPerHost:
+                        self.pendingTargets.remove(target)
+                        self.numRunsPerHost[target.host] = self.numRunsPerHost.get(target.host, 0) + 1
+                        return target
+                # every pending target is on a busy host
+                self.condition.wait()
+            return None
+
+    def releaseHost(self, target : FleetTarget) -> None:
+        with self.condition:
+            self.numRunsPerHost[target.host] -= 1
+            self.condition.notify_all()
+
+    def workerThreadFunc(self) -> None:
+        while True:
+            target = self.takeNextTarget()
+            if target is None:
+                break
+            try:
+                self.runTarget(target)
+            finally:
+                self.releaseHost(target)
+
+    def runTarget(self, target : FleetTarget) -> None:
+        self.progress.startTarget(target)
+        stdoutParts = list()
+
+        def onLine(line : str) -> None:
+            if self.progress.recordLine(target, line):
+                self.reportProgress(target)
+
+        try:
+            returncode = self.getExecutor(target).run(target, self.getArguments(target), stdoutParts.append, onLine)
+        except Exception as e:
+            self.progress.finishTarget(target, None, None, f"could not run on {target.host}: {e}")
+        else:
+            self.progress.finishTarget(target, returncode, parseSummary("".join(stdoutParts)))
+        self.reportProgress(target)
+
+    def reportProgress(self, target : FleetTarget) -> None:
+        if self.onProgress is not None:
+            self.onProgress(self.progress.targetProgress[target])
+
+def parseSummary(stdoutText : str) -> Optional[dict]:
+    # anything a remote shell prints before the summary is skipped
+    summaryStart = stdoutText.find("{")
+    if summaryStart == -1:
+        return None
+    try:
+        summary = json.loads(stdoutText[summaryStart:])
+    except ValueError:
+        return None
+    return summary if isinstance(summary, dict) else None
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import math
+import os
+import tkinter as tk
+from threading import Event, Thread
+from typing import Callable, Dict, Optional, Tuple
+
+from appPaths import getDataFilePath
+
+ICON_DIRECTORY = "icons"
+ICON_EXTENSION = ".ico"
+ICON_SIZE = 32
+ATLAS_IMAGE_FILE_NAME = "iconAtlas.png"
+ATLAS_INDEX_FILE_NAME = "iconAtlas.json"
+
+def getIconSignatures(iconDirectory : str) -> Dict[str, str]:
+    """
+        Maps every icon name (file name without extension) to the SHA256 of its content.
+        Most icons have the same size and unpacking a release does not keep mtimes,
+        so only the content tells whether an icon was replaced.
+    """
+    iconSignatures = dict()
+    with os.scandir(iconDirectory) as entries:
+        for entry in entries:
+            if entry.name.endswith(ICON_EXTENSION) and entry.is_file():
+                with open(entry.path, "rb") as iconFile:
+                    iconSignatures[entry.name[:-len(ICON_EXTENSION)]] = hashlib.sha256(iconFile.read()).hexdigest()
+    return iconSignatures
+
+def buildIconAtlas(iconDirectory : str, atlasImagePath : str, atlasIndexPath : str, iconSize : int = ICON_SIZE) -> dict:
+    """
+        Packs every icon of iconDirectory, resized to iconSize, into a single PNG
+        and writes an index with the position of each icon in the atlas
+    """
+    # PIL is only needed when the atlas has to be (re)built
+    from PIL import Image
+
+    iconSignatures = getIconSignatures(iconDirectory)
+    iconNames = sorted(iconSignatures)
+    numColumns = max(1, math.ceil(math.sqrt(len(iconNames))))
+    numRows = max(1, math.ceil(len(iconNames) / numColumns))
+
+    atlasImage = Image.new("RGBA", (numColumns * iconSize, numRows * iconSize), (0, 0, 0, 0))
+    iconPositions = dict()
+
+    for iconIndex, iconName in enumerate(iconNames):
+        x = (iconIndex % numColumns) * iconSize
+        y = (iconIndex // numColumns) * iconSize
+        with Image.open(os.path.join(iconDirectory, iconName + ICON_EXTENSION)) as icon:
+            atlasImage.paste(icon.convert("RGBA").resize((iconSize, iconSize), Image.LANCZOS), (x, y))
+        iconPositions[iconName] = [x, y]
+
+    atlasIndex = {
+        "iconSize" : iconSize,
+        "icons" : iconPositions,
+        "signatures" : iconSignatures,
+    }
+
+    # the index is written last, so an interrupted build never looks valid
+    atlasImage.save(atlasImagePath, optimize=True)
+    with open(atlasIndexPath, "w", encoding="utf-8") as atlasIndexFile:
+        json.dump(atlasIndex, atlasIndexFile)
+
+    return atlasIndex
+
+def loadAtlasIndex(atlasIndexPath : str, iconSignatures : Dict[str, str]) -> Optional[dict]:
+    try:
+        with open(atlasIndexPath, encoding="utf-8") as atlasIndexFile:
+            atlasIndex = json.load(atlasIndexFile)
+    except (OSError, ValueError):
+        return None
+    return atlasIndex if atlasIndex.get("signatures") == iconSignatures else None
+
+def findIconAtlas(iconDirectory : str) -> Tuple[str, dict]:
+    """
+        Returns the image path and index of an atlas that matches the icons, building one
+        if there is none. The atlas shipped next to the icons is used when it matches,
+        otherwise the one in the data directory is used or rebuilt.
+        Does not touch tkinter, so it can run on any thread.
+    """
+    iconSignatures = getIconSignatures(iconDirectory)
+
+    candidates = [
+        (os.path.join(iconDirectory, ATLAS_IMAGE_FILE_NAME), os.path.join(iconDirectory, ATLAS_INDEX_FILE_NAME)),
+        (getDataFilePath(ATLAS_IMAGE_FILE_NAME), getDataFilePath(ATLAS_INDEX_FILE_NAME)),
+    ]
+
+    for atlasImagePath, atlasIndexPath in candidates:
+        atlasIndex = loadAtlasIndex(atlasIndexPath, iconSignatures)
+        if atlasIndex is not None and os.path.exists(atlasImagePath):
+            return atlasImagePath, atlasIndex
+
+    atlasImagePath, atlasIndexPath = candidates[-1]
+    return atlasImagePath, buildIconAtlas(iconDirectory, atlasImagePath, atlasIndexPath)
+
+class IconAtlas:
+    """
+        Lazily cuts program icons out of a prebuilt sprite atlas, see findIconAtlas.
+        The atlas is decoded once with a single PhotoImage, individual icons are
+        only created the first time they are requested.
+        With prepareInBackground, the atlas is found (or built, which takes a while
+        for many icons) on another thread. Icons requested before it is ready are
+        empty, they are filled in by loadPreparedAtlas on the main loop.
+    """
+
+    def __init__(self, iconDirectory : str = ICON_DIRECTORY) -> None:
+        self.iconDirectory = iconDirectory
+        self.images = dict()
+        self.atlasImage = None
+        self.atlasIndex = None
+        self.preparedAtlas = None
+        self.atlasPrepared = None
+
+    def prepareInBackground(self, onPrepared : Callable[[], None]) -> None:
+        """
+            onPrepared is called from the background thread once loadPreparedAtlas can be called
+        """
+        self.atlasPrepared = Event()
+
+        def prepareThreadFunc() -> None:
+            try:
+                self.preparedAtlas = findIconAtlas(self.iconDirectory)
+            except Exception:
+                # loadPreparedAtlas tries again on the main loop and reports the error there
+                self.preparedAtlas = None
+            self.atlasPrepared.set()
+            onPrepared()
+
+        Thread(target=prepareThreadFunc, daemon=True).start()
+
+    def isPreparing(self) -> bool:
+        return self.atlasPrepared is not None and not self.atlasPrepared.is_set()
+
+    def load(self) -> None:
+        atlasImagePath, atlasIndex = self.preparedAtlas or findIconAtlas(self.iconDirectory)
+        self.atlasImage = tk.PhotoImage(file=atlasImagePath)
+        self.atlasIndex = atlasIndex
+
+    def loadPreparedAtlas(self) -> None:
+        """
+            Loads the atlas prepared in the background and fills the icons handed out before it was ready
+        """
+        if self.atlasImage is not None:
+            return
+        self.load()
+        for iconName, image in self.images.items():
+            self.copyIcon(iconName, image)
+
+    def copyIcon(self, iconName : str, image : tk.PhotoImage) -> None:
+        # programs from additional catalogs may not have an icon, they get an empty one
+        if iconName in self.atlasIndex["icons"]:
+            iconSize = self.atlasIndex["iconSize"]
+            x, y = self.atlasIndex["icons"][iconName]
+            image.tk.call(image.name, "copy", self.atlasImage.name, "-from", x, y, x + iconSize, y + iconSize)
+
+    def getImage(self, iconName : str) -> tk.PhotoImage:
+        image = self.images.get(iconName)
+        if image is None:
+            if self.atlasImage is None and not self.isPreparing():
+                self.load()
+
+            image = tk.PhotoImage(width=ICON_SIZE, height=ICON_SIZE)
+            if self.atlasImage is not None:
+                self.copyIcon(iconName, image)
+            self.images[iconName] = image
+        return image
+
+    def __getitem__(self, iconName : str) -> tk.PhotoImage:
+        return self.getImage(iconName)
@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import re
+import time
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from appPaths import getDataFilePath
+from catalog import ProgramCatalog
+from processRunner import StreamingProcess
+from wingetJobs import OperationType, WingetQueueMessage
+
+INSTALLED_STATE_CACHE_FILE_NAME = "installedState.json"
+AVAILABLE_UPGRADES_CACHE_FILE_NAME = "availableUpgrades.json"
+DEFAULT_INSTALLED_STATE_TTL_SECONDS = 30 * 60
+
+VERSION_PATTERN = re.compile(r"\d+(?:\.\d+)*")
+# columns of the tables printed by winget list and winget upgrade, in the order winget prints them
+WINGET_TABLE_COLUMN_NAMES = ("Name", "Id", "Version", "Available", "Source")
+# winget search prints Match instead of Available
+ENGLISH_TABLE_COLUMN_NAMES = WINGET_TABLE_COLUMN_NAMES + ("Match",)
+
+logger = logging.getLogger("simpleDownloader.installedState")
+
+def parseWingetTable(lines : Iterable[str]) -> List[Dict[str, str]]:
+    """
+        Parses a table printed by winget (list, upgrade, search) into one dict per row.
+        Columns are found from the header line, which is the line right above a line
+        of dashes. Anything printed before the header (spinners, source updates) is
+        ignored, footers end up as rows with an empty Id column.
+        Headers are translated by a localized winget, their columns are then named by
+        position, see getColumnNames.
+    """
+    rows = list()
+    previousLine = ""
+    columns = None
+
+    for line in lines:
+        line = line.rstrip()
+
+        if len(line) > 1 and set(line) == {"-"} and previousLine:
+            # winget may print a second table (e.g. packages that need explicit targeting),
+            # whose header would have been taken for a row of the previous table
+            if columns is not None and rows:
+                rows.pop()
+            columns = getTableColumns(previousLine)
+        elif columns is not None and line:
+            rows.append({
+                columnName : line[columnStart:columnEnd].strip()
+                for columnName, columnStart, columnEnd in columns
+            })
+
+        previousLine = line
+
+    return rows
+
+def getTableColumns(headerLine : str) -> List[Tuple[str, int, Optional[int]]]:
+    headers = headerLine.split()
+    columnStarts = list()
+    for header in headers:
+        # searching after the previous column, a header may be contained in an earlier one
+        columnStarts.append(headerLine.index(header, columnStarts[-1] + 1 if columnStarts else 0))
+    columnEnds = columnStarts[1:] + [None]
+    return list(zip(getColumnNames(headers), columnStarts, columnEnds))
+
+def getColumnNames(headers : List[str]) -> List[str]:
+    """
+        Maps the headers of a winget table to the English column names.
+        Name, Id and Version are always the first three columns, Source is the last one and
+        Available only appears between them when some package has an upgrade, so the columns
+        of a localized table (any header that is not English) are named by their position.
+    """
+    englishNames = {columnName.lower() : columnName for columnName in ENGLISH_TABLE_COLUMN_NAMES}
+    columnNames = [englishNames.get(header.lower(), header) for header in headers]
+    if "Id" in columnNames and all(header.lower() in englishNames for header in headers):
+        return columnNames
+
+    if len(headers) < 3:
+        logger.warning("Could not find the Id and Version columns of the winget table with the headers %s", headers)
+        return columnNames
+
+    positionalNames = list(WINGET_TABLE_COLUMN_NAMES[:3])
+    if len(headers) == 4:
+        positionalNames.append("Source")
+    elif len(headers) >= 5:
+        positionalNames.extend(WINGET_TABLE_COLUMN_NAMES[3:])
+    logger.warning("The winget table has localized headers %s, reading its columns as %s", headers, positionalNames)
+    return positionalNames + headers[len(positionalNames):]
+
+def isNewerVersion(availableVersion : str, version : str) -> bool:
+    """
+        Compares dotted numeric versions number by number. Other version strings
+        (dates, "< 1.2", "Unknown") can not be compared, any difference counts as newer.
+    """
+    if not VERSION_PATTERN.fullmatch(availableVersion) or not VERSION_PATTERN.fullmatch(version):
+        return availableVersion != version
+
+    availableNumbers = [int(number) for number in availableVersion.split(".")]
+    numbers = [int(number) for number in version.split(".")]
+    # 1.2 and 1.2.0 are the same version
+    length = max(len(availableNumbers), len(numbers))
+    return availableNumbers + [0] * (length - len(availableNumbers)) > numbers + [0] * (length - len(numbers))
+
+class InstalledPackage:
+    def __init__(self, wingetId : str, version : str, availableVersion : str = "") -> None:
+        self.wingetId = wingetId
+        self.version = version
+        self.availableVersion = availableVersion
+
+    def isUpgradeable(self) -> bool:
+        return bool(self.availableVersion) and isNewerVersion(self.availableVersion, self.version)
+
+class InstalledStateIndex:
+    """
+        Snapshot of the installed packages, keyed by (case insensitive) winget id
+    """
+
+    def __init__(self, packages : Iterable[InstalledPackage], createdAt : Optional[float] = None) -> None:
+        self.packages = {package.wingetId.lower() : package for package in packages}
+        self.createdAt = time.time() if createdAt is None else createdAt
+
+    @classmethod
+    def fromWingetList(cls, lines : Iterable[str]) -> "InstalledStateIndex":
+        packages = list()
+        for row in parseWingetTable(lines):
+            wingetId = row.get("Id", "")
+            # winget ids never contain spaces, footer lines cut into columns do (or have no version)
+            if wingetId and " " not in wingetId and row.get("Version"):
+                packages.append(InstalledPackage(wingetId, row.get("Version", ""), row.get("Available", "")))
+        return cls(packages)
+
+    @classmethod
+    def fromDict(cls, data : dict) -> "InstalledStateIndex":
+        packages = [InstalledPackage(**package) for package in data["packages"]]
+        return cls(packages, data["createdAt"])
+
+    def toDict(self) -> dict:
+        return {
+            "createdAt" : self.createdAt,
+            "packages" : [vars(package) for package in self.packages.values()],
+        }
+
+    def getPackage(self, wingetId : str) -> Optional[InstalledPackage]:
+        return self.packages.get(wingetId.lower())
+
+    def isInstalled(self, wingetId : str) -> bool:
+        return wingetId.lower() in self.packages
+
+    def isUpgradeable(self, wingetId : str) -> bool:
+        package = self.getPackage(wingetId)
+        return package is not None and package.isUpgradeable()
+
+    def getUpgradeablePackages(self) -> List[InstalledPackage]:
+        return [package for package in self.packages.values() if package.isUpgradeable()]
+
+    def removePackage(self, wingetId : str) -> bool:
+        return self.packages.pop(wingetId.lower(), None) is not None
+
+def isNoOpJob(job : WingetQueueMessage, installedStateIndex : InstalledStateIndex) -> bool:
+    """
+        A job is a no-op when it installs a program that is installed and up to date,
+        uninstalls a program that is not installed or upgrades a program that has no newer version
+    """
+    if job.operation == OperationType.INSTALL:
+        return installedStateIndex.isInstalled(job.wingetId) and not installedStateIndex.isUpgradeable(job.wingetId)
+    if job.operation == OperationType.UNINSTALL:
+        return not installedStateIndex.isInstalled(job.wingetId)
+    if job.operation == OperationType.UPGRADE:
+        return not installedStateIndex.isUpgradeable(job.wingetId)
+    return False
+
+def skipNoOpJobs(jobs : List[WingetQueueMessage], installedStateIndex : Optional[InstalledStateIndex]) -> Tuple[List[WingetQueueMessage], List[WingetQueueMessage]]:
+    """
+        Splits jobs into the ones that have to run and the ones that can be skipped
+    """
+    if installedStateIndex is None:
+        return jobs, []
+
+    jobsToRun = [job for job in jobs if not isNoOpJob(job, installedStateIndex)]
+    skippedJobs = [job for job in jobs if isNoOpJob(job, installedStateIndex)]
+    return jobsToRun, skippedJobs
+
+def buildUpgradeJobs(upgradesIndex : InstalledStateIndex, programCatalog : Optional[ProgramCatalog]) -> List[WingetQueueMessage]:
+    """
+        Upgrade jobs for the outdated packages that are in the catalog, in catalog order.
+        Without a catalog every outdated package is upgraded, shown by its id.
+    """
+    if programCatalog is None:
+        return [WingetQueueMessage(package.wingetId, package.wingetId, OperationType.UPGRADE) for package in upgradesIndex.getUpgradeablePackages()]
+
+    return [
+        WingetQueueMessage(program.programName, program.wingetId, OperationType.UPGRADE)
+        for program in programCatalog.getAllPrograms() if upgradesIndex.isUpgradeable(program.wingetId)
+    ]
+
+class InstalledStateCache:
+    """
+        On-disk cache of a single `winget list` snapshot.
+        The snapshot is reused until it is older than ttlSeconds or invalidated,
+        which should happen after every install or uninstall. A snapshot whose
+        `winget list` was still running when the cache was invalidated is discarded.
+    """
+
+    LIST_COMMAND = "list"
+    CACHE_FILE_NAME = INSTALLED_STATE_CACHE_FILE_NAME
+
+    def __init__(self, cachePath : Optional[str] = None, ttlSeconds : float = DEFAULT_INSTALLED_STATE_TTL_SECONDS,
+                 wingetExecutable : List[str] = ["winget"]) -> None:
+        self.cachePath = cachePath or getDataFilePath(self.CACHE_FILE_NAME)
+        self.ttlSeconds = ttlSeconds
+        self.wingetExecutable = wingetExecutable
+        self.lock = Lock()
+        self.index = None
+        # bumped whenever the installed programs may have changed, see refresh
+        self.generation = 0
+
+    def isFresh(self, index : Optional[InstalledStateIndex]) -> bool:
+        return index is not None and time.time() - index.createdAt < self.ttlSeconds
+
+    def load(self) -> Optional[InstalledStateIndex]:
+        """
+            Returns the cached snapshot if there is a fresh one, without running winget
+        """
+        with self.lock:
+            if self.index is None:
+                try:
+                    with open(self.cachePath, encoding="utf-8") as cacheFile:
+                        self.index = InstalledStateIndex.fromDict(json.load(cacheFile))
+                except (OSError, ValueError, KeyError, TypeError):
+                    self.index = None
+            return self.index if self.isFresh(self.index) else None
+
+    def refresh(self) -> Optional[InstalledStateIndex]:
+        """
+            Takes a new snapshot with `winget list` and stores it on disk.
+            Returns None if winget could not be run, or if the cache was invalidated
+            while it ran, as the snapshot may predate the change.
+        """
+        with self.lock:
+            generation = self.generation
+
+        command = [*self.wingetExecutable, self.LIST_COMMAND, "--accept-source-agreements", "--disable-interactivity"]
+        try:
+            process = StreamingProcess(command, encoding="utf-8")
+            index = InstalledStateIndex.fromWingetList(process.lines())
+        except OSError:
+            return None
+
+        if process.returncode != 0:
+            return None
+
+        with self.lock:
+            if self.generation != generation:
+                return None
+            self.index = index
+            self.save()
+        return index
+
+    def save(self) -> None:
+        # called with the lock held
+        try:
+            with open(self.cachePath, "w", encoding="utf-8") as cacheFile:
+                json.dump(self.index.toDict(), cacheFile)
+        except OSError:
+            pass
+
+    def get(self) -> Optional[InstalledStateIndex]:
+        return self.load() or self.refresh()
+
+    def refreshInBackground(self, onRefreshed : Callable[[Optional[InstalledStateIndex]], None]) -> None:
+        """
+            Refreshes the snapshot on a new thread, onRefreshed is called from it unless
+            the snapshot was discarded because the cache was invalidated in the meantime
+        """
+        def refreshThreadFunc() -> None:
+            with self.lock:
+                generation = self.generation
+            index = self.refresh()
+            with self.lock:
+                isCurrent = self.generation == generation
+            if isCurrent:
+                onRefreshed(index)
+
+        Thread(target=refreshThreadFunc, daemon=True).start()
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.index = None
+            try:
+                os.remove(self.cachePath)
+            except OSError:
+                pass
+
+class AvailableUpgradesCache(InstalledStateCache):
+    """
+        On-disk cache of a single `winget upgrade` listing, which only has the installed
+        packages with a newer version available. Instead of being invalidated after every
+        job, the packages that were upgraded, reinstalled or uninstalled are dropped from it,
+        so the listing stays usable between runs until it is older than ttlSeconds.
+    """
+
+    LIST_COMMAND = "upgrade"
+    CACHE_FILE_NAME = AVAILABLE_UPGRADES_CACHE_FILE_NAME
+
+    def discard(self, wingetId : str) -> None:
+        # reads the listing from disk if this process has not used it yet
+        self.load()
+        with self.lock:
+            # a listing that is still running may have the package as outdated
+            self.generation += 1
+            if self.index is not None and self.index.removePackage(wingetId):
+                self.save()
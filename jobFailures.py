@@ -0,0 +1,111 @@
+import random
+import re
+from enum import Enum
+from typing import Optional
+
+class FailureCategory(str, Enum):
+    ALREADY_INSTALLED = "already installed",
+    NETWORK = "network",
+    HASH_MISMATCH = "hash mismatch",
+    INSTALLER_BUSY = "installer busy",
+    REBOOT_REQUIRED = "reboot required",
+    UNKNOWN = "unknown"
+
+FAILURE_DESCRIPTIONS = {
+    FailureCategory.ALREADY_INSTALLED : "it is already installed",
+    FailureCategory.NETWORK : "a network error occurred",
+    FailureCategory.HASH_MISMATCH : "the downloaded installer does not match its expected hash",
+    FailureCategory.INSTALLER_BUSY : "another installation is in progress or the program is in use",
+    FailureCategory.REBOOT_REQUIRED : "the computer has to be restarted first",
+    FailureCategory.UNKNOWN : "an error occurred",
+}
+
+# winget (APPINSTALLER_CLI_ERROR_*) and installer exit codes, see the winget returnCodes documentation
+EXIT_CODE_CATEGORIES = {
+    0x8A150008 : FailureCategory.NETWORK,               # DOWNLOAD_FAILED
+    0x8A150107 : FailureCategory.NETWORK,               # INSTALL_NO_NETWORK
+    0x80072EE2 : FailureCategory.NETWORK,               # WININET_E_TIMEOUT
+    0x80072EE7 : FailureCategory.NETWORK,               # WININET_E_NAME_NOT_RESOLVED
+    0x80072EFD : FailureCategory.NETWORK,               # WININET_E_CANNOT_CONNECT
+    0x80072EFE : FailureCategory.NETWORK,               # WININET_E_CONNECTION_ABORTED
+    0x8A150011 : FailureCategory.HASH_MISMATCH,         # INSTALLER_HASH_MISMATCH
+    0x8A150101 : FailureCategory.INSTALLER_BUSY,        # INSTALL_PACKAGE_IN_USE
+    0x8A150102 : FailureCategory.INSTALLER_BUSY,        # INSTALL_INSTALL_IN_PROGRESS
+    0x8A150103 : FailureCategory.INSTALLER_BUSY,        # INSTALL_FILE_IN_USE
+    1618 : FailureCategory.INSTALLER_BUSY,              # ERROR_INSTALL_ALREADY_RUNNING (msiexec)
+    1641 : FailureCategory.REBOOT_REQUIRED,             # ERROR_SUCCESS_REBOOT_INITIATED, the install succeeded
+    3010 : FailureCategory.REBOOT_REQUIRED,             # ERROR_SUCCESS_REBOOT_REQUIRED, the install succeeded
+    0x8A150109 : FailureCategory.REBOOT_REQUIRED,       # INSTALL_REBOOT_REQUIRED_TO_FINISH
+    0x8A15010A : FailureCategory.REBOOT_REQUIRED,       # INSTALL_REBOOT_REQUIRED_TO_INSTALL
+    0x8A15010B : FailureCategory.REBOOT_REQUIRED,       # INSTALL_REBOOT_INITIATED
+    0x8A15002B : FailureCategory.ALREADY_INSTALLED,     # UPDATE_NOT_APPLICABLE
+    0x8A150061 : FailureCategory.ALREADY_INSTALLED,     # PACKAGE_ALREADY_INSTALLED
+    0x8A15010D : FailureCategory.ALREADY_INSTALLED,     # INSTALL_ALREADY_INSTALLED
+}
+
+# used when the exit code is not specific, e.g. a generic 1 or an installer's own code
+OUTPUT_PATTERNS = [
+    (FailureCategory.HASH_MISMATCH, re.compile(r"hash does not match|hash mismatch", re.IGNORECASE)),
+    (FailureCategory.ALREADY_INSTALLED, re.compile(r"already installed|no (?:available|applicable) upgrade found|no newer package versions", re.IGNORECASE)),
+    (FailureCategory.REBOOT_REQUIRED, re.compile(r"restart your pc|re(?:boot|start) (?:is )?required", re.IGNORECASE)),
+    (FailureCategory.INSTALLER_BUSY, re.compile(r"another installation is (?:already )?in progress|currently running|in use by another", re.IGNORECASE)),
+    (FailureCategory.NETWORK, re.compile(r"download(?:ing installer)? failed|internet connection|network|timed out|could not resolve|unable to connect|0x80072e", re.IGNORECASE)),
+]
+
+class FailureClassifier:
+    """
+        Finds out why a command failed from its exit code and output.
+        Fed one line at a time, it only keeps the category of the first matching line.
+    """
+
+    def __init__(self) -> None:
+        self.outputCategory = None
+
+    def feed(self, line : str) -> None:
+        if self.outputCategory is not None:
+            return
+        for category, pattern in OUTPUT_PATTERNS:
+            if pattern.search(line):
+                self.outputCategory = category
+                return
+
+    def classify(self, returncode : Optional[int]) -> FailureCategory:
+        """
+            returncode is None when the exit code does not belong to this command alone,
+            e.g. a winget import run of many packages, then only the output is used
+        """
+        # winget HRESULTs are negative on some platforms and unsigned on others
+        exitCodeCategory = EXIT_CODE_CATEGORIES.get(returncode & 0xFFFFFFFF) if returncode is not None else None
+        return exitCodeCategory or self.outputCategory or FailureCategory.UNKNOWN
+
+class RetryPolicy:
+    """
+        How often a failed install is retried and how long to wait before each retry.
+        The delay doubles with every retry, up to maxDelaySeconds, and a random jitter
+        of up to half of it keeps retries of many jobs (or machines) from running in lockstep.
+    """
+
+    def __init__(self, maxRetries : int = 0, baseDelaySeconds : float = 0.0, maxDelaySeconds : float = 0.0, succeeded : bool = False) -> None:
+        self.maxRetries = maxRetries
+        self.baseDelaySeconds = baseDelaySeconds
+        self.maxDelaySeconds = maxDelaySeconds
+        # the job is counted as successful, there is nothing left to do
+        self.succeeded = succeeded
+
+    def getDelay(self, retry : int) -> float:
+        delaySeconds = min(self.maxDelaySeconds, self.baseDelaySeconds * 2 ** (retry - 1))
+        return delaySeconds * random.uniform(0.5, 1.0)
+
+DEFAULT_RETRY_POLICIES = {
+    FailureCategory.ALREADY_INSTALLED : RetryPolicy(succeeded=True),
+    FailureCategory.NETWORK : RetryPolicy(maxRetries=3, baseDelaySeconds=10, maxDelaySeconds=120),
+    # a mirror or CDN may have served a stale or truncated file, a second try is enough to tell
+    FailureCategory.HASH_MISMATCH : RetryPolicy(maxRetries=1, baseDelaySeconds=30, maxDelaySeconds=30),
+    FailureCategory.INSTALLER_BUSY : RetryPolicy(maxRetries=5, baseDelaySeconds=30, maxDelaySeconds=300),
+    # retrying before the restart can not help
+    FailureCategory.REBOOT_REQUIRED : RetryPolicy(),
+    FailureCategory.UNKNOWN : RetryPolicy(),
+}
+
+def getFailureDescription(category : Optional[FailureCategory]) -> str:
+    return FAILURE_DESCRIPTIONS.get(category, FAILURE_DESCRIPTIONS[FailureCategory.UNKNOWN])
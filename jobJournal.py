@@ -0,0 +1,166 @@
+import json
+import os
+import time
+from threading import Event, Lock, Thread
+from typing import List, Optional
+
+from appPaths import getDataFilePath
+from wingetJobs import OperationType, JobPhase, WingetQueueMessage
+
+JOB_JOURNAL_FILE_NAME = "jobJournal.jsonl"
+DEFAULT_FSYNC_INTERVAL_SECONDS = 0.5
+
+class JobJournal:
+    """
+        Append-only JSONL journal of the current batch, so unfinished jobs can be
+        resumed after the app was killed or the machine rebooted by an installer.
+        Every batch starts a new journal with a "batch" record (the options) and one
+        "planned" record per job, followed by "started" and "finished" records and a
+        final "batchFinished" record, after which the journal is deleted.
+
+        The planned records are synced right away, later records are written and synced
+        by a background thread at most every fsyncIntervalSeconds, so recording a job
+        never waits for the disk.
+    """
+
+    def __init__(self, journalPath : Optional[str] = None, fsyncIntervalSeconds : float = DEFAULT_FSYNC_INTERVAL_SECONDS) -> None:
+        self.journalPath = journalPath or getDataFilePath(JOB_JOURNAL_FILE_NAME)
+        self.fsyncIntervalSeconds = fsyncIntervalSeconds
+        self.lock = Lock()
+        self.fileLock = Lock()
+        self.pendingLines = list()
+        self.journalFile = None
+        self.jobKeys = dict()
+        self.flushRequested = Event()
+        self.flushThread = None
+
+    def startBatch(self, jobs : List[WingetQueueMessage], options : dict) -> None:
+        self.finishBatch()
+
+        with self.lock:
+            self.jobKeys = {job : str(jobIndex) for jobIndex, job in enumerate(jobs)}
+
+        with self.fileLock:
+            self.journalFile = open(self.journalPath, "w", encoding="utf-8")
+
+        self.write({"event" : "batch", "options" : options})
+        for job in jobs:
+            self.write({
+                "event" : "planned",
+                "key" : self.jobKeys[job],
+                "name" : job.programName,
+                "id" : job.wingetId,
+                "operation" : job.operation.value,
+            })
+        self.flush()
+
+        if self.flushThread is None:
+            self.flushThread = Thread(target=self.flushThreadFunc, daemon=True)
+            self.flushThread.start()
+
+    def recordStarted(self, job : WingetQueueMessage, phase : JobPhase) -> None:
+        self.write({"event" : "started", "key" : self.jobKeys.get(job), "phase" : phase.value})
+
+    def recordFinished(self, job : WingetQueueMessage, handledSuccessfully : bool, skipped : bool = False) -> None:
+        self.write({
+            "event" : "finished",
+            "key" : self.jobKeys.get(job),
+            "succeeded" : handledSuccessfully,
+            "returncode" : job.returncode,
+            "failureCategory" : job.failureCategory.value if job.failureCategory is not None else None,
+            "skipped" : skipped,
+        })
+
+    def finishBatch(self) -> None:
+        """
+            Marks the batch as done, closes the journal and deletes it,
+            a finished batch has nothing left to resume
+        """
+        if self.journalFile is None:
+            return
+
+        # a journal that can not be deleted still reads as finished
+        self.write({"event" : "batchFinished"})
+        self.flush()
+        with self.fileLock:
+            self.journalFile.close()
+            self.journalFile = None
+        discardJournal(self.journalPath)
+
+    def write(self, record : dict) -> None:
+        record["time"] = time.time()
+        with self.lock:
+            self.pendingLines.append(json.dumps(record) + "\n")
+        self.flushRequested.set()
+
+    def flush(self) -> None:
+        with self.lock:
+            pendingLines = self.pendingLines
+            self.pendingLines = list()
+
+        with self.fileLock:
+            if self.journalFile is None or not pendingLines:
+                return
+            self.journalFile.writelines(pendingLines)
+            self.journalFile.flush()
+            os.fsync(self.journalFile.fileno())
+
+    def flushThreadFunc(self) -> None:
+        while True:
+            self.flushRequested.wait()
+            # let records pile up so a single fsync covers all of them
+            time.sleep(self.fsyncIntervalSeconds)
+            self.flushRequested.clear()
+            try:
+                self.flush()
+            except (OSError, ValueError):
+                pass
+
+class UnfinishedBatch:
+    """
+        Jobs of an interrupted batch that never finished, and the options the batch was run with
+    """
+
+    def __init__(self, options : dict, jobs : List[WingetQueueMessage]) -> None:
+        self.options = options
+        self.jobs = jobs
+
+def loadUnfinishedBatch(journalPath : Optional[str] = None) -> Optional[UnfinishedBatch]:
+    """
+        Replays the journal and returns the jobs that were planned but never finished,
+        or None if there is no journal or its batch finished
+    """
+    journalPath = journalPath or getDataFilePath(JOB_JOURNAL_FILE_NAME)
+    options = dict()
+    plannedJobs = dict()
+
+    try:
+        with open(journalPath, encoding="utf-8") as journalFile:
+            for line in journalFile:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may have been cut off by the crash
+                    continue
+
+                event = record.get("event")
+                if event == "batch":
+                    options = record.get("options", dict())
+                elif event == "planned":
+                    plannedJobs[record["key"]] = WingetQueueMessage(record["name"], record["id"], OperationType(record["operation"]))
+                elif event == "finished":
+                    plannedJobs.pop(record.get("key"), None)
+                elif event == "batchFinished":
+                    return None
+    except (OSError, KeyError, ValueError):
+        return None
+
+    if not plannedJobs:
+        return None
+    return UnfinishedBatch(options, list(plannedJobs.values()))
+
+def discardJournal(journalPath : Optional[str] = None) -> None:
+    try:
+        os.remove(journalPath or getDataFilePath(JOB_JOURNAL_FILE_NAME))
+    except OSError:
+        pass
@@ -0,0 +1,322 @@
+import json
+import os
+import time
+from threading import Lock, get_ident
+from typing import List, Optional
+
+from wingetJobs import JobPhase, WingetQueueMessage
+
+# UI refreshes that take longer than a frame are stalls, they are put on the trace timeline
+UI_STALL_THRESHOLD_SECONDS = 1 / 60
+MAX_RECORDED_UI_STALLS = 10000
+PROMETHEUS_METRIC_PREFIX = "simpledownloader"
+
+class ProcessMetrics:
+    """
+        Timestamps of a single process run by a job, in seconds since the start of the batch.
+        Only the worker thread running the process writes to it.
+    """
+
+    def __init__(self, phase : JobPhase, startTime : float) -> None:
+        self.phase = phase
+        self.threadId = get_ident()
+        self.startTime = startTime
+        self.spawnTime = None
+        self.firstOutputTime = None
+        self.exitTime = None
+        self.returncode = None
+        self.numOutputBytes = 0
+        self.numOutputLines = 0
+
+    def toDict(self) -> dict:
+        return {
+            "phase" : self.phase.value,
+            "start" : roundSeconds(self.startTime),
+            "spawn" : roundSeconds(self.spawnTime),
+            "firstOutput" : roundSeconds(self.firstOutputTime),
+            "exit" : roundSeconds(self.exitTime),
+            "returncode" : self.returncode,
+            "outputBytes" : self.numOutputBytes,
+            "outputLines" : self.numOutputLines,
+        }
+
+class JobMetrics:
+    """
+        Phase timestamps of a job, in seconds since the start of the batch.
+        queuedTime is None until the worker pool queues the job, which can be long after the
+        batch started for jobs that wait for other jobs. Phases that failed (including the
+        attempts of a job that was retried) are kept in failedPhases with the time they failed at.
+    """
+
+    def __init__(self, job : WingetQueueMessage, queuedTime : Optional[float] = None) -> None:
+        self.job = job
+        self.queuedTime = queuedTime
+        self.downloadCompleteTime = None
+        self.installCompleteTime = None
+        self.failedPhases = list()
+        self.finishedTime = None
+        self.handledSuccessfully = None
+        self.skipped = False
+        self.processes = list()
+
+    def getNumOutputBytes(self) -> int:
+        return sum(processMetrics.numOutputBytes for processMetrics in self.processes)
+
+    def getDurationSeconds(self) -> Optional[float]:
+        return self.finishedTime - self.queuedTime if self.finishedTime is not None and self.queuedTime is not None else None
+
+    def toDict(self) -> dict:
+        return {
+            "id" : self.job.wingetId,
+            "name" : self.job.programName,
+            "operation" : self.job.operation.value,
+            "succeeded" : self.handledSuccessfully,
+            "skipped" : self.skipped,
+            "queued" : roundSeconds(self.queuedTime),
+            "downloadComplete" : roundSeconds(self.downloadCompleteTime),
+            "installComplete" : roundSeconds(self.installCompleteTime),
+            "failedPhases" : [{"phase" : phase.value, "time" : roundSeconds(failedTime)} for phase, failedTime in self.failedPhases],
+            "finished" : roundSeconds(self.finishedTime),
+            "outputBytes" : self.getNumOutputBytes(),
+            "processes" : [processMetrics.toDict() for processMetrics in self.processes],
+        }
+
+class RunMetrics:
+    """
+        Collects the timings of a batch: phase timestamps and output sizes of every job,
+        and how long the UI took to handle worker events.
+        Recording is cheap and thread safe, the exports are meant to be written once the
+        batch is done: JSON, Chrome trace events (chrome://tracing, ui.perfetto.dev) and
+        Prometheus text exposition format (e.g. for the node_exporter textfile collector).
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.startBatch([])
+
+    def startBatch(self, jobs : List[WingetQueueMessage]) -> None:
+        with self.lock:
+            self.batchStartPerfCounter = time.perf_counter()
+            self.batchStartTimestamp = time.time()
+            self.batchFinishedTime = None
+            self.jobMetrics = {job : JobMetrics(job) for job in jobs}
+            self.numUiRefreshes = 0
+            self.uiRefreshSeconds = 0.0
+            self.maxUiRefreshSeconds = 0.0
+            self.numUiRefreshEvents = 0
+            self.uiStallSeconds = 0.0
+            self.uiStalls = list()
+
+    def getTime(self, perfCounter : Optional[float] = None) -> float:
+        return (perfCounter if perfCounter is not None else time.perf_counter()) - self.batchStartPerfCounter
+
+    def getJobMetrics(self, job : WingetQueueMessage) -> JobMetrics:
+        with self.lock:
+            if job not in self.jobMetrics:
+                self.jobMetrics[job] = JobMetrics(job, self.getTime())
+            return self.jobMetrics[job]
+
+    def startProcess(self, job : WingetQueueMessage, phase : JobPhase) -> ProcessMetrics:
+        processMetrics = ProcessMetrics(phase, self.getTime())
+        jobMetrics = self.getJobMetrics(job)
+        with self.lock:
+            jobMetrics.processes.append(processMetrics)
+        return processMetrics
+
+    def recordProcessSpawned(self, processMetrics : ProcessMetrics, spawnPerfCounter : Optional[float]) -> None:
+        processMetrics.spawnTime = self.getTime(spawnPerfCounter)
+
+    def recordProcessOutput(self, processMetrics : ProcessMetrics, numLines : int = 1) -> None:
+        if processMetrics.firstOutputTime is None:
+            processMetrics.firstOutputTime = self.getTime()
+        processMetrics.numOutputLines += numLines
+
+    def recordProcessExited(self, processMetrics : ProcessMetrics, returncode : Optional[int], numOutputBytes : int) -> None:
+        processMetrics.exitTime = self.getTime()
+        processMetrics.returncode = returncode
+        processMetrics.numOutputBytes = numOutputBytes
+
+    def recordJobQueued(self, job : WingetQueueMessage) -> None:
+        # a job put back on a queue (import fallback, retry) keeps the time it was first queued at
+        jobMetrics = self.getJobMetrics(job)
+        with self.lock:
+            if jobMetrics.queuedTime is None:
+                jobMetrics.queuedTime = self.getTime()
+
+    def recordPhaseFinished(self, job : WingetQueueMessage, phase : JobPhase, handledSuccessfully : bool = True) -> None:
+        jobMetrics = self.getJobMetrics(job)
+        if not handledSuccessfully:
+            with self.lock:
+                jobMetrics.failedPhases.append((phase, self.getTime()))
+        elif phase == JobPhase.DOWNLOAD:
+            jobMetrics.downloadCompleteTime = self.getTime()
+        else:
+            jobMetrics.installCompleteTime = self.getTime()
+
+    def recordJobFinished(self, job : WingetQueueMessage, handledSuccessfully : bool, skipped : bool = False) -> None:
+        jobMetrics = self.getJobMetrics(job)
+        jobMetrics.finishedTime = self.getTime()
+        jobMetrics.handledSuccessfully = handledSuccessfully
+        jobMetrics.skipped = skipped
+        # skipped jobs are never queued, they are done as soon as the batch is planned
+        if jobMetrics.queuedTime is None:
+            jobMetrics.queuedTime = jobMetrics.finishedTime
+
+    def finishBatch(self) -> None:
+        self.batchFinishedTime = self.getTime()
+
+    def recordUiRefresh(self, startPerfCounter : float, durationSeconds : float, numEvents : int) -> None:
+        """
+            Called from the UI thread after it handled a batch of worker events
+        """
+        with self.lock:
+            self.numUiRefreshes += 1
+            self.numUiRefreshEvents += numEvents
+            self.uiRefreshSeconds += durationSeconds
+            self.maxUiRefreshSeconds = max(self.maxUiRefreshSeconds, durationSeconds)
+            if durationSeconds >= UI_STALL_THRESHOLD_SECONDS:
+                self.uiStallSeconds += durationSeconds
+                if len(self.uiStalls) < MAX_RECORDED_UI_STALLS:
+                    self.uiStalls.append((self.getTime(startPerfCounter), durationSeconds, numEvents))
+
+    def getAllJobMetrics(self) -> List[JobMetrics]:
+        with self.lock:
+            return sorted(self.jobMetrics.values(), key=lambda jobMetrics: (jobMetrics.queuedTime is None, jobMetrics.queuedTime or 0.0))
+
+    def toDict(self) -> dict:
+        allJobMetrics = self.getAllJobMetrics()
+        return {
+            "startTimestamp" : self.batchStartTimestamp,
+            "durationSeconds" : roundSeconds(self.batchFinishedTime),
+            "outputBytes" : sum(jobMetrics.getNumOutputBytes() for jobMetrics in allJobMetrics),
+            "uiRefresh" : {
+                "count" : self.numUiRefreshes,
+                "events" : self.numUiRefreshEvents,
+                "totalSeconds" : roundSeconds(self.uiRefreshSeconds),
+                "maxSeconds" : roundSeconds(self.maxUiRefreshSeconds),
+                "stalls" : len(self.uiStalls),
+                "stallSeconds" : roundSeconds(self.uiStallSeconds),
+            },
+            "jobs" : [jobMetrics.toDict() for jobMetrics in allJobMetrics],
+        }
+
+    def toChromeTrace(self) -> dict:
+        """
+            Trace event format: one row per job with its whole lifetime and its processes,
+            one row per worker thread with the processes it ran and a row with the UI stalls
+        """
+        traceEvents = [
+            {"ph" : "M", "name" : "process_name", "pid" : 1, "args" : {"name" : "Jobs"}},
+            {"ph" : "M", "name" : "process_name", "pid" : 2, "args" : {"name" : "Worker threads"}},
+            {"ph" : "M", "name" : "process_name", "pid" : 3, "args" : {"name" : "UI"}},
+            {"ph" : "M", "name" : "thread_name", "pid" : 3, "tid" : 1, "args" : {"name" : "Event handling stalls"}},
+        ]
+        threadIndices = dict()
+
+        for jobIndex, jobMetrics in enumerate(self.getAllJobMetrics()):
+            tid = jobIndex + 1
+            traceEvents.append({"ph" : "M", "name" : "thread_name", "pid" : 1, "tid" : tid, "args" : {"name" : jobMetrics.job.programName}})
+            if jobMetrics.queuedTime is not None and jobMetrics.finishedTime is not None:
+                traceEvents.append(getCompleteEvent(
+                    jobMetrics.job.programName, "job", 1, tid, jobMetrics.queuedTime, jobMetrics.finishedTime, jobMetrics.toDict()
+                ))
+
+            for processMetrics in jobMetrics.processes:
+                if processMetrics.threadId not in threadIndices:
+                    threadIndices[processMetrics.threadId] = len(threadIndices) + 1
+                    traceEvents.append({"ph" : "M", "name" : "thread_name", "pid" : 2, "tid" : threadIndices[processMetrics.threadId],
+                                        "args" : {"name" : f"Worker {len(threadIndices)}"}})
+                if processMetrics.exitTime is None:
+                    continue
+
+                name = f"{processMetrics.phase.value} {jobMetrics.job.programName}"
+                for pid, processTid in ((1, tid), (2, threadIndices[processMetrics.threadId])):
+                    traceEvents.append(getCompleteEvent(name, processMetrics.phase.value, pid, processTid,
+                                                        processMetrics.startTime, processMetrics.exitTime, processMetrics.toDict()))
+                if processMetrics.firstOutputTime is not None:
+                    traceEvents.append({"ph" : "i", "s" : "t", "name" : "first output", "pid" : 1, "tid" : tid,
+                                        "ts" : toMicroseconds(processMetrics.firstOutputTime)})
+
+        with self.lock:
+            uiStalls = list(self.uiStalls)
+        for startTime, durationSeconds, numEvents in uiStalls:
+            traceEvents.append(getCompleteEvent("handle events", "ui", 3, 1, startTime, startTime + durationSeconds, {"events" : numEvents}))
+
+        return {"traceEvents" : traceEvents, "displayTimeUnit" : "ms"}
+
+    def toPrometheusText(self) -> str:
+        metricLines = list()
+
+        def addMetric(name : str, metricType : str, helpText : str, samples : List[tuple]) -> None:
+            metricLines.append(f"# HELP {PROMETHEUS_METRIC_PREFIX}_{name} {helpText}")
+            metricLines.append(f"# TYPE {PROMETHEUS_METRIC_PREFIX}_{name} {metricType}")
+            for labels, value in samples:
+                labelText = ",".join(f'{key}="{escapeLabelValue(labelValue)}"' for key, labelValue in labels.items())
+                metricLines.append(f"{PROMETHEUS_METRIC_PREFIX}_{name}{{{labelText}}} {value}" if labelText else f"{PROMETHEUS_METRIC_PREFIX}_{name} {value}")
+
+        allJobMetrics = self.getAllJobMetrics()
+        results = {"succeeded" : 0, "failed" : 0, "skipped" : 0}
+        for jobMetrics in allJobMetrics:
+            if jobMetrics.skipped:
+                results["skipped"] += 1
+            elif jobMetrics.handledSuccessfully:
+                results["succeeded"] += 1
+            elif jobMetrics.handledSuccessfully is not None:
+                results["failed"] += 1
+
+        addMetric("batch_start_timestamp_seconds", "gauge", "Unix time the last batch started at.", [({}, self.batchStartTimestamp)])
+        addMetric("batch_duration_seconds", "gauge", "Duration of the last batch.", [({}, self.batchFinishedTime or 0.0)])
+        addMetric("batch_jobs", "gauge", "Jobs of the last batch by result.", [({"result" : result}, count) for result, count in results.items()])
+
+        jobLabels = [({"id" : jobMetrics.job.wingetId, "operation" : jobMetrics.job.operation.value}, jobMetrics) for jobMetrics in allJobMetrics]
+        addMetric("job_duration_seconds", "gauge", "Time from queueing a job until it finished.",
+                  [(labels, jobMetrics.getDurationSeconds()) for labels, jobMetrics in jobLabels if jobMetrics.getDurationSeconds() is not None])
+        addMetric("job_phase_seconds", "gauge", "Time the processes of a job ran, by phase.",
+                  [({**labels, "phase" : processMetrics.phase.value}, processMetrics.exitTime - processMetrics.startTime)
+                   for labels, jobMetrics in jobLabels for processMetrics in jobMetrics.processes if processMetrics.exitTime is not None])
+        addMetric("job_output_bytes", "gauge", "Bytes written to stdout and stderr by the processes of a job.",
+                  [(labels, jobMetrics.getNumOutputBytes()) for labels, jobMetrics in jobLabels])
+
+        with self.lock:
+            addMetric("ui_refreshes_total", "counter", "Number of times the UI handled worker events.", [({}, self.numUiRefreshes)])
+            addMetric("ui_refresh_seconds_total", "counter", "Time the UI spent handling worker events.", [({}, self.uiRefreshSeconds)])
+            addMetric("ui_refresh_max_seconds", "gauge", "Longest time the UI spent handling worker events at once.", [({}, self.maxUiRefreshSeconds)])
+
+        return "\n".join(metricLines) + "\n"
+
+    def writeJson(self, path : str) -> None:
+        writeFileAtomically(path, json.dumps(self.toDict(), indent=4))
+
+    def writeChromeTrace(self, path : str) -> None:
+        writeFileAtomically(path, json.dumps(self.toChromeTrace()))
+
+    def writePrometheusText(self, path : str) -> None:
+        writeFileAtomically(path, self.toPrometheusText())
+
+def roundSeconds(seconds : Optional[float]) -> Optional[float]:
+    return round(seconds, 6) if seconds is not None else None
+
+def toMicroseconds(seconds : float) -> int:
+    return int(seconds * 1000000)
+
+def getCompleteEvent(name : str, category : str, pid : int, tid : int, startTime : float, endTime : float, args : dict) -> dict:
+    return {
+        "ph" : "X",
+        "name" : name,
+        "cat" : category,
+        "pid" : pid,
+        "tid" : tid,
+        "ts" : toMicroseconds(startTime),
+        "dur" : toMicroseconds(endTime - startTime),
+        "args" : args,
+    }
+
+def escapeLabelValue(value : str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def writeFileAtomically(path : str, text : str) -> None:
+    # readers (e.g. a metrics collector) never see a half written file
+    temporaryPath = f"{path}.tmp"
+    with open(temporaryPath, "w", encoding="utf-8") as temporaryFile:
+        temporaryFile.write(text)
+    os.replace(temporaryPath, path)
@@ -0,0 +1,207 @@
+import math
+import re
+import time
+from enum import Enum
+from threading import Lock
+from typing import Callable, List, Optional, Tuple
+
+from wingetJobs import WingetQueueMessage
+
+# a stage without progress output is estimated from its expected duration, without ever reaching its end
+MAX_TIME_BASED_FRACTION = 0.9
+# longest unfinished progress line kept between two chunks of output
+MAX_PARSER_TAIL_CHARACTERS = 256
+
+BYTE_UNITS = {"B" : 1, "KB" : 1024, "MB" : 1024 ** 2, "GB" : 1024 ** 3, "TB" : 1024 ** 4}
+
+PROGRESS_PATTERN = re.compile(
+    r"(?P<bytes>(?P<done>\d+(?:\.\d+)?)\s*(?P<doneUnit>[KMGT]?B)\s*/\s*(?P<total>\d+(?:\.\d+)?)\s*(?P<totalUnit>[KMGT]?B))"
+    r"|(?P<percent>\d{1,3})\s?%"
+    r"|(?P<downloading>Downloading\s+https?://)"
+    r"|(?P<installing>Successfully verified installer hash|Starting package (?:un)?install)"
+    r"|(?P<finished>Installer downloaded|Successfully (?:un)?installed)"
+)
+
+class ProgressStage(str, Enum):
+    DOWNLOAD = "download",
+    INSTALL = "install"
+
+class WingetProgressParser:
+    """
+        Streaming parser of the progress winget prints: byte counters (12.0 MB / 50.0 MB),
+        percentage bars and the messages that start and end the download and install stages.
+        It is fed decoded chunks of output as they arrive and keeps only the numbers and
+        the unfinished last line, so it keeps up with progress bars that redraw thousands
+        of times. A redrawn line is only parsed once the next redraw (or newline) starts,
+        so a number split between two chunks is never read half.
+    """
+
+    def __init__(self, stage : ProgressStage) -> None:
+        self.stage = stage
+        self.fractions = {ProgressStage.DOWNLOAD : 0.0, ProgressStage.INSTALL : 0.0}
+        self.hasProgressOutput = False
+        self.tail = ""
+
+    def feed(self, text : str) -> bool:
+        """
+            Returns True when the stage or the whole percentage of the progress changed
+        """
+        text = self.tail + text
+        end = max(text.rfind("\r"), text.rfind("\n"))
+        if end == -1:
+            self.tail = text[-MAX_PARSER_TAIL_CHARACTERS:]
+            return False
+        self.tail = text[end:end + MAX_PARSER_TAIL_CHARACTERS]
+
+        previousState = self.getState()
+        for match in PROGRESS_PATTERN.finditer(text, 0, end):
+            if match.group("bytes") is not None:
+                total = float(match.group("total")) * BYTE_UNITS[match.group("totalUnit")]
+                if total > 0:
+                    self.setFraction(float(match.group("done")) * BYTE_UNITS[match.group("doneUnit")] / total)
+            elif match.group("percent") is not None:
+                self.setFraction(int(match.group("percent")) / 100)
+            elif match.group("downloading") is not None:
+                self.setStage(ProgressStage.DOWNLOAD)
+            elif match.group("installing") is not None:
+                self.setStage(ProgressStage.INSTALL)
+            else:
+                self.setFraction(1.0)
+
+        return self.getState() != previousState
+
+    def getState(self) -> tuple:
+        return (self.stage, *(int(fraction * 100) for fraction in self.fractions.values()))
+
+    def setStage(self, stage : ProgressStage) -> None:
+        if stage != self.stage:
+            self.stage = stage
+            self.hasProgressOutput = False
+
+    def setFraction(self, fraction : float) -> None:
+        self.fractions[self.stage] = min(1.0, max(self.fractions[self.stage], fraction))
+        self.hasProgressOutput = True
+
+class JobProgress:
+    """
+        Progress of the stages of a single job
+    """
+
+    def __init__(self, expectedDownloadSeconds : float, expectedInstallSeconds : float) -> None:
+        self.expectedSeconds = {ProgressStage.DOWNLOAD : expectedDownloadSeconds, ProgressStage.INSTALL : expectedInstallSeconds}
+        self.fractions = {ProgressStage.DOWNLOAD : 0.0, ProgressStage.INSTALL : 0.0}
+        self.stage = None
+        self.stageStartTime = None
+        self.stageHasProgressOutput = False
+        self.finished = False
+
+    def getWeight(self) -> float:
+        return sum(self.expectedSeconds.values())
+
+    def getFraction(self, now : float) -> float:
+        if self.finished:
+            return 1.0
+
+        fractions = dict(self.fractions)
+        if self.stage is not None and not self.stageHasProgressOutput and self.expectedSeconds[self.stage] > 0:
+            timeBasedFraction = min(MAX_TIME_BASED_FRACTION, (now - self.stageStartTime) / self.expectedSeconds[self.stage])
+            fractions[self.stage] = max(fractions[self.stage], timeBasedFraction)
+
+        return sum(self.expectedSeconds[stage] * fractions[stage] for stage in fractions) / self.getWeight()
+
+class BatchProgress:
+    """
+        Progress and remaining time of the running batch.
+        Every job is weighted by its expected duration, and within a job its download
+        and install stages are weighted by their expected durations, so a 2 GB download
+        moves the bar as much as it delays the batch. Stages that print progress use
+        the parsed progress, the others are estimated from the time they have been running.
+
+        The remaining time starts out as the estimated makespan of the batch and is
+        increasingly based on the observed pace as the batch progresses.
+    """
+
+    def __init__(self, getExpectedDurations : Callable[[WingetQueueMessage], Tuple[float, float]]) -> None:
+        self.getExpectedDurations = getExpectedDurations
+        self.lock = Lock()
+        self.jobProgress = dict()
+        self.startTime = None
+        self.estimatedMakespanSeconds = 0.0
+        self.running = False
+
+    def startBatch(self, jobs : List[WingetQueueMessage], estimatedMakespanSeconds : float) -> None:
+        jobProgress = {job : JobProgress(*self.getExpectedDurations(job)) for job in jobs}
+        with self.lock:
+            self.jobProgress = jobProgress
+            self.startTime = time.monotonic()
+            self.estimatedMakespanSeconds = estimatedMakespanSeconds
+            self.running = True
+
+    def finishBatch(self) -> None:
+        with self.lock:
+            self.running = False
+
+    def isRunning(self) -> bool:
+        return self.running
+
+    def startStage(self, job : WingetQueueMessage, stage : ProgressStage) -> None:
+        with self.lock:
+            jobProgress = self.jobProgress.get(job)
+            if jobProgress is not None and jobProgress.stage != stage:
+                jobProgress.stage = stage
+                jobProgress.stageStartTime = time.monotonic()
+                jobProgress.stageHasProgressOutput = False
+
+    def setParsedProgress(self, job : WingetQueueMessage, progressParser : WingetProgressParser) -> None:
+        self.startStage(job, progressParser.stage)
+        with self.lock:
+            jobProgress = self.jobProgress.get(job)
+            if jobProgress is None:
+                return
+            jobProgress.stageHasProgressOutput = progressParser.hasProgressOutput
+            # winget install, the fallback for prefetched installers that can not be run directly,
+            # downloads the installer again, that must not move a finished download back
+            for stage, fraction in progressParser.fractions.items():
+                jobProgress.fractions[stage] = max(jobProgress.fractions[stage], fraction)
+
+    def finishStage(self, job : WingetQueueMessage, stage : ProgressStage) -> None:
+        with self.lock:
+            jobProgress = self.jobProgress.get(job)
+            if jobProgress is not None:
+                jobProgress.fractions[stage] = 1.0
+
+    def finishJob(self, job : WingetQueueMessage) -> None:
+        with self.lock:
+            jobProgress = self.jobProgress.get(job)
+            if jobProgress is not None:
+                jobProgress.finished = True
+
+    def getFraction(self) -> float:
+        now = time.monotonic()
+        with self.lock:
+            totalWeight = sum(jobProgress.getWeight() for jobProgress in self.jobProgress.values())
+            if totalWeight <= 0:
+                return 0.0 if self.running else 1.0
+            return sum(jobProgress.getWeight() * jobProgress.getFraction(now) for jobProgress in self.jobProgress.values()) / totalWeight
+
+    def getRemainingSeconds(self) -> Optional[float]:
+        if not self.running:
+            return None
+
+        fraction = self.getFraction()
+        elapsedSeconds = time.monotonic() - self.startTime
+        if fraction <= 0:
+            return max(0.0, self.estimatedMakespanSeconds - elapsedSeconds)
+
+        # the observed pace is trusted more the further the batch is
+        observedWeight = math.sqrt(fraction)
+        estimatedTotalSeconds = (1 - observedWeight) * self.estimatedMakespanSeconds + observedWeight * elapsedSeconds / fraction
+        return max(0.0, estimatedTotalSeconds - elapsedSeconds)
+
+def formatDuration(seconds : float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds // 60 % 60:02d} min"
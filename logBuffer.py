@@ -0,0 +1,79 @@
+import atexit
+import logging
+import os
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from typing import Optional
+
+from appPaths import getDataDirectory
+
+DEFAULT_MAX_BUFFERED_LINES = 500
+JOB_OUTPUT_LOG_FILE_NAME = "jobOutput.log"
+JOB_OUTPUT_LOG_MAX_BYTES = 5 * 1024 * 1024
+JOB_OUTPUT_LOG_BACKUP_COUNT = 5
+
+jobOutputLogger = None
+
+def getJobOutputLogger() -> logging.Logger:
+    """
+        Logger writing the full output of every job to a rotating file in the data directory.
+        Records are only queued by the calling thread (the main loop for the job logs of the GUI),
+        a listener thread writes them to the file.
+    """
+    global jobOutputLogger
+    if jobOutputLogger is None:
+        logDirectory = os.path.join(getDataDirectory(), "logs")
+        os.makedirs(logDirectory, exist_ok=True)
+
+        fileHandler = RotatingFileHandler(
+            os.path.join(logDirectory, JOB_OUTPUT_LOG_FILE_NAME),
+            maxBytes=JOB_OUTPUT_LOG_MAX_BYTES,
+            backupCount=JOB_OUTPUT_LOG_BACKUP_COUNT,
+            encoding="utf-8",
+            delay=True
+        )
+        fileHandler.setFormatter(logging.Formatter("%(asctime)s [%(jobName)s] %(message)s"))
+
+        recordQueue = SimpleQueue()
+        queueListener = QueueListener(recordQueue, fileHandler)
+        queueListener.start()
+        # writes the records that are still queued when the app exits
+        atexit.register(queueListener.stop)
+
+        jobOutputLogger = logging.getLogger("simpleDownloader.jobOutput")
+        jobOutputLogger.setLevel(logging.INFO)
+        jobOutputLogger.propagate = False
+        jobOutputLogger.addHandler(QueueHandler(recordQueue))
+    return jobOutputLogger
+
+def getJobOutputLogPath() -> str:
+    return os.path.join(getDataDirectory(), "logs", JOB_OUTPUT_LOG_FILE_NAME)
+
+class RingBufferLog:
+    """
+        Keeps only the last maxLines lines of a job's output in memory.
+        With spillName set, every line is also written to the rotating job output log,
+        so the full output is still available on disk.
+    """
+
+    def __init__(self, maxLines : int = DEFAULT_MAX_BUFFERED_LINES, spillName : Optional[str] = None) -> None:
+        self.lines = deque(maxlen=maxLines)
+        self.numDroppedLines = 0
+        self.spillName = spillName
+
+    def append(self, text : str) -> None:
+        lines = text.splitlines(keepends=True)
+        numDroppedLines = len(self.lines) + len(lines) - self.lines.maxlen
+        if numDroppedLines > 0:
+            self.numDroppedLines += numDroppedLines
+        self.lines.extend(lines)
+
+        # one record per chunk, it is written to the file on the listener thread
+        if self.spillName is not None and lines:
+            getJobOutputLogger().info(text.rstrip("\n"), extra={"jobName" : self.spillName})
+
+    def getText(self) -> str:
+        if self.numDroppedLines == 0:
+            return "".join(self.lines)
+        return f"... {self.numDroppedLines} earlier lines are in {getJobOutputLogPath()}\n" + "".join(self.lines)
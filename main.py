@@ -1,7 +1,18 @@
-from app import SimpleDownloaderApp
+import sys
+
+from startupTimer import StartupTimer
 
 def main() -> None:
-    simpleDownloaderApp = SimpleDownloaderApp()
+    startupTimer = StartupTimer()
+
+    # the headless mode never imports the GUI modules (tkinter, ttkbootstrap, PIL)
+    if "--headless" in sys.argv[1:]:
+        from cli import runHeadless
+        sys.exit(runHeadless())
+
+    from app import SimpleDownloaderApp
+    startupTimer.mark("imports")
+    simpleDownloaderApp = SimpleDownloaderApp(startupTimer)
     simpleDownloaderApp.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import time
+from threading import Lock, get_ident
+from typing import Iterable, List, Optional, Tuple
+
+from appPaths import getDataFilePath
+
+PACKAGE_CACHE_DIRECTORY_ENVIRONMENT_VARIABLE = "SIMPLE_DOWNLOADER_PACKAGE_CACHE"
+PACKAGE_MIRROR_ENVIRONMENT_VARIABLE = "SIMPLE_DOWNLOADER_PACKAGE_MIRROR"
+PACKAGE_CACHE_MAX_MEGABYTES_ENVIRONMENT_VARIABLE = "SIMPLE_DOWNLOADER_PACKAGE_CACHE_MAX_MB"
+DEFAULT_PACKAGE_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+PACKAGE_CACHE_INDEX_FILE_NAME = "index.json"
+MIRROR_TIMEOUT_SECONDS = 30
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 1641 and 3010 mean the installation succeeded and a reboot was started or is required
+SUCCESSFUL_INSTALLER_EXIT_CODES = (0, 1641, 3010)
+
+INSTALLER_EXTENSIONS = {
+    "msi" : ".msi",
+    "wix" : ".msi",
+    "msix" : ".msix",
+    "appx" : ".appx",
+    "zip" : ".zip",
+}
+
+# silent switches winget uses for the installer types that have well known ones
+DEFAULT_SILENT_SWITCHES = {
+    "inno" : ["/VERYSILENT", "/SUPPRESSMSGBOXES", "/NORESTART", "/SP-"],
+    "nullsoft" : ["/S"],
+    "burn" : ["/quiet", "/norestart"],
+}
+
+WINGET_SHOW_FIELD_PATTERN = re.compile(r"^\s*(Version|Installer Type|Installer Url|Installer SHA256):\s*(\S+)\s*$")
+MANIFEST_INSTALLER_TYPE_PATTERN = re.compile(r"^\s*InstallerType:\s*['\"]?(\w+)", re.MULTILINE)
+MANIFEST_SILENT_SWITCH_PATTERN = re.compile(r"^\s*Silent:\s*(.+?)\s*$", re.MULTILINE)
+
+class PackageInfo:
+    """
+        Version and installer of a package as reported by `winget show`
+    """
+
+    def __init__(self, wingetId : str, version : str, installerType : str, installerUrl : str, sha256 : str) -> None:
+        self.wingetId = wingetId
+        self.version = version
+        self.installerType = installerType
+        self.installerUrl = installerUrl
+        self.sha256 = sha256
+
+    def getCacheKey(self) -> str:
+        return f"{self.wingetId.lower()}/{self.version}/{self.sha256}"
+
+    def getInstallerExtension(self) -> str:
+        if self.installerType in INSTALLER_EXTENSIONS:
+            return INSTALLER_EXTENSIONS[self.installerType]
+        return os.path.splitext(self.installerUrl.split("?")[0])[1].lower() or ".exe"
+
+    def getBlobPath(self) -> str:
+        """
+            Location of the installer relative to the root of a cache or mirror
+        """
+        return f"blobs/{self.sha256[:2]}/{self.sha256}{self.getInstallerExtension()}"
+
+def buildWingetShowCommand(wingetId : str, wingetExecutable : List[str] = ["winget"]) -> List[str]:
+    return [*wingetExecutable, "show", "-e", "--id", wingetId, "--accept-source-agreements", "--disable-interactivity"]
+
+def parseWingetShow(wingetId : str, lines : Iterable[str]) -> Optional[PackageInfo]:
+    """
+        Returns the package info from the output of `winget show`, or None if
+        the output has no version or installer hash to key the cache with
+    """
+    fields = dict()
+    for line in lines:
+        match = WINGET_SHOW_FIELD_PATTERN.match(line)
+        if match is not None:
+            fields.setdefault(match.group(1), match.group(2))
+
+    if "Version" not in fields or "Installer SHA256" not in fields:
+        return None
+    return PackageInfo(wingetId, fields["Version"], fields.get("Installer Type", "exe").lower(),
+                       fields.get("Installer Url", ""), fields["Installer SHA256"].lower())
+
+def parseInstallerManifest(manifestText : str) -> Tuple[Optional[str], Optional[str]]:
+    """
+        Returns the installer type and silent switch of the manifest written next to the installer by `winget download`
+    """
+    installerTypeMatch = MANIFEST_INSTALLER_TYPE_PATTERN.search(manifestText)
+    silentSwitchMatch = MANIFEST_SILENT_SWITCH_PATTERN.search(manifestText)
+    return (installerTypeMatch.group(1).lower() if installerTypeMatch else None,
+            silentSwitchMatch.group(1).strip("'\"") if silentSwitchMatch else None)
+
+def findDownloadedInstaller(downloadDirectory : str) -> Tuple[Optional[str], Optional[str]]:
+    """
+        Returns the paths of the installer and of the manifest written by `winget download`
+    """
+    installerPath = None
+    manifestPath = None
+    for entry in os.scandir(downloadDirectory):
+        if not entry.is_file():
+            continue
+        if entry.name.endswith((".yaml", ".yml")):
+            manifestPath = entry.path
+        elif installerPath is None or entry.stat().st_size > os.path.getsize(installerPath):
+            installerPath = entry.path
+    return installerPath, manifestPath
+
+def getTemporaryPath(filePath : str) -> str:
+    """
+        Name to write filePath under before it is renamed into place. Unique per process and thread,
+        since several download workers can store or fetch the same installer at once.
+    """
+    return f"{filePath}.{os.getpid()}.{get_ident()}.tmp"
+
+def hashFile(filePath : str) -> str:
+    sha256 = hashlib.sha256()
+    with open(filePath, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+class CachedInstaller:
+    def __init__(self, installerPath : str, installerType : str, silentSwitch : Optional[str] = None) -> None:
+        self.installerPath = installerPath
+        self.installerType = installerType
+        self.silentSwitch = silentSwitch
+
+def buildInstallerCommand(installer : CachedInstaller, requireUserInput : bool) -> Optional[List[str]]:
+    """
+        Command that runs a cached installer the way winget would, or None if the
+        installer type can not be run directly (winget install is used instead)
+    """
+    if installer.installerType in ("msi", "wix"):
+        command = ["msiexec", "/i", installer.installerPath]
+        return command if requireUserInput else command + ["/qn", "/norestart"]
+
+    if installer.installerType not in ("exe", "inno", "nullsoft", "burn"):
+        return None
+
+    if requireUserInput:
+        return [installer.installerPath]
+    if installer.silentSwitch:
+        return [installer.installerPath, *installer.silentSwitch.split()]
+    if installer.installerType in DEFAULT_SILENT_SWITCHES:
+        return [installer.installerPath, *DEFAULT_SILENT_SWITCHES[installer.installerType]]
+
+    # an exe without a known silent switch would show its UI
+    return None
+
+class PackageCacheStats:
+    """
+        Hit/miss counters of a batch, updated from the download workers
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.hits = 0
+            self.mirrorHits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.bytesFromCache = 0
+            self.bytesDownloaded = 0
+
+    def recordHit(self, numBytes : int, fromMirror : bool = False) -> None:
+        with self.lock:
+            if fromMirror:
+                self.mirrorHits += 1
+            else:
+                self.hits += 1
+            self.bytesFromCache += numBytes
+
+    def recordMiss(self) -> None:
+        with self.lock:
+            self.misses += 1
+
+    def recordDownload(self, numBytes : int) -> None:
+        with self.lock:
+            self.bytesDownloaded += numBytes
+
+    def recordEviction(self) -> None:
+        with self.lock:
+            self.evictions += 1
+
+    def toDict(self) -> dict:
+        with self.lock:
+            return {
+                "hits" : self.hits,
+                "mirrorHits" : self.mirrorHits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "bytesFromCache" : self.bytesFromCache,
+                "bytesDownloaded" : self.bytesDownloaded,
+            }
+
+class PackageCache:
+    """
+        Content addressed cache of installers, keyed by winget id + version + installer SHA256.
+        Installers are stored as blobs/<sha[:2]>/<sha><extension> with a .json sidecar holding the
+        installer type and silent switch, so any cache directory can also serve as the mirror of
+        another machine, either as a shared directory or through a plain HTTP server.
+        The least recently used installers are evicted once the cache grows over maxBytes.
+    """
+
+    def __init__(self, cacheDirectory : Optional[str] = None, maxBytes : int = DEFAULT_PACKAGE_CACHE_MAX_BYTES, mirror : Optional[str] = None) -> None:
+        self.cacheDirectory = cacheDirectory or getDataFilePath("packageCache")
+        self.maxBytes = maxBytes
+        self.mirror = mirror
+        self.indexPath = os.path.join(self.cacheDirectory, PACKAGE_CACHE_INDEX_FILE_NAME)
+        self.lock = Lock()
+        self.index = None
+        self.stats = PackageCacheStats()
+
+    @classmethod
+    def fromEnvironment(cls) -> "PackageCache":
+        maxMegabytes = os.environ.get(PACKAGE_CACHE_MAX_MEGABYTES_ENVIRONMENT_VARIABLE)
+        return cls(
+            os.environ.get(PACKAGE_CACHE_DIRECTORY_ENVIRONMENT_VARIABLE) or None,
+            int(maxMegabytes) * 1024 * 1024 if maxMegabytes else DEFAULT_PACKAGE_CACHE_MAX_BYTES,
+            os.environ.get(PACKAGE_MIRROR_ENVIRONMENT_VARIABLE) or None
+        )
+
+    def loadIndex(self) -> dict:
+        # must be called with the lock held
+        if self.index is None:
+            os.makedirs(self.cacheDirectory, exist_ok=True)
+            try:
+                with open(self.indexPath, encoding="utf-8") as indexFile:
+                    self.index = json.load(indexFile)
+            except (OSError, ValueError):
+                self.index = dict()
+        return self.index
+
+    def saveIndex(self) -> None:
+        # must be called with the lock held, the index is replaced atomically so readers never see a partial file
+        temporaryIndexPath = getTemporaryPath(self.indexPath)
+        with open(temporaryIndexPath, "w", encoding="utf-8") as indexFile:
+            json.dump(self.index, indexFile)
+        os.replace(temporaryIndexPath, self.indexPath)
+
+    def lookup(self, packageInfo : PackageInfo) -> Optional[CachedInstaller]:
+        """
+            Returns the cached installer of the package, fetching it from the mirror if the local cache misses
+        """
+        with self.lock:
+            entry = self.loadIndex().get(packageInfo.getCacheKey())
+            if entry is not None:
+                installerPath = os.path.join(self.cacheDirectory, entry["blob"])
+                if os.path.exists(installerPath):
+                    entry["lastUsed"] = time.time()
+                    self.saveIndex()
+                    self.stats.recordHit(entry["size"])
+                    return CachedInstaller(installerPath, entry["installerType"], entry.get("silentSwitch"))
+                del self.index[packageInfo.getCacheKey()]
+
+        installer = self.fetchFromMirror(packageInfo)
+        if installer is not None:
+            self.stats.recordHit(os.path.getsize(installer.installerPath), fromMirror=True)
+            return installer
+
+        self.stats.recordMiss()
+        return None
+
+    def store(self, packageInfo : PackageInfo, installerPath : str, installerType : Optional[str] = None,
+              silentSwitch : Optional[str] = None) -> Optional[CachedInstaller]:
+        """
+            Copies a downloaded installer into the cache. The installer is only
+            cached if its hash matches the one winget reported for the package.
+        """
+        if hashFile(installerPath) != packageInfo.sha256:
+            return None
+
+        blobPath = os.path.join(self.cacheDirectory, packageInfo.getBlobPath())
+        os.makedirs(os.path.dirname(blobPath), exist_ok=True)
+
+        # copy under a temporary name first, a blob is only ever seen complete
+        temporaryBlobPath = getTemporaryPath(blobPath)
+        shutil.copy(installerPath, temporaryBlobPath)
+        os.replace(temporaryBlobPath, blobPath)
+
+        self.stats.recordDownload(os.path.getsize(blobPath))
+        return self.addEntry(packageInfo, blobPath, installerType or packageInfo.installerType, silentSwitch)
+
+    def addEntry(self, packageInfo : PackageInfo, blobPath : str, installerType : str, silentSwitch : Optional[str]) -> CachedInstaller:
+        temporarySidecarPath = getTemporaryPath(f"{blobPath}.json")
+        with open(temporarySidecarPath, "w", encoding="utf-8") as sidecarFile:
+            json.dump({"installerType" : installerType, "silentSwitch" : silentSwitch}, sidecarFile)
+        os.replace(temporarySidecarPath, f"{blobPath}.json")
+
+        with self.lock:
+            self.loadIndex()[packageInfo.getCacheKey()] = {
+                "blob" : packageInfo.getBlobPath(),
+                "size" : os.path.getsize(blobPath),
+                "lastUsed" : time.time(),
+                "installerType" : installerType,
+                "silentSwitch" : silentSwitch,
+            }
+            self.evict(packageInfo.getCacheKey())
+            self.saveIndex()
+
+        return CachedInstaller(blobPath, installerType, silentSwitch)
+
+    def evict(self, keepCacheKey : str) -> None:
+        # must be called with the lock held, the installer that was just added is never evicted
+        totalSize = sum(entry["size"] for entry in self.index.values())
+        for cacheKey, entry in sorted(self.index.items(), key=lambda item: item[1]["lastUsed"]):
+            if totalSize <= self.maxBytes:
+                break
+            if cacheKey == keepCacheKey:
+                continue
+
+            del self.index[cacheKey]
+            totalSize -= entry["size"]
+            self.stats.recordEviction()
+
+            # the same installer can be shared by several ids or versions
+            if not any(otherEntry["blob"] == entry["blob"] for otherEntry in self.index.values()):
+                for filePath in (entry["blob"], entry["blob"] + ".json"):
+                    try:
+                        os.remove(os.path.join(self.cacheDirectory, filePath))
+                    except OSError:
+                        pass
+
+    def fetchFromMirror(self, packageInfo : PackageInfo) -> Optional[CachedInstaller]:
+        if not self.mirror:
+            return None
+
+        blobPath = os.path.join(self.cacheDirectory, packageInfo.getBlobPath())
+        os.makedirs(os.path.dirname(blobPath), exist_ok=True)
+        temporaryBlobPath = getTemporaryPath(blobPath)
+
+        try:
+            self.copyFromMirror(packageInfo.getBlobPath(), temporaryBlobPath)
+            if hashFile(temporaryBlobPath) != packageInfo.sha256:
+                os.remove(temporaryBlobPath)
+                return None
+            os.replace(temporaryBlobPath, blobPath)
+        except OSError:
+            try:
+                os.remove(temporaryBlobPath)
+            except OSError:
+                pass
+            return None
+
+        # the sidecar is optional, without it the defaults of the installer type are used
+        sidecar = dict()
+        try:
+            self.copyFromMirror(packageInfo.getBlobPath() + ".json", temporaryBlobPath)
+            with open(temporaryBlobPath, encoding="utf-8") as sidecarFile:
+                sidecar = json.load(sidecarFile)
+            os.remove(temporaryBlobPath)
+        except (OSError, ValueError):
+            pass
+
+        return self.addEntry(packageInfo, blobPath, sidecar.get("installerType") or packageInfo.installerType, sidecar.get("silentSwitch"))
+
+    def copyFromMirror(self, relativePath : str, destinationPath : str) -> None:
+        if self.mirror.startswith(("http://", "https://")):
+            # only imported for http mirrors, it is one of the slowest imports of the app
+            import urllib.request
+            # urllib errors derive from OSError
+            with urllib.request.urlopen(f"{self.mirror.rstrip('/')}/{relativePath}", timeout=MIRROR_TIMEOUT_SECONDS) as response:
+                with open(destinationPath, "wb") as destinationFile:
+                    shutil.copyfileobj(response, destinationFile, HASH_CHUNK_SIZE)
+        else:
+            shutil.copyfile(os.path.join(self.mirror, *relativePath.split("/")), destinationPath)
+
+    def materialize(self, installer : CachedInstaller, directory : str) -> CachedInstaller:
+        """
+            Links (or copies) a cached installer into directory, so eviction can not
+            remove it while it is being installed
+        """
+        installerPath = os.path.join(directory, os.path.basename(installer.installerPath))
+        try:
+            os.link(installer.installerPath, installerPath)
+        except OSError:
+            shutil.copyfile(installer.installerPath, installerPath)
+
+        # installers fetched over http lose their mode, only matters for the fake winget installers outside of windows
+        if os.name != "nt":
+            os.chmod(installerPath, os.stat(installerPath).st_mode | stat.S_IXUSR)
+        return CachedInstaller(installerPath, installer.installerType, installer.silentSwitch)
@@ -0,0 +1,122 @@
+import codecs
+import locale
+import subprocess
+import time
+from queue import Queue
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterator, List, Optional
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_QUEUED_CHUNKS = 256
+
+class LineSplitter:
+    """
+        Incrementally splits decoded text into lines.
+        Carriage return redraws (progress bars, spinners) are collapsed so
+        only the last state of a redrawn line is kept, and a line that is
+        redrawn forever without a newline does not grow the buffer
+    """
+
+    def __init__(self) -> None:
+        self.pending = ""
+
+    def feed(self, text : str) -> List[str]:
+        self.pending += text
+        lines = self.pending.split("\n")
+        self.pending = lines.pop()
+
+        # a trailing "\r" may be the first half of "\r\n", so keep it until the next chunk
+        lastRedraw = self.pending.rfind("\r", 0, len(self.pending) - 1)
+        if lastRedraw != -1:
+            self.pending = self.pending[lastRedraw + 1:]
+
+        return [collapseRedraws(line) for line in lines]
+
+    def flush(self) -> List[str]:
+        tail = collapseRedraws(self.pending)
+        self.pending = ""
+        return [tail] if tail else []
+
+def collapseRedraws(line : str) -> str:
+    line = line.rstrip("\r")
+    return line[line.rfind("\r") + 1:]
+
+class StreamingProcess:
+    """
+        Runs a command and streams its decoded stdout and stderr lines as they arrive.
+        Both pipes are read at the same time on their own reader threads, so a
+        process can never block on a full pipe, and the tail of the output is
+        flushed once the process exits. returncode is set after lines() is exhausted.
+        onStdoutText, when given, is called on the reader thread with every decoded chunk
+        of stdout before it is split into lines, so carriage return redraws can be parsed.
+        environment, when given, replaces the environment variables of the process.
+    """
+
+    END_OF_STREAM = object()
+
+    def __init__(self, command : List[str], encoding : Optional[str] = None, onStdoutText : Optional[Callable[[str], None]] = None,
+                 environment : Optional[Dict[str, str]] = None) -> None:
+        self.command = command
+        self.environment = environment
+        self.onStdoutText = onStdoutText
+        self.encoding = encoding or locale.getpreferredencoding(False)
+        self.returncode = None
+        # time.perf_counter() right after the process was created
+        self.spawnTime = None
+        self.numOutputBytes = 0
+        self.numOutputBytesLock = Lock()
+
+    def lines(self) -> Iterator[str]:
+        process = subprocess.Popen(self.command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.environment)
+        self.spawnTime = time.perf_counter()
+        outputQueue = Queue(maxsize=MAX_QUEUED_CHUNKS)
+
+        readerThreads = [
+            Thread(target=self.readerThreadFunc, args=(process.stdout, outputQueue, self.onStdoutText), daemon=True),
+            Thread(target=self.readerThreadFunc, args=(process.stderr, outputQueue, None), daemon=True),
+        ]
+        for readerThread in readerThreads:
+            readerThread.start()
+
+        numOpenStreams = len(readerThreads)
+        try:
+            while numOpenStreams > 0:
+                lines = outputQueue.get()
+                if lines is StreamingProcess.END_OF_STREAM:
+                    numOpenStreams -= 1
+                    continue
+                yield from lines
+        finally:
+            # the consumer stopped early, so the readers have to be unblocked before they can finish
+            if numOpenStreams > 0:
+                process.kill()
+                while numOpenStreams > 0:
+                    if outputQueue.get() is StreamingProcess.END_OF_STREAM:
+                        numOpenStreams -= 1
+            self.returncode = process.wait()
+
+    def readerThreadFunc(self, stream, outputQueue : Queue, onText : Optional[Callable[[str], None]]) -> None:
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        lineSplitter = LineSplitter()
+        numOutputBytes = 0
+
+        try:
+            while True:
+                chunk = stream.read1(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                numOutputBytes += len(chunk)
+                text = decoder.decode(chunk)
+                if onText is not None:
+                    onText(text)
+                lines = lineSplitter.feed(text)
+                if lines:
+                    outputQueue.put(lines)
+            lines = lineSplitter.feed(decoder.decode(b"", final=True)) + lineSplitter.flush()
+            if lines:
+                outputQueue.put(lines)
+        finally:
+            stream.close()
+            with self.numOutputBytesLock:
+                self.numOutputBytes += numOutputBytes
+            outputQueue.put(StreamingProcess.END_OF_STREAM)
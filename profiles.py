@@ -0,0 +1,83 @@
+import json
+import os
+from typing import List, Optional
+
+from appPaths import getDataFilePath
+from wingetJobs import OperationType
+
+PROFILES_DIRECTORY_NAME = "profiles"
+PROFILE_FILE_EXTENSION = ".json"
+
+class ProfileError(ValueError):
+    pass
+
+class Profile:
+    """
+        A named selection of programs, the operation to run on them and
+        the options of the batch (see EngineOptions.toDict), if it has any.
+        The options can also hold the headless options in fleet.HEADLESS_PROFILE_OPTIONS
+    """
+
+    def __init__(self, name : str, wingetIds : List[str], operation : OperationType = OperationType.INSTALL, options : Optional[dict] = None) -> None:
+        self.name = name
+        self.wingetIds = wingetIds
+        self.operation = operation
+        self.options = options or dict()
+
+    @classmethod
+    def fromDict(cls, data, sourceName : str) -> "Profile":
+        if not isinstance(data, dict):
+            raise ProfileError(f"{sourceName}: expected an object")
+
+        wingetIds = data.get("programs")
+        if not isinstance(wingetIds, list) or not all(isinstance(wingetId, str) and wingetId and not any(character.isspace() for character in wingetId) for wingetId in wingetIds):
+            raise ProfileError(f"{sourceName}: \"programs\" must be a list of winget ids")
+
+        try:
+            operation = OperationType(data.get("operation", OperationType.INSTALL.value))
+        except ValueError:
+            raise ProfileError(f"{sourceName}: unknown operation {data.get('operation')}")
+
+        options = data.get("options", dict())
+        if not isinstance(options, dict):
+            raise ProfileError(f"{sourceName}: \"options\" must be an object")
+
+        return cls(data.get("name", sourceName), wingetIds, operation, options)
+
+    def toDict(self) -> dict:
+        data = {
+            "name" : self.name,
+            "operation" : self.operation.value,
+            "programs" : self.wingetIds,
+        }
+        if self.options:
+            data["options"] = self.options
+        return data
+
+def loadProfile(profilePath : str) -> Profile:
+    """
+        Loads a profile file, e.g.
+        {"name" : "office", "operation" : "install", "programs" : ["Mozilla.Firefox", "7zip.7zip"], "options" : {"numDownloadWorkers" : 8}}
+    """
+    try:
+        with open(profilePath, encoding="utf-8") as profileFile:
+            data = json.load(profileFile)
+    except (OSError, ValueError) as e:
+        raise ProfileError(f"{profilePath}: {e}")
+
+    return Profile.fromDict(data, profilePath)
+
+def saveProfile(profile : Profile, profilePath : str) -> None:
+    try:
+        with open(profilePath, "w", encoding="utf-8") as profileFile:
+            json.dump(profile.toDict(), profileFile, indent=4)
+    except OSError as e:
+        raise ProfileError(f"{profilePath}: {e}")
+
+def getProfilesDirectory() -> str:
+    """
+        Default directory of the profiles saved from the GUI, in the data directory
+    """
+    profilesDirectory = getDataFilePath(PROFILES_DIRECTORY_NAME)
+    os.makedirs(profilesDirectory, exist_ok=True)
+    return profilesDirectory
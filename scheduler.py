@@ -0,0 +1,205 @@
+import heapq
+from typing import Callable, Dict, List, Optional
+
+from catalog import ProgramCatalog
+from wingetJobs import OperationType, WingetQueueMessage, DEFAULT_NUM_DOWNLOAD_WORKERS
+
+DEFAULT_EXPECTED_DURATION_SECONDS = 60.0
+MIN_EXPECTED_DURATION_SECONDS = 1.0
+# share of the expected duration of an install job that is spent downloading
+ESTIMATED_DOWNLOAD_SHARE = 0.5
+
+class ScheduledJob:
+    """
+        A job with its priority and its simulated download and install times
+    """
+
+    def __init__(self, job : WingetQueueMessage, expectedDurationSeconds : float) -> None:
+        self.job = job
+        self.expectedDurationSeconds = expectedDurationSeconds
+        self.priority = 0.0
+        self.downloadStart = 0.0
+        self.downloadEnd = 0.0
+        self.installStart = 0.0
+        self.installEnd = 0.0
+
+    def getDownloadDuration(self) -> float:
+        if not self.job.operation.downloadsInstaller():
+            return 0.0
+        return self.expectedDurationSeconds * ESTIMATED_DOWNLOAD_SHARE
+
+    def getInstallDuration(self) -> float:
+        return self.expectedDurationSeconds - self.getDownloadDuration()
+
+class Schedule:
+    """
+        Jobs in the order they are submitted to the worker pool, with the estimated makespan of the batch
+    """
+
+    def __init__(self, scheduledJobs : List[ScheduledJob], numDownloadWorkers : int) -> None:
+        self.scheduledJobs = scheduledJobs
+        self.numDownloadWorkers = numDownloadWorkers
+        self.makespanSeconds = max((scheduledJob.installEnd for scheduledJob in scheduledJobs), default=0.0)
+
+    def getJobs(self) -> List[WingetQueueMessage]:
+        return [scheduledJob.job for scheduledJob in self.scheduledJobs]
+
+    def format(self) -> str:
+        lines = [f"{'#':>3}  {'Program':<36}{'Download':>18}{'Install':>18}  Waits for"]
+        for index, scheduledJob in enumerate(self.scheduledJobs):
+            waitsFor = ", ".join(job.programName for job in scheduledJob.job.dependencies + scheduledJob.job.startAfter)
+            download = f"{scheduledJob.downloadStart:7.0f}s-{scheduledJob.downloadEnd:7.0f}s" if scheduledJob.getDownloadDuration() else "-"
+            install = f"{scheduledJob.installStart:7.0f}s-{scheduledJob.installEnd:7.0f}s"
+            lines.append(f"{index + 1:>3}  {scheduledJob.job.programName[:35]:<36}{download:>18}{install:>18}  {waitsFor}")
+        lines.append(f"Estimated makespan with {self.numDownloadWorkers} parallel downloads: {self.makespanSeconds:.0f}s")
+        return "\n".join(lines)
+
+def getCatalogDuration(job : WingetQueueMessage, programCatalog : Optional[ProgramCatalog]) -> Optional[float]:
+    program = programCatalog.getProgram(job.wingetId) if programCatalog is not None else None
+    return program.expectedDurationSeconds if program is not None else None
+
+def addPrerequisiteJobs(jobs : List[WingetQueueMessage], programCatalog : ProgramCatalog) -> List[WingetQueueMessage]:
+    """
+        Adds an install job for every prerequisite of the install jobs that is not selected yet.
+        A prerequisite shared by several programs is only added once.
+    """
+    jobsById = {job.wingetId.lower() : job for job in jobs}
+    allJobs = list(jobs)
+    jobsToVisit = [job for job in jobs if job.operation == OperationType.INSTALL]
+
+    while jobsToVisit:
+        program = programCatalog.getProgram(jobsToVisit.pop().wingetId)
+        if program is None:
+            continue
+
+        for dependencyId in program.dependsOn:
+            if dependencyId.lower() in jobsById:
+                continue
+            dependencyProgram = programCatalog.getProgram(dependencyId)
+            dependencyJob = WingetQueueMessage(
+                dependencyProgram.programName if dependencyProgram else dependencyId,
+                dependencyProgram.wingetId if dependencyProgram else dependencyId,
+                OperationType.INSTALL
+            )
+            jobsById[dependencyId.lower()] = dependencyJob
+            allJobs.append(dependencyJob)
+            jobsToVisit.append(dependencyJob)
+
+    return allJobs
+
+def linkJobs(jobs : List[WingetQueueMessage], programCatalog : Optional[ProgramCatalog]) -> Dict[str, List[WingetQueueMessage]]:
+    """
+        Sets the dependencies of every install job to the jobs of its prerequisites
+        that are part of the batch, and returns the jobs of every exclusive group
+    """
+    jobsById = {job.wingetId.lower() : job for job in jobs}
+    exclusiveGroups = dict()
+
+    for job in jobs:
+        job.dependencies = list()
+        job.startAfter = list()
+        program = programCatalog.getProgram(job.wingetId) if programCatalog is not None else None
+        if program is None or job.operation != OperationType.INSTALL:
+            continue
+
+        job.dependencies = [jobsById[dependencyId.lower()] for dependencyId in program.dependsOn
+                            if dependencyId.lower() in jobsById and jobsById[dependencyId.lower()].operation == OperationType.INSTALL]
+        if program.exclusiveGroup:
+            exclusiveGroups.setdefault(program.exclusiveGroup, list()).append(job)
+
+    return exclusiveGroups
+
+def buildSchedule(jobs : List[WingetQueueMessage], programCatalog : Optional[ProgramCatalog],
+                  numDownloadWorkers : int = DEFAULT_NUM_DOWNLOAD_WORKERS,
+                  getExpectedDuration : Optional[Callable[[WingetQueueMessage], Optional[float]]] = None) -> Schedule:
+    """
+        Orders a batch so it finishes as early as possible.
+        Jobs are prioritized by the length of the longest chain of jobs that depend on them
+        (their own duration included), so prerequisites and long jobs start first. Jobs of the
+        same exclusive group are chained so they are never in flight at the same time.
+        The schedule is then simulated with the same pipeline as WingetWorkerPool
+        (parallel downloads, one install at a time) to estimate its makespan.
+    """
+    getExpectedDuration = getExpectedDuration or (lambda job: getCatalogDuration(job, programCatalog))
+    exclusiveGroups = linkJobs(jobs, programCatalog)
+
+    scheduledJobs = {
+        job : ScheduledJob(job, max(MIN_EXPECTED_DURATION_SECONDS, getExpectedDuration(job) or DEFAULT_EXPECTED_DURATION_SECONDS))
+        for job in jobs
+    }
+
+    dependents = {job : list() for job in jobs}
+    for job in jobs:
+        for dependency in job.dependencies:
+            dependents[dependency].append(job)
+
+    # the dependency graph is acyclic, the catalog rejects cycles when it is loaded
+    def getPriority(job : WingetQueueMessage) -> float:
+        scheduledJob = scheduledJobs[job]
+        if not scheduledJob.priority:
+            scheduledJob.priority = scheduledJob.expectedDurationSeconds + max((getPriority(dependent) for dependent in dependents[job]), default=0.0)
+        return scheduledJob.priority
+
+    originalOrder = {job : index for index, job in enumerate(jobs)}
+    orderedJobs = sorted(jobs, key=lambda job: (-getPriority(job), originalOrder[job]))
+
+    for groupJobs in exclusiveGroups.values():
+        groupJobs.sort(key=lambda job: (-getPriority(job), originalOrder[job]))
+        for previousJob, job in zip(groupJobs, groupJobs[1:]):
+            job.startAfter = [previousJob]
+
+    simulateSchedule([scheduledJobs[job] for job in orderedJobs], numDownloadWorkers)
+    return Schedule([scheduledJobs[job] for job in orderedJobs], numDownloadWorkers)
+
+def simulateSchedule(scheduledJobs : List[ScheduledJob], numDownloadWorkers : int) -> None:
+    """
+        Discrete event simulation of WingetWorkerPool running the jobs in the given order
+    """
+    scheduledJobsByJob = {scheduledJob.job : scheduledJob for scheduledJob in scheduledJobs}
+    finishedJobs = set()
+    heldJobs = [scheduledJob for scheduledJob in scheduledJobs if scheduledJob.job.startAfter]
+    downloadQueue = [scheduledJob for scheduledJob in scheduledJobs if not scheduledJob.job.startAfter]
+    installQueue = list()
+    waitingInstalls = list()
+    numFreeDownloadWorkers = numDownloadWorkers
+    installing = False
+
+    events = list()
+    eventIndex = 0
+    now = 0.0
+
+    while True:
+        while numFreeDownloadWorkers > 0 and downloadQueue:
+            scheduledJob = downloadQueue.pop(0)
+            scheduledJob.downloadStart = now
+            scheduledJob.downloadEnd = now + scheduledJob.getDownloadDuration()
+            heapq.heappush(events, (scheduledJob.downloadEnd, eventIndex, "downloaded", scheduledJob))
+            eventIndex += 1
+            numFreeDownloadWorkers -= 1
+
+        if not installing and installQueue:
+            scheduledJob = installQueue.pop(0)
+            scheduledJob.installStart = now
+            scheduledJob.installEnd = now + scheduledJob.getInstallDuration()
+            heapq.heappush(events, (scheduledJob.installEnd, eventIndex, "installed", scheduledJob))
+            eventIndex += 1
+            installing = True
+
+        if not events:
+            break
+
+        now, _, eventName, scheduledJob = heapq.heappop(events)
+        if eventName == "downloaded":
+            numFreeDownloadWorkers += 1
+            waitingInstalls.append(scheduledJob)
+        else:
+            installing = False
+            finishedJobs.add(scheduledJob.job)
+            releasedJobs = [heldJob for heldJob in heldJobs if all(job in finishedJobs for job in heldJob.job.startAfter)]
+            heldJobs = [heldJob for heldJob in heldJobs if heldJob not in releasedJobs]
+            downloadQueue.extend(releasedJobs)
+
+        readyInstalls = [waitingJob for waitingJob in waitingInstalls
+                         if all(dependency in finishedJobs or dependency not in scheduledJobsByJob for dependency in waitingJob.job.dependencies)]
+        waitingInstalls = [waitingJob for waitingJob in waitingInstalls if waitingJob not in readyInstalls]
+        installQueue.extend(readyInstalls)
@@ -0,0 +1,28 @@
+import json
+import os
+import time
+from typing import Optional
+
+STARTUP_TIMINGS_ENVIRONMENT_VARIABLE = "SIMPLE_DOWNLOADER_STARTUP_TIMINGS"
+
+class StartupTimer:
+    """
+        Wall clock times of the startup stages of the app.
+        With SIMPLE_DOWNLOADER_STARTUP_TIMINGS set to a file path, the times are
+        written to it once the window is fully built and the app closes itself,
+        which is how tools/benchmarkAppStartup.py measures startups.
+    """
+
+    def __init__(self) -> None:
+        self.marks = dict()
+        self.mark("main")
+
+    def mark(self, stageName : str) -> None:
+        self.marks[stageName] = time.time()
+
+    def getTimingsPath(self) -> Optional[str]:
+        return os.environ.get(STARTUP_TIMINGS_ENVIRONMENT_VARIABLE) or None
+
+    def write(self, timingsPath : str) -> None:
+        with open(timingsPath, "w", encoding="utf-8") as timingsFile:
+            json.dump(self.marks, timingsFile, indent=4)
@@ -0,0 +1,103 @@
+"""
+    Cold and warm startup benchmark of the app with a large synthetic catalog.
+    Starts main.py with SIMPLE_DOWNLOADER_STARTUP_TIMINGS set, so the app reports when
+    each startup stage finished and closes itself once the window is built.
+    A cold start has an empty data directory (no icon atlas, no cached installed programs)
+    and an empty bytecode cache, warm starts reuse both. Exits with 1 when the median
+    warm start paints its first window later than the budget.
+    Needs a display, use xvfb-run on a headless machine.
+
+        python tools/benchmarkAppStartup.py [--programs 5000] [--runs 5] [--budget-ms 1000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from appPaths import DATA_DIRECTORY_ENVIRONMENT_VARIABLE
+from catalog import CATALOGS_ENVIRONMENT_VARIABLE
+from startupTimer import STARTUP_TIMINGS_ENVIRONMENT_VARIABLE
+
+FIRST_PAINT_BUDGET_MILLISECONDS = 1000
+NUM_SYNTHETIC_SECTIONS = 8
+STARTUP_TIMEOUT_SECONDS = 120
+
+def writeSyntheticCatalog(numPrograms : int, catalogPath : str) -> None:
+    sections = [{"name" : f"Synthetic section {sectionIndex}", "programs" : []} for sectionIndex in range(NUM_SYNTHETIC_SECTIONS)]
+    for programIndex in range(numPrograms):
+        sections[programIndex % NUM_SYNTHETIC_SECTIONS]["programs"].append({"name" : f"Synthetic program {programIndex}", "id" : f"Synthetic.Program{programIndex}"})
+
+    with open(catalogPath, "w", encoding="utf-8") as catalogFile:
+        json.dump({"sections" : sections}, catalogFile)
+
+def runStartup(environment : dict) -> dict:
+    """
+        Milliseconds from starting the process to the end of every startup stage
+    """
+    timingsFile, timingsPath = tempfile.mkstemp(prefix="simpleDownloader-startup-", suffix=".json")
+    os.close(timingsFile)
+    environment = dict(environment, **{STARTUP_TIMINGS_ENVIRONMENT_VARIABLE : timingsPath})
+
+    startTime = time.time()
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, "main.py")], cwd=REPO_ROOT, env=environment, check=True, timeout=STARTUP_TIMEOUT_SECONDS)
+
+    with open(timingsPath, encoding="utf-8") as timingsFile:
+        marks = json.load(timingsFile)
+    os.remove(timingsPath)
+
+    return {stageName : (markTime - startTime) * 1000 for stageName, markTime in marks.items()}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=5000, help="number of programs in the synthetic catalog")
+    parser.add_argument("--runs", type=int, default=5, help="number of warm starts")
+    parser.add_argument("--budget-ms", dest="budgetMilliseconds", type=float, default=FIRST_PAINT_BUDGET_MILLISECONDS,
+                        help="time to first paint a warm start must stay under")
+    parser.add_argument("--json", dest="jsonPath", help="also write the results to this JSON file")
+    arguments = parser.parse_args()
+
+    dataDirectory = tempfile.mkdtemp(prefix="simpleDownloader-data-")
+    bytecodeDirectory = tempfile.mkdtemp(prefix="simpleDownloader-pycache-")
+    catalogPath = os.path.join(dataDirectory, "syntheticCatalog.json")
+    writeSyntheticCatalog(arguments.programs, catalogPath)
+
+    environment = dict(os.environ)
+    environment[DATA_DIRECTORY_ENVIRONMENT_VARIABLE] = dataDirectory
+    environment[CATALOGS_ENVIRONMENT_VARIABLE] = catalogPath
+    environment["PYTHONPYCACHEPREFIX"] = bytecodeDirectory
+    # the installed programs are refreshed in the background after the startup, it must not need winget
+    environment["PATH"] = os.path.join(REPO_ROOT, "tools", "fakeWinget") + os.pathsep + environment.get("PATH", "")
+
+    try:
+        coldStartup = runStartup(environment)
+        warmStartups = [runStartup(environment) for _ in range(arguments.runs)]
+    finally:
+        shutil.rmtree(dataDirectory, ignore_errors=True)
+        shutil.rmtree(bytecodeDirectory, ignore_errors=True)
+
+    warmStartup = {stageName : statistics.median(startup[stageName] for startup in warmStartups) for stageName in coldStartup}
+
+    print(f"{arguments.programs} synthetic programs, cold start and median of {arguments.runs} warm starts, ms since the process started")
+    print(f"{'stage':<20} {'cold':>8} {'warm':>8}")
+    for stageName in coldStartup:
+        print(f"{stageName:<20} {coldStartup[stageName]:8.1f} {warmStartup[stageName]:8.1f}")
+
+    if arguments.jsonPath:
+        with open(arguments.jsonPath, "w", encoding="utf-8") as jsonFile:
+            json.dump({"programs" : arguments.programs, "cold" : coldStartup, "warm" : warmStartup, "budgetMilliseconds" : arguments.budgetMilliseconds}, jsonFile, indent=4)
+
+    if warmStartup["first paint"] > arguments.budgetMilliseconds:
+        print(f"Time to first paint {warmStartup['first paint']:.1f} ms is over the budget of {arguments.budgetMilliseconds:.0f} ms")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+    Startup benchmark for icon loading with a large synthetic catalog.
+    Compares decoding every .ico with PIL (what the app used to do before showing
+    the window) against the icon atlas, cold (atlas has to be built) and warm.
+    Needs a display, use xvfb-run on a headless machine.
+
+        python tools/benchmarkStartup.py [--programs 500] [--visible 60]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tkinter as tk
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from appPaths import DATA_DIRECTORY_ENVIRONMENT_VARIABLE
+
+def createSyntheticIconDirectory(numPrograms : int) -> str:
+    sourceIconDirectory = os.path.join(REPO_ROOT, "icons")
+    sourceIcons = sorted(fileName for fileName in os.listdir(sourceIconDirectory) if fileName.endswith(".ico"))
+
+    iconDirectory = tempfile.mkdtemp(prefix="simpleDownloader-icons-")
+    for programIndex in range(numPrograms):
+        sourceIcon = sourceIcons[programIndex % len(sourceIcons)]
+        shutil.copyfile(os.path.join(sourceIconDirectory, sourceIcon), os.path.join(iconDirectory, f"Synthetic.Program{programIndex}.ico"))
+    return iconDirectory
+
+def timeIt(function) -> float:
+    startTime = time.perf_counter()
+    function()
+    return time.perf_counter() - startTime
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--programs", type=int, default=500, help="number of programs in the synthetic catalog")
+    parser.add_argument("--visible", type=int, default=60, help="number of icons shown in the first screen")
+    arguments = parser.parse_args()
+
+    iconDirectory = createSyntheticIconDirectory(arguments.programs)
+    os.environ[DATA_DIRECTORY_ENVIRONMENT_VARIABLE] = tempfile.mkdtemp(prefix="simpleDownloader-data-")
+
+    from PIL import Image, ImageTk
+    from iconAtlas import IconAtlas
+
+    rootElement = tk.Tk()
+    rootElement.withdraw()
+    iconNames = sorted(fileName[:-len(".ico")] for fileName in os.listdir(iconDirectory))
+    visibleIconNames = iconNames[:arguments.visible]
+
+    def loadEveryIconWithPil() -> None:
+        images = [ImageTk.PhotoImage(Image.open(os.path.join(iconDirectory, f"{iconName}.ico"))) for iconName in iconNames]
+        assert len(images) == len(iconNames)
+
+    def loadVisibleIconsFromAtlas() -> None:
+        iconAtlas = IconAtlas(iconDirectory)
+        for iconName in visibleIconNames:
+            iconAtlas.getImage(iconName)
+
+    results = {
+        "decode every icon with PIL" : timeIt(loadEveryIconWithPil),
+        "atlas, cold (build + load)" : timeIt(loadVisibleIconsFromAtlas),
+        "atlas, warm" : timeIt(loadVisibleIconsFromAtlas),
+    }
+
+    print(f"{arguments.programs} programs, {arguments.visible} icons visible on the first screen")
+    for description, elapsedTime in results.items():
+        print(f"{description:<30} {elapsedTime * 1000:8.1f} ms")
+
+    rootElement.destroy()
+    shutil.rmtree(iconDirectory, ignore_errors=True)
+    shutil.rmtree(os.environ[DATA_DIRECTORY_ENVIRONMENT_VARIABLE], ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
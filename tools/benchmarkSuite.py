@@ -0,0 +1,308 @@
+"""
+    Benchmark and load test suite on the fake winget (tools/fakeWinget).
+    Every scenario runs in its own process, so its peak memory is its own:
+
+        engine   a batch run by the engine and its worker pool, as in headless mode
+        gui      the same batch started from the app, with the selection and job log widgets,
+                 while a heartbeat on the main loop measures how long the UI thread stalls
+        startup  cold and warm startups of the app, see tools/benchmarkAppStartup.py
+
+    The gui and startup scenarios need a display, without one they are run with xvfb-run.
+    Results can be saved as a baseline, by default named after the current commit, and
+    compared against the baseline of another commit, which fails when a metric regressed
+    by more than the tolerance.
+
+        python tools/benchmarkSuite.py [--jobs 60] [--duration 0.3] [--save-baseline [NAME]] [--compare NAME]
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TOOLS_DIRECTORY)
+sys.path.insert(0, REPO_ROOT)
+
+from appPaths import DATA_DIRECTORY_ENVIRONMENT_VARIABLE
+from catalog import CATALOGS_ENVIRONMENT_VARIABLE
+
+BASELINE_DIRECTORY = os.path.join(TOOLS_DIRECTORY, "benchmarkBaselines")
+SCENARIOS = ["engine", "gui", "startup"]
+GUI_SCENARIOS = {"gui", "startup"}
+DEFAULT_TOLERANCE = 0.15
+SCENARIO_TIMEOUT_SECONDS = 600
+# the main loop is expected to run this callback every HEARTBEAT_MILLISECONDS, a later run is a stall
+HEARTBEAT_MILLISECONDS = 10
+HEARTBEAT_STALL_THRESHOLD_SECONDS = 0.05
+
+# metrics for which a higher value is better, every other metric is better when lower
+HIGHER_IS_BETTER = {"engine.throughputJobsPerMinute", "gui.throughputJobsPerMinute"}
+
+def getPeakMemoryMegabytes():
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return None
+    maxResidentSetSize = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return maxResidentSetSize / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def getSyntheticWingetIds(numJobs : int) -> list:
+    return [f"Synthetic.Program{jobIndex}" for jobIndex in range(numJobs)]
+
+def runEngineScenario(arguments : argparse.Namespace) -> dict:
+    from engine import EngineOptions, WingetEngine
+    from uiEvents import AllJobsFinishedEvent
+    from wingetJobs import OperationType, WingetQueueMessage
+
+    eventQueue = queue.SimpleQueue()
+    engine = WingetEngine(eventQueue.put)
+    jobs = [WingetQueueMessage(wingetId, wingetId, OperationType.INSTALL) for wingetId in getSyntheticWingetIds(arguments.jobs)]
+    options = EngineOptions(numDownloadWorkers=arguments.workers, skipInstalled=False, retryFailedJobs=False)
+
+    startTime = time.perf_counter()
+    engine.runBatch(jobs, options)
+    numEvents = 0
+    while not isinstance(eventQueue.get(), AllJobsFinishedEvent):
+        numEvents += 1
+    elapsedSeconds = time.perf_counter() - startTime
+    engine.stop()
+
+    return {
+        "throughputJobsPerMinute" : len(jobs) * 60 / elapsedSeconds,
+        "eventsPerSecond" : numEvents / elapsedSeconds,
+        "failedJobs" : engine.counters.failedJobs,
+        "peakMemoryMegabytes" : getPeakMemoryMegabytes(),
+    }
+
+def runGuiScenario(arguments : argparse.Namespace) -> dict:
+    from app import SimpleDownloaderApp
+    from uiEvents import AllJobsFinishedEvent
+
+    heartbeatIntervals = list()
+    results = dict()
+
+    class BenchmarkedApp(SimpleDownloaderApp):
+        def onStartupFinished(self) -> None:
+            wingetIds = set(getSyntheticWingetIds(arguments.jobs))
+            for programCheckbox in self.mProgramCheckboxes:
+                programCheckbox.setChecked(programCheckbox.getWingetId() in wingetIds)
+            self.mNumDownloadWorkersVar.set(arguments.workers)
+            self.mSkipInstalledVar.set(False)
+            self.mRetryFailedJobsVar.set(False)
+
+            results["startTime"] = time.perf_counter()
+            self.heartbeat(time.perf_counter())
+            self.onInstallButtonClicked()
+
+        def heartbeat(self, lastBeatTime : float) -> None:
+            now = time.perf_counter()
+            heartbeatIntervals.append(now - lastBeatTime)
+            if "finishTime" not in results:
+                self.mRootElement.after(HEARTBEAT_MILLISECONDS, self.heartbeat, now)
+
+        def handleUiEvent(self, event) -> None:
+            SimpleDownloaderApp.handleUiEvent(self, event)
+            if isinstance(event, AllJobsFinishedEvent):
+                results["finishTime"] = time.perf_counter()
+                self.mRootElement.after(HEARTBEAT_MILLISECONDS, self.onMainWindowClosed)
+
+    benchmarkedApp = BenchmarkedApp()
+    benchmarkedApp.run()
+
+    # the time the main loop was late beyond the stall threshold
+    heartbeatLateness = [interval - HEARTBEAT_MILLISECONDS / 1000 for interval in heartbeatIntervals]
+    uiRefresh = benchmarkedApp.mRunMetrics.toDict()["uiRefresh"]
+    return {
+        "throughputJobsPerMinute" : arguments.jobs * 60 / (results["finishTime"] - results["startTime"]),
+        "uiStallSeconds" : sum(lateness for lateness in heartbeatLateness if lateness >= HEARTBEAT_STALL_THRESHOLD_SECONDS),
+        "maxUiStallSeconds" : max(heartbeatLateness, default=0.0),
+        "eventHandlingSeconds" : uiRefresh["totalSeconds"],
+        "peakMemoryMegabytes" : getPeakMemoryMegabytes(),
+    }
+
+def runStartupScenario(arguments : argparse.Namespace) -> dict:
+    startupResultsPath = os.path.join(os.environ[DATA_DIRECTORY_ENVIRONMENT_VARIABLE], "startup.json")
+    # the exit code only tells whether the time to first paint is over its budget
+    subprocess.run(
+        [sys.executable, os.path.join(TOOLS_DIRECTORY, "benchmarkAppStartup.py"), "--programs", str(arguments.startupPrograms), "--json", startupResultsPath],
+        stdout=subprocess.DEVNULL, timeout=SCENARIO_TIMEOUT_SECONDS
+    )
+    with open(startupResultsPath, encoding="utf-8") as startupResultsFile:
+        startupResults = json.load(startupResultsFile)
+
+    return {
+        "coldFirstPaintMilliseconds" : startupResults["cold"]["first paint"],
+        "coldStartupMilliseconds" : startupResults["cold"]["startup finished"],
+        "warmFirstPaintMilliseconds" : startupResults["warm"]["first paint"],
+        "warmStartupMilliseconds" : startupResults["warm"]["startup finished"],
+    }
+
+SCENARIO_FUNCTIONS = {
+    "engine" : runEngineScenario,
+    "gui" : runGuiScenario,
+    "startup" : runStartupScenario,
+}
+
+def needsXvfb() -> bool:
+    return sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+
+def runScenarioProcess(scenarioName : str, arguments : argparse.Namespace) -> dict:
+    """
+        Runs a scenario in a new process with its own data directory and returns its metrics
+    """
+    dataDirectory = tempfile.mkdtemp(prefix="simpleDownloader-benchmark-")
+    catalogPath = os.path.join(dataDirectory, "syntheticCatalog.json")
+    with open(catalogPath, "w", encoding="utf-8") as catalogFile:
+        programs = [{"name" : wingetId, "id" : wingetId} for wingetId in getSyntheticWingetIds(arguments.jobs)]
+        json.dump({"sections" : [{"name" : "Synthetic programs", "programs" : programs}]}, catalogFile)
+
+    environment = dict(os.environ)
+    environment[DATA_DIRECTORY_ENVIRONMENT_VARIABLE] = dataDirectory
+    environment[CATALOGS_ENVIRONMENT_VARIABLE] = catalogPath
+    environment["PATH"] = os.path.join(TOOLS_DIRECTORY, "fakeWinget") + os.pathsep + environment.get("PATH", "")
+    environment["FAKE_WINGET_DURATION"] = str(arguments.duration)
+    environment["FAKE_WINGET_OUTPUT_LINES"] = str(arguments.outputLines)
+    environment["FAKE_WINGET_PROGRESS_REDRAWS"] = str(arguments.progressRedraws)
+    environment["FAKE_WINGET_FAIL_RATE"] = str(arguments.failRate)
+
+    command = [sys.executable, os.path.abspath(__file__), "--scenario", scenarioName, *getConfigurationArguments(arguments)]
+    if scenarioName in GUI_SCENARIOS and needsXvfb():
+        command = ["xvfb-run", "-a"] + command
+
+    try:
+        completedProcess = subprocess.run(command, cwd=REPO_ROOT, env=environment, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                          timeout=SCENARIO_TIMEOUT_SECONDS)
+    finally:
+        shutil.rmtree(dataDirectory, ignore_errors=True)
+
+    if completedProcess.returncode != 0:
+        raise RuntimeError(f"the {scenarioName} scenario failed with exit code {completedProcess.returncode}")
+    return json.loads(completedProcess.stdout)
+
+def getConfiguration(arguments : argparse.Namespace) -> dict:
+    return {
+        "jobs" : arguments.jobs,
+        "workers" : arguments.workers,
+        "duration" : arguments.duration,
+        "outputLines" : arguments.outputLines,
+        "progressRedraws" : arguments.progressRedraws,
+        "failRate" : arguments.failRate,
+        "startupPrograms" : arguments.startupPrograms,
+    }
+
+def getConfigurationArguments(arguments : argparse.Namespace) -> list:
+    return [
+        "--jobs", str(arguments.jobs), "--workers", str(arguments.workers), "--duration", str(arguments.duration),
+        "--output-lines", str(arguments.outputLines), "--progress-redraws", str(arguments.progressRedraws),
+        "--fail-rate", str(arguments.failRate), "--startup-programs", str(arguments.startupPrograms),
+    ]
+
+def getCurrentCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def getBaselinePath(baselineName : str) -> str:
+    return os.path.join(BASELINE_DIRECTORY, f"{baselineName}.json")
+
+def formatMetric(value) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+def compareWithBaseline(results : dict, baseline : dict, tolerance : float) -> bool:
+    """
+        Prints every metric next to its baseline and returns True when none regressed
+    """
+    if baseline["configuration"] != results["configuration"]:
+        print(f"The baseline was measured with another configuration: {baseline['configuration']}")
+
+    noRegressions = True
+    print(f"{'metric':<42} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metricName, value in results["metrics"].items():
+        baselineValue = baseline["metrics"].get(metricName)
+        if value is None or not baselineValue:
+            print(f"{metricName:<42} {formatMetric(baselineValue):>10} {formatMetric(value):>10}")
+            continue
+
+        change = (value - baselineValue) / baselineValue
+        regressed = -change > tolerance if metricName in HIGHER_IS_BETTER else change > tolerance
+        noRegressions = noRegressions and not regressed
+        print(f"{metricName:<42} {formatMetric(baselineValue):>10} {formatMetric(value):>10} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return noRegressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="scenarios to run")
+    parser.add_argument("--jobs", type=int, default=60, help="number of programs installed in the engine and gui scenarios")
+    parser.add_argument("--workers", type=int, default=4, help="number of parallel downloads")
+    parser.add_argument("--duration", type=float, default=0.3, help="seconds every fake winget command takes")
+    parser.add_argument("--output-lines", dest="outputLines", type=int, default=20, help="output lines of every fake winget command")
+    parser.add_argument("--progress-redraws", dest="progressRedraws", type=int, default=200, help="progress bar redraws of every download")
+    parser.add_argument("--fail-rate", dest="failRate", type=float, default=0.05, help="fraction of programs that fail")
+    parser.add_argument("--startup-programs", dest="startupPrograms", type=int, default=5000, help="size of the catalog of the startup scenario")
+    parser.add_argument("--save-baseline", dest="saveBaseline", nargs="?", const="", metavar="NAME",
+                        help="save the results as a baseline, named after the current commit by default")
+    parser.add_argument("--compare", metavar="NAME", help="compare the results with this baseline, exit with 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative change of a metric that counts as a regression")
+    parser.add_argument("--json", dest="jsonPath", help="also write the results to this JSON file")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.scenario:
+        # a single scenario in its own process, the results go to stdout for the parent
+        print(json.dumps(SCENARIO_FUNCTIONS[arguments.scenario](arguments)))
+        return 0
+
+    if GUI_SCENARIOS & set(arguments.scenarios) and needsXvfb() and shutil.which("xvfb-run") is None:
+        print("There is no display and xvfb-run is not installed, only running the engine scenario", file=sys.stderr)
+        arguments.scenarios = [scenarioName for scenarioName in arguments.scenarios if scenarioName not in GUI_SCENARIOS]
+
+    metrics = dict()
+    for scenarioName in arguments.scenarios:
+        print(f"Running the {scenarioName} scenario...", file=sys.stderr, flush=True)
+        for metricName, value in runScenarioProcess(scenarioName, arguments).items():
+            metrics[f"{scenarioName}.{metricName}"] = value
+
+    results = {
+        "commit" : getCurrentCommit(),
+        "timestamp" : time.time(),
+        "platform" : platform.platform(),
+        "python" : platform.python_version(),
+        "configuration" : getConfiguration(arguments),
+        "metrics" : metrics,
+    }
+
+    if arguments.jsonPath:
+        with open(arguments.jsonPath, "w", encoding="utf-8") as jsonFile:
+            json.dump(results, jsonFile, indent=4)
+
+    if arguments.saveBaseline is not None:
+        baselineName = arguments.saveBaseline or results["commit"] or "baseline"
+        os.makedirs(BASELINE_DIRECTORY, exist_ok=True)
+        with open(getBaselinePath(baselineName), "w", encoding="utf-8") as baselineFile:
+            json.dump(results, baselineFile, indent=4)
+        print(f"Saved the baseline {baselineName}", file=sys.stderr)
+
+    if arguments.compare:
+        try:
+            with open(getBaselinePath(arguments.compare), encoding="utf-8") as baselineFile:
+                baseline = json.load(baselineFile)
+        except (OSError, ValueError) as e:
+            print(f"Could not load the baseline {arguments.compare}: {e}", file=sys.stderr)
+            return 2
+        return 0 if compareWithBaseline(results, baseline, arguments.tolerance) else 1
+
+    for metricName, value in metrics.items():
+        print(f"{metricName:<42} {formatMetric(value):>10}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+    Benchmark for the virtualized program selection and job log lists.
+    For every list size it reports the build + layout time, the number of widgets,
+    the Python memory used and the average time of a scroll step, next to the
+    same numbers for the old layout with one widget row per entry (--eager).
+    Needs a display, use xvfb-run on a headless machine.
+
+        python tools/benchmarkVirtualList.py [--sizes 50 500 5000] [--eager]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import tkinter as tk
+import ttkbootstrap
+from ttkbootstrap import ttk
+
+from customWidgets import JobLog, JobLogList, ProgramCheckbox, ProgramSelectionList, ScrollableFrame
+
+PROGRAMS_PER_SECTION = 50
+LOG_LINES_PER_JOB = 200
+NUM_SCROLL_STEPS = 50
+
+def countWidgets(widget) -> int:
+    return 1 + sum(countWidgets(child) for child in widget.winfo_children())
+
+def createProgramCheckboxes(numEntries : int) -> dict:
+    programCheckboxesBySection = dict()
+    for entryIndex in range(numEntries):
+        sectionName = f"Section {entryIndex // PROGRAMS_PER_SECTION}"
+        programCheckboxesBySection.setdefault(sectionName, list()).append(ProgramCheckbox(f"Program {entryIndex}", f"Synthetic.Program{entryIndex}"))
+    return programCheckboxesBySection
+
+def buildVirtualPrograms(rootElement, numEntries : int, getImage):
+    programSelectionList = ProgramSelectionList(rootElement, createProgramCheckboxes(numEntries), getImage, height=500)
+    programSelectionList.pack(fill=tk.BOTH, expand=True)
+    return programSelectionList.yview
+
+def buildVirtualLogs(rootElement, numEntries : int, getImage):
+    jobLogList = JobLogList(rootElement, getImage, height=500)
+    jobLogList.pack(fill=tk.BOTH, expand=True)
+    for entryIndex in range(numEntries):
+        jobLog = JobLog(f"Program {entryIndex}")
+        for lineIndex in range(LOG_LINES_PER_JOB):
+            jobLog.append(f"winget output line {lineIndex}\n")
+        jobLog.expanded = entryIndex % 10 == 0
+        jobLogList.addJobLog(jobLog)
+    return jobLogList.yview
+
+def buildEagerPrograms(rootElement, numEntries : int, getImage):
+    scrollableFrame = ScrollableFrame(rootElement, height=500)
+    scrollableFrame.pack(fill=tk.BOTH, expand=True)
+    for entryIndex in range(numEntries):
+        rowFrame = ttk.Frame(scrollableFrame)
+        rowFrame.grid(row=entryIndex, column=0, sticky="we")
+        ttk.Label(rowFrame, image=getImage("")).grid(row=0, column=0)
+        ttk.Checkbutton(rowFrame, text=f"Program {entryIndex}", variable=tk.BooleanVar()).grid(row=0, column=1)
+    return scrollableFrame.canvas.yview
+
+def buildEagerLogs(rootElement, numEntries : int, getImage):
+    scrollableFrame = ScrollableFrame(rootElement, height=500, allowHorizontalScroll=False)
+    scrollableFrame.pack(fill=tk.BOTH, expand=True)
+    for entryIndex in range(numEntries):
+        rowFrame = ttk.Frame(scrollableFrame)
+        rowFrame.grid(row=entryIndex, column=0, sticky="we")
+        textArea = tk.Text(rowFrame, wrap=tk.WORD, width=150, height=5)
+        textArea.grid(row=0, column=0)
+        for lineIndex in range(LOG_LINES_PER_JOB):
+            textArea.insert(tk.END, f"winget output line {lineIndex}\n")
+    return scrollableFrame.canvas.yview
+
+def runCase(rootElement, buildList, numEntries : int) -> dict:
+    placeholderImage = tk.PhotoImage(width=32, height=32)
+    getImage = lambda iconName: placeholderImage
+    caseFrame = ttk.Frame(rootElement)
+    caseFrame.pack(fill=tk.BOTH, expand=True)
+
+    tracemalloc.start()
+    startTime = time.perf_counter()
+    yview = buildList(caseFrame, numEntries, getImage)
+    rootElement.update_idletasks()
+    buildTime = time.perf_counter() - startTime
+    _, peakMemory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    numWidgets = countWidgets(caseFrame)
+
+    startTime = time.perf_counter()
+    for scrollStep in range(NUM_SCROLL_STEPS):
+        yview("moveto", scrollStep / NUM_SCROLL_STEPS)
+        rootElement.update_idletasks()
+    scrollTime = (time.perf_counter() - startTime) / NUM_SCROLL_STEPS
+
+    caseFrame.destroy()
+    return {"build" : buildTime, "widgets" : numWidgets, "memory" : peakMemory, "scroll" : scrollTime}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000], help="number of entries per list")
+    parser.add_argument("--eager", action="store_true", help="also measure one widget row per entry")
+    arguments = parser.parse_args()
+
+    cases = [("virtual program list", buildVirtualPrograms), ("virtual job log list", buildVirtualLogs)]
+    if arguments.eager:
+        cases += [("eager program list", buildEagerPrograms), ("eager job log list", buildEagerLogs)]
+
+    rootElement = ttkbootstrap.Window()
+    rootElement.geometry("1920x600")
+
+    print(f"{'case':<24}{'entries':>8}{'build ms':>11}{'widgets':>9}{'peak KiB':>10}{'scroll ms':>11}")
+    for caseName, buildList in cases:
+        for numEntries in arguments.sizes:
+            result = runCase(rootElement, buildList, numEntries)
+            print(f"{caseName:<24}{numEntries:>8}{result['build'] * 1000:>11.1f}{result['widgets']:>9}"
+                  f"{result['memory'] / 1024:>10.0f}{result['scroll'] * 1000:>11.2f}")
+
+    rootElement.destroy()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+    Build step that packs every icon in icons/ into a single pre-resized PNG
+    atlas (icons/iconAtlas.png) with an index file (icons/iconAtlas.json).
+    The app loads that atlas with a single decode instead of decoding every icon.
+
+        python tools/buildIconAtlas.py
+"""
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from iconAtlas import ATLAS_IMAGE_FILE_NAME, ATLAS_INDEX_FILE_NAME, ICON_DIRECTORY, buildIconAtlas
+
+def main() -> int:
+    iconDirectory = os.path.join(REPO_ROOT, ICON_DIRECTORY)
+    atlasIndex = buildIconAtlas(
+        iconDirectory,
+        os.path.join(iconDirectory, ATLAS_IMAGE_FILE_NAME),
+        os.path.join(iconDirectory, ATLAS_INDEX_FILE_NAME)
+    )
+    print(f"Packed {len(atlasIndex['icons'])} icons into {os.path.join(ICON_DIRECTORY, ATLAS_IMAGE_FILE_NAME)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+    Table driven check of the failure classification and the retry backoff.
+    Every failure category is classified once from a winget exit code, once from an
+    installer exit code or the output alone, and the retry delays of the engine are
+    checked against the retry policy of each category, including the upper bound.
+
+        python tools/checkFailureClassifier.py [--samples 200]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from appPaths import DATA_DIRECTORY_ENVIRONMENT_VARIABLE
+from jobFailures import FailureCategory, FailureClassifier, DEFAULT_RETRY_POLICIES
+from wingetJobs import OperationType, JobPhase, WingetQueueMessage
+
+# (description, exit code, output lines, expected category)
+CLASSIFICATION_CASES = [
+    ("winget download failed", 0x8A150008, [], FailureCategory.NETWORK),
+    ("negative winget HRESULT", 0x8A150008 - 2 ** 32, [], FailureCategory.NETWORK),
+    ("connection timeout", 0x80072EE2, [], FailureCategory.NETWORK),
+    ("network error in the output", 1, ["Downloading installer failed: the network connection timed out"], FailureCategory.NETWORK),
+    ("hash mismatch", 0x8A150011, [], FailureCategory.HASH_MISMATCH),
+    ("hash mismatch in the output", 1, ["Installer hash does not match; this cannot be overridden"], FailureCategory.HASH_MISMATCH),
+    ("package in use", 0x8A150101, [], FailureCategory.INSTALLER_BUSY),
+    ("msiexec already running", 1618, [], FailureCategory.INSTALLER_BUSY),
+    ("installer busy in the output", 1, ["Another installation is already in progress"], FailureCategory.INSTALLER_BUSY),
+    ("reboot required by the installer", 3010, [], FailureCategory.REBOOT_REQUIRED),
+    ("reboot initiated by the installer", 1641, [], FailureCategory.REBOOT_REQUIRED),
+    ("reboot required by winget", 0x8A150109, [], FailureCategory.REBOOT_REQUIRED),
+    ("reboot required in the output", 1, ["Restart your PC to finish installation of your package."], FailureCategory.REBOOT_REQUIRED),
+    ("no applicable upgrade", 0x8A15002B, [], FailureCategory.ALREADY_INSTALLED),
+    ("package already installed", 0x8A150061, [], FailureCategory.ALREADY_INSTALLED),
+    ("already installed in the output", 1, ["Found an existing package already installed."], FailureCategory.ALREADY_INSTALLED),
+    ("unknown exit code", 1, ["Installer failed with exit code: 1"], FailureCategory.UNKNOWN),
+    ("unknown exit code without output", 0x8A150001, [], FailureCategory.UNKNOWN),
+    ("the exit code wins over the output", 0x8A150011, ["Downloading installer failed"], FailureCategory.HASH_MISMATCH),
+    ("the first matching line wins", 1, ["The network connection timed out", "Another installation is in progress"], FailureCategory.NETWORK),
+    ("shared exit code of an import run", None, ["Package is already installed"], FailureCategory.ALREADY_INSTALLED),
+    ("shared exit code without output", None, [], FailureCategory.UNKNOWN),
+]
+
+def classify(returncode, lines : list) -> FailureCategory:
+    failureClassifier = FailureClassifier()
+    for line in lines:
+        failureClassifier.feed(line)
+    return failureClassifier.classify(returncode)
+
+def checkRetryDelays(engine, category : FailureCategory, numSamples : int) -> bool:
+    """
+        Retries a failed job of the category until the engine gives up, the number of retries
+        and every delay must follow the retry policy of the category
+    """
+    retryPolicy = DEFAULT_RETRY_POLICIES[category]
+    for _ in range(numSamples):
+        job = WingetQueueMessage("Program", "Fake.Program", OperationType.INSTALL)
+        job.failureCategory = category
+        retryDelays = list()
+        while True:
+            retryDelay = engine.getRetryDelay(job, JobPhase.INSTALL)
+            if retryDelay is None:
+                break
+            retryDelays.append(retryDelay)
+            if len(retryDelays) > retryPolicy.maxRetries:
+                return False
+
+        if len(retryDelays) != retryPolicy.maxRetries:
+            return False
+        for retry, retryDelay in enumerate(retryDelays, start=1):
+            fullDelay = min(retryPolicy.maxDelaySeconds, retryPolicy.baseDelaySeconds * 2 ** (retry - 1))
+            if not fullDelay * 0.5 <= retryDelay <= fullDelay:
+                return False
+    return True
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=200, help="number of retried jobs per failure category")
+    arguments = parser.parse_args()
+
+    checks = {f"classifies {description}" : classify(returncode, lines) == category for description, returncode, lines, category in CLASSIFICATION_CASES}
+    checks["every failure category is covered"] = {case[3] for case in CLASSIFICATION_CASES} == set(FailureCategory)
+
+    dataDirectory = tempfile.mkdtemp(prefix="simpleDownloader-checkFailureClassifier-")
+    os.environ[DATA_DIRECTORY_ENVIRONMENT_VARIABLE] = dataDirectory
+    from engine import WingetEngine
+    engine = WingetEngine(lambda event: None)
+    try:
+        for category in FailureCategory:
+            checks[f"retries of {category.value} follow the retry policy"] = checkRetryDelays(engine, category, arguments.samples)
+
+        busyPolicy = DEFAULT_RETRY_POLICIES[FailureCategory.INSTALLER_BUSY]
+        checks["the backoff never exceeds the maximum delay"] = all(
+            busyPolicy.getDelay(retry) <= busyPolicy.maxDelaySeconds for retry in range(1, 64) for _ in range(arguments.samples // 20 + 1)
+        )
+        checks["the backoff is jittered"] = len({round(busyPolicy.getDelay(1), 6) for _ in range(arguments.samples)}) > 1
+
+        engine.retryFailedJobs = False
+        networkJob = WingetQueueMessage("Program", "Fake.Program", OperationType.INSTALL)
+        networkJob.failureCategory = FailureCategory.NETWORK
+        checks["nothing is retried with retries turned off"] = engine.getRetryDelay(networkJob, JobPhase.INSTALL) is None
+    finally:
+        engine.stop()
+        shutil.rmtree(dataDirectory, ignore_errors=True)
+
+    for description, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {description}")
+
+    return 0 if all(checks.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
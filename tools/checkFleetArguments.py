@@ -0,0 +1,80 @@
+"""
+    Check that the command line a fleet passes to every target carries all options of the run.
+    The arguments built from profiles with every combination of operation and options are parsed
+    again with the argument parser of the headless mode and compared with the profile, and a dry
+    run of a fleet from the command line must print the options it was given for every target.
+
+        python tools/checkFleetArguments.py
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from cli import parseArguments, runHeadless
+from engine import EngineOptions
+from fleet import buildHeadlessArguments, HEADLESS_PROFILE_OPTIONS
+from profiles import Profile
+from wingetJobs import OperationType
+
+PROFILES = [
+    Profile("defaults", ["Git.Git"]),
+    Profile("uninstall", ["Git.Git", "7zip.7zip"], OperationType.UNINSTALL, EngineOptions(skipInstalled=False, retryFailedJobs=False).toDict()),
+    Profile("upgrade", ["Git.Git"], OperationType.UPGRADE, dict(EngineOptions(numDownloadWorkers=2).toDict(), verbose=True)),
+    Profile("upgrade all", [], OperationType.UPGRADE, dict(EngineOptions().toDict(), refreshUpgrades=True)),
+    Profile("cached import", ["Git.Git", "Mozilla.Firefox"], OperationType.INSTALL, dict(
+        EngineOptions(useImport=True, usePackageCache=True).toDict(),
+        cacheDirectory="C:/Users/Public/SimpleDownloader cache", mirror="http://mirror.example.com/cache", verbose=True
+    )),
+]
+
+def roundTrips(profile : Profile, numDownloadWorkers : int) -> bool:
+    args = parseArguments(buildHeadlessArguments(profile, numDownloadWorkers))
+    defaultArgs = parseArguments([])
+    options = EngineOptions.fromDict(profile.options)
+    operation = OperationType.UNINSTALL if args.uninstall else OperationType.UPGRADE if args.upgrade or args.upgradeAll else OperationType.INSTALL
+    return (
+        args.wingetIds == profile.wingetIds
+        and operation == profile.operation
+        and args.upgradeAll == (profile.operation == OperationType.UPGRADE and not profile.wingetIds)
+        and args.workers == numDownloadWorkers
+        and args.useImport == options.useImport
+        and args.skipInstalled == options.skipInstalled
+        and args.usePackageCache == options.usePackageCache
+        and args.retryFailedJobs == options.retryFailedJobs
+        and all(getattr(args, key) == profile.options.get(key, getattr(defaultArgs, key)) for key in HEADLESS_PROFILE_OPTIONS)
+    )
+
+def dryRunFleet(arguments : list) -> str:
+    fleetFile, fleetPath = tempfile.mkstemp(prefix="simpleDownloader-fleet-", suffix=".json")
+    with os.fdopen(fleetFile, "w", encoding="utf-8") as fleetFile:
+        json.dump({"targets" : ["pc-1", {"name" : "pc-2", "workers" : 2}]}, fleetFile)
+    try:
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            runHeadless(["--fleet", fleetPath, "--dry-run", *arguments])
+        return stdout.getvalue()
+    finally:
+        os.remove(fleetPath)
+
+def main() -> int:
+    checks = {f"arguments of the {profile.name} profile round-trip" : roundTrips(profile, 3) for profile in PROFILES}
+
+    dryRunOutput = dryRunFleet(["--mirror", "//server/cache", "--cache-dir", "D:/cache", "--verbose", "--refresh-upgrades", "--upgrade-all"])
+    targetArguments = [parseArguments(line.split(": ", 1)[1].split()) for line in dryRunOutput.splitlines()]
+    checks["the dry run prints every target"] = len(targetArguments) == 2
+    checks["the dry run forwards the cache options"] = all(args.mirror == "//server/cache" and args.cacheDirectory == "D:/cache" and args.usePackageCache for args in targetArguments)
+    checks["the dry run forwards the switches"] = all(args.verbose and args.refreshUpgrades and args.upgradeAll for args in targetArguments)
+
+    for description, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {description}")
+
+    return 0 if all(checks.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+    Replay check of the job journal.
+    Writes the journal of a batch that is interrupted part way, with a record cut off by the crash,
+    and checks that exactly the jobs that never finished are loaded back with the options of the
+    batch. Then resumes that batch in headless mode on the fake winget and checks that only the
+    unfinished jobs run and that the journal is deleted once the batch finished.
+
+        python tools/checkJobJournal.py
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from appPaths import DATA_DIRECTORY_ENVIRONMENT_VARIABLE
+from jobJournal import JobJournal, JOB_JOURNAL_FILE_NAME, loadUnfinishedBatch
+from wingetJobs import OperationType, JobPhase, WingetQueueMessage
+
+FAKE_WINGET_DIRECTORY = os.path.join(REPO_ROOT, "tools", "fakeWinget")
+HEADLESS_TIMEOUT_SECONDS = 120
+BATCH_OPTIONS = {"numDownloadWorkers" : 2, "skipInstalled" : False, "retryFailedJobs" : False}
+
+def writeInterruptedJournal(journalPath : str) -> list:
+    """
+        Journal of a batch that was interrupted, returns the jobs that did not finish
+    """
+    jobs = [
+        WingetQueueMessage("Finished", "Fake.Finished", OperationType.INSTALL),
+        WingetQueueMessage("Started", "Fake.Started", OperationType.INSTALL),
+        WingetQueueMessage("Skipped", "Fake.Skipped", OperationType.UNINSTALL),
+        WingetQueueMessage("Failed", "Fake.Failed", OperationType.UPGRADE),
+        WingetQueueMessage("Planned", "Fake.Planned", OperationType.UPGRADE),
+        WingetQueueMessage("Cut off", "Fake.CutOff", OperationType.INSTALL),
+    ]
+    journal = JobJournal(journalPath)
+    journal.startBatch(jobs, BATCH_OPTIONS)
+    journal.recordStarted(jobs[0], JobPhase.DOWNLOAD)
+    journal.recordStarted(jobs[0], JobPhase.INSTALL)
+    journal.recordFinished(jobs[0], True)
+    journal.recordStarted(jobs[1], JobPhase.DOWNLOAD)
+    journal.recordFinished(jobs[2], True, skipped=True)
+    journal.recordStarted(jobs[3], JobPhase.INSTALL)
+    # a failed job is finished, it is not run again
+    journal.recordFinished(jobs[3], False)
+    journal.flush()
+
+    # the process dies while writing the finished record of the last job
+    with open(journalPath, "a", encoding="utf-8") as journalFile:
+        journalFile.write(json.dumps({"event" : "finished", "key" : "5", "succeeded" : True})[:20])
+    return [jobs[1], jobs[4], jobs[5]]
+
+def describeJobs(jobs : list) -> list:
+    return [(job.programName, job.wingetId, job.operation) for job in jobs]
+
+def main() -> int:
+    workDirectory = tempfile.mkdtemp(prefix="simpleDownloader-checkJobJournal-")
+    dataDirectory = os.path.join(workDirectory, "data")
+    os.makedirs(dataDirectory)
+    journalPath = os.path.join(dataDirectory, JOB_JOURNAL_FILE_NAME)
+
+    environment = dict(os.environ)
+    environment["PATH"] = FAKE_WINGET_DIRECTORY + os.pathsep + environment.get("PATH", "")
+    environment[DATA_DIRECTORY_ENVIRONMENT_VARIABLE] = dataDirectory
+    environment["FAKE_WINGET_DURATION"] = "0"
+
+    checks = dict()
+    try:
+        checks["a missing journal has nothing to resume"] = loadUnfinishedBatch(journalPath) is None
+
+        unfinishedJobs = writeInterruptedJournal(journalPath)
+        unfinishedBatch = loadUnfinishedBatch(journalPath)
+        checks["exactly the unfinished jobs are loaded"] = unfinishedBatch is not None and describeJobs(unfinishedBatch.jobs) == describeJobs(unfinishedJobs)
+        checks["the options of the batch are loaded"] = unfinishedBatch is not None and unfinishedBatch.options == BATCH_OPTIONS
+
+        completedProcess = subprocess.run([sys.executable, os.path.join(REPO_ROOT, "main.py"), "--headless", "--resume"], cwd=REPO_ROOT,
+                                          env=environment, timeout=HEADLESS_TIMEOUT_SECONDS, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        summary = json.loads(completedProcess.stdout)
+        checks["the resumed batch runs only the unfinished jobs"] = sorted(job["id"] for job in summary["jobs"]) == sorted(job.wingetId for job in unfinishedJobs)
+        checks["the resumed batch succeeds"] = completedProcess.returncode == 0 and summary["succeeded"] == len(unfinishedJobs)
+        checks["the journal is deleted once the batch finished"] = not os.path.exists(journalPath)
+        checks["a finished batch has nothing to resume"] = loadUnfinishedBatch(journalPath) is None
+    finally:
+        shutil.rmtree(workDirectory, ignore_errors=True)
+
+    for description, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {description}")
+
+    return 0 if all(checks.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
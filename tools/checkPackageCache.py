@@ -0,0 +1,167 @@
+"""
+    End to end check of the package cache using the fake winget and a local http.server mirror.
+    Runs headless batches against a cold cache, a warm cache, an http mirror, a directory
+    mirror and a mirror with a corrupted installer, checks eviction under a size limit, and
+    stores and fetches the same installer from many threads at once.
+
+        python tools/checkPackageCache.py [--packages 6] [--threads 16]
+"""
+import argparse
+import functools
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from appPaths import DATA_DIRECTORY_ENVIRONMENT_VARIABLE
+from packageCache import PackageCache, buildWingetShowCommand, parseWingetShow, PACKAGE_CACHE_MAX_MEGABYTES_ENVIRONMENT_VARIABLE
+from processRunner import StreamingProcess
+
+FAKE_WINGET_DIRECTORY = os.path.join(REPO_ROOT, "tools", "fakeWinget")
+FAKE_WINGET_EXECUTABLE = [sys.executable, os.path.join(FAKE_WINGET_DIRECTORY, "winget")]
+INSTALLER_BYTES = 400 * 1024
+HEADLESS_TIMEOUT_SECONDS = 120
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args) -> None:
+        pass
+
+def startMirrorServer(directory : str) -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def runHeadless(wingetIds : list, environment : dict, *arguments : str) -> dict:
+    summaryFile, summaryPath = tempfile.mkstemp(prefix="simpleDownloader-summary-", suffix=".json")
+    os.close(summaryFile)
+    try:
+        subprocess.run([sys.executable, os.path.join(REPO_ROOT, "main.py"), "--headless", "--no-skip", "--workers", "8",
+                        "--summary", summaryPath, *arguments, *wingetIds],
+                       cwd=REPO_ROOT, env=environment, timeout=HEADLESS_TIMEOUT_SECONDS, stderr=subprocess.DEVNULL)
+        with open(summaryPath, encoding="utf-8") as summaryFile:
+            return json.load(summaryFile)
+    finally:
+        os.remove(summaryPath)
+
+def findTemporaryFiles(directory : str) -> list:
+    return [os.path.join(root, fileName) for root, _, fileNames in os.walk(directory) for fileName in fileNames if fileName.endswith(".tmp")]
+
+def checkConcurrentStores(workDirectory : str, mirrorDirectory : str, mirrorUrl : str, numThreads : int) -> dict:
+    """
+        Many threads store the same downloaded installer into one cache, and fetch the
+        same installer from the http mirror into another one, like parallel download workers do
+    """
+    wingetId = "Fake.Concurrent"
+    packageInfo = parseWingetShow(wingetId, StreamingProcess(buildWingetShowCommand(wingetId, FAKE_WINGET_EXECUTABLE), encoding="utf-8").lines())
+    downloadDirectory = os.path.join(workDirectory, "download")
+    os.makedirs(downloadDirectory)
+    subprocess.run([*FAKE_WINGET_EXECUTABLE, "download", "-e", "--id", wingetId, "--download-directory", downloadDirectory], check=True, stdout=subprocess.DEVNULL)
+    installerPath = os.path.join(downloadDirectory, f"{wingetId}.exe")
+
+    PackageCache(mirrorDirectory).store(packageInfo, installerPath)
+    storeCache = PackageCache(os.path.join(workDirectory, "storeCache"))
+    fetchCache = PackageCache(os.path.join(workDirectory, "fetchCache"), mirror=mirrorUrl)
+
+    storedInstallers = list()
+    fetchedInstallers = list()
+    barrier = threading.Barrier(numThreads)
+
+    def storeAndFetch() -> None:
+        barrier.wait()
+        # an installer that could not be stored counts as a broken one
+        try:
+            storedInstallers.append(storeCache.store(packageInfo, installerPath))
+        except OSError:
+            storedInstallers.append(None)
+        fetchedInstallers.append(fetchCache.fetchFromMirror(packageInfo))
+
+    threads = [threading.Thread(target=storeAndFetch) for _ in range(numThreads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def isIntact(installer) -> bool:
+        if installer is None:
+            return False
+        with open(installer.installerPath, "rb") as installerFile:
+            return hashlib.sha256(installerFile.read()).hexdigest() == packageInfo.sha256
+
+    return {
+        "stored installers are intact" : len(storedInstallers) == numThreads and all(isIntact(installer) for installer in storedInstallers),
+        "fetched installers are intact" : len(fetchedInstallers) == numThreads and all(isIntact(installer) for installer in fetchedInstallers),
+        "no temporary files are left" : not findTemporaryFiles(storeCache.cacheDirectory) and not findTemporaryFiles(fetchCache.cacheDirectory),
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packages", type=int, default=6, help="number of packages per batch")
+    parser.add_argument("--threads", type=int, default=16, help="number of threads storing the same installer")
+    arguments = parser.parse_args()
+
+    workDirectory = tempfile.mkdtemp(prefix="simpleDownloader-checkPackageCache-")
+    cacheDirectory = os.path.join(workDirectory, "cache")
+    corruptedMirror = os.path.join(workDirectory, "corruptedMirror")
+    wingetIds = [f"Fake.Package{packageIndex}" for packageIndex in range(arguments.packages)]
+
+    environment = dict(os.environ)
+    environment["PATH"] = FAKE_WINGET_DIRECTORY + os.pathsep + environment.get("PATH", "")
+    environment[DATA_DIRECTORY_ENVIRONMENT_VARIABLE] = os.path.join(workDirectory, "data")
+    environment["FAKE_WINGET_DURATION"] = "0"
+    environment["FAKE_WINGET_INSTALLER_BYTES"] = str(INSTALLER_BYTES)
+    # the installers downloaded by the concurrency check must have the size (and hash) winget show reports
+    os.environ.update({key : environment[key] for key in ("FAKE_WINGET_DURATION", "FAKE_WINGET_INSTALLER_BYTES")})
+
+    mirrorServer = startMirrorServer(cacheDirectory)
+    mirrorUrl = f"http://127.0.0.1:{mirrorServer.server_address[1]}"
+
+    try:
+        coldRun = runHeadless(wingetIds, environment, "--cache-dir", cacheDirectory)
+        warmRun = runHeadless(wingetIds, environment, "--cache-dir", cacheDirectory)
+        httpMirrorRun = runHeadless(wingetIds, environment, "--cache-dir", os.path.join(workDirectory, "httpMirrorCache"), "--mirror", mirrorUrl)
+        directoryMirrorRun = runHeadless(wingetIds, environment, "--cache-dir", os.path.join(workDirectory, "directoryMirrorCache"), "--mirror", cacheDirectory)
+
+        # one installer of the mirror is replaced, it must not be used
+        shutil.copytree(cacheDirectory, corruptedMirror)
+        corruptedBlob = next(iter(PackageCache(corruptedMirror).loadIndex().values()))["blob"]
+        with open(os.path.join(corruptedMirror, *corruptedBlob.split("/")), "wb") as blobFile:
+            blobFile.write(b"corrupted")
+        corruptedMirrorRun = runHeadless(wingetIds, environment, "--cache-dir", os.path.join(workDirectory, "corruptedMirrorCache"), "--mirror", corruptedMirror)
+
+        evictionEnvironment = dict(environment, **{PACKAGE_CACHE_MAX_MEGABYTES_ENVIRONMENT_VARIABLE : "1"})
+        evictionCacheDirectory = os.path.join(workDirectory, "evictionCache")
+        evictionRun = runHeadless(wingetIds, evictionEnvironment, "--cache-dir", evictionCacheDirectory)
+
+        concurrentChecks = checkConcurrentStores(workDirectory, cacheDirectory, mirrorUrl, arguments.threads)
+    finally:
+        mirrorServer.shutdown()
+        shutil.rmtree(workDirectory, ignore_errors=True)
+
+    numPackages = len(wingetIds)
+    def allSucceeded(summary : dict) -> bool:
+        return summary["succeeded"] == numPackages
+
+    checks = {
+        "cold cache misses every package" : allSucceeded(coldRun) and coldRun["packageCache"]["misses"] == numPackages,
+        "warm cache hits every package" : allSucceeded(warmRun) and warmRun["packageCache"]["hits"] == numPackages,
+        "http mirror serves every package" : allSucceeded(httpMirrorRun) and httpMirrorRun["packageCache"]["mirrorHits"] == numPackages,
+        "directory mirror serves every package" : allSucceeded(directoryMirrorRun) and directoryMirrorRun["packageCache"]["mirrorHits"] == numPackages,
+        "corrupted mirror installer is not used" : allSucceeded(corruptedMirrorRun) and corruptedMirrorRun["packageCache"]["mirrorHits"] == numPackages - 1,
+        "size limit evicts old installers" : allSucceeded(evictionRun) and evictionRun["packageCache"]["evictions"] > 0,
+        **concurrentChecks,
+    }
+    for description, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {description}")
+
+    return 0 if all(checks.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+    Stress check for processRunner.StreamingProcess using the fake winget.
+    Floods stderr and stdout with megabytes of output plus carriage return
+    progress redraws and verifies the runner neither deadlocks nor drops the tail,
+    and that the progress parser fed from the reader thread keeps up.
+
+        python tools/checkProcessRunner.py [--megabytes 8]
+"""
+import argparse
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from jobProgress import ProgressStage, WingetProgressParser
+from processRunner import StreamingProcess
+
+FAKE_WINGET_PATH = os.path.join(REPO_ROOT, "tools", "fakeWinget", "winget")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=8, help="bulk output per pipe")
+    arguments = parser.parse_args()
+
+    numBytes = int(arguments.megabytes * 1024 * 1024)
+    environment = {
+        "FAKE_WINGET_DURATION": "0",
+        "FAKE_WINGET_STDOUT_BYTES": str(numBytes),
+        "FAKE_WINGET_STDERR_BYTES": str(numBytes),
+        "FAKE_WINGET_PROGRESS_REDRAWS": "10000",
+    }
+    os.environ.update(environment)
+
+    progressParser = WingetProgressParser(ProgressStage.DOWNLOAD)
+    downloadFractions = list()
+
+    def onStdoutText(text : str) -> None:
+        if progressParser.feed(text) and progressParser.stage == ProgressStage.DOWNLOAD:
+            downloadFractions.append(progressParser.fractions[ProgressStage.DOWNLOAD])
+
+    streamingProcess = StreamingProcess([sys.executable, FAKE_WINGET_PATH, "install", "-e", "--id", "Fake.Package"], onStdoutText=onStdoutText)
+
+    startTime = time.perf_counter()
+    numLines = 0
+    lastLine = ""
+    for line in streamingProcess.lines():
+        numLines += 1
+        lastLine = line
+    elapsedTime = time.perf_counter() - startTime
+
+    print(f"{numLines} lines, {streamingProcess.numOutputBytes / 1024 / 1024:.1f} MB in {elapsedTime:.2f}s "
+          f"({streamingProcess.numOutputBytes / 1024 / 1024 / elapsedTime:.1f} MB/s), exit code {streamingProcess.returncode}")
+
+    checks = {
+        "process exited successfully": streamingProcess.returncode == 0,
+        "both pipes were drained": streamingProcess.numOutputBytes >= 2 * numBytes * 0.99,
+        "tail was flushed": lastLine == "Successfully installed",
+        "download progress was parsed": len(downloadFractions) > 1 and progressParser.fractions[ProgressStage.DOWNLOAD] == 1.0,
+        "install stage was parsed": progressParser.stage == ProgressStage.INSTALL and progressParser.fractions[ProgressStage.INSTALL] == 1.0,
+    }
+    for description, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {description}")
+
+    return 0 if all(checks.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
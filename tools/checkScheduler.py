@@ -0,0 +1,147 @@
+"""
+    Check of the batch scheduler on a small catalog with prerequisites and an exclusive group.
+    Verifies that prerequisites are added once and ordered before the programs that need them,
+    that programs of an exclusive group are chained, that the simulated makespan matches hand
+    computed values, that catalogs with a dependency cycle are rejected, and that the worker
+    pool runs the schedule in the same order as the simulation.
+
+        python tools/checkScheduler.py
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from catalog import CatalogError, ProgramCatalog, loadProgramCatalog
+from scheduler import addPrerequisiteJobs, buildSchedule
+from wingetJobs import OperationType, WingetQueueMessage, WingetWorkerPool
+
+# Lib needs Runtime, App1 needs Runtime, App2 needs Runtime and Lib, Office1 and Office2 share a group
+CATALOG_DATA = {
+    "sections" : [{
+        "name" : "Test",
+        "programs" : [
+            {"name" : "Runtime", "id" : "Test.Runtime", "expectedDurationSeconds" : 20},
+            {"name" : "Lib", "id" : "Test.Lib", "dependsOn" : ["Test.Runtime"], "expectedDurationSeconds" : 20},
+            {"name" : "App1", "id" : "Test.App1", "dependsOn" : ["Test.Runtime"], "expectedDurationSeconds" : 60},
+            {"name" : "App2", "id" : "Test.App2", "dependsOn" : ["Test.Runtime", "Test.Lib"], "expectedDurationSeconds" : 60},
+            {"name" : "Office1", "id" : "Test.Office1", "exclusiveGroup" : "office", "expectedDurationSeconds" : 40},
+            {"name" : "Office2", "id" : "Test.Office2", "exclusiveGroup" : "office", "expectedDurationSeconds" : 80},
+            {"name" : "Long", "id" : "Test.Long", "expectedDurationSeconds" : 300},
+        ],
+    }],
+}
+SELECTED_IDS = ["Test.App1", "Test.App2", "Test.Office1", "Test.Office2", "Test.Long"]
+
+def createJobs(wingetIds : list, operation : OperationType = OperationType.INSTALL) -> list:
+    return [WingetQueueMessage(wingetId.split(".")[-1], wingetId, operation) for wingetId in wingetIds]
+
+def isCycleRejected(programs : list) -> bool:
+    catalogDirectory = tempfile.mkdtemp(prefix="simpleDownloader-catalog-")
+    try:
+        catalogPath = os.path.join(catalogDirectory, "catalog.json")
+        with open(catalogPath, "w", encoding="utf-8") as catalogFile:
+            json.dump({"sections" : [{"name" : "Cycle", "programs" : programs}]}, catalogFile)
+        loadProgramCatalog([catalogPath])
+    except CatalogError:
+        return True
+    finally:
+        shutil.rmtree(catalogDirectory, ignore_errors=True)
+    return False
+
+def runOnWorkerPool(jobs : list, numDownloadWorkers : int) -> list:
+    """
+        Runs the jobs of a schedule on the worker pool with phases that only take a moment,
+        returns (event, phase, job) in the order they happened
+    """
+    events = list()
+    eventsLock = threading.Lock()
+    allJobsFinished = threading.Event()
+
+    def handlePhase(job : WingetQueueMessage, phase) -> bool:
+        with eventsLock:
+            events.append(("start", phase.value, job))
+        time.sleep(0.02)
+        with eventsLock:
+            events.append(("end", phase.value, job))
+        return True
+
+    pool = WingetWorkerPool(handlePhase, lambda job, handledSuccessfully: None, allJobsFinished.set, numDownloadWorkers)
+    pool.submitBatch(jobs)
+    allJobsFinished.wait(30)
+    pool.stop()
+    return events
+
+def main() -> int:
+    programCatalog = ProgramCatalog.fromCatalogData([CATALOG_DATA])
+    jobs = addPrerequisiteJobs(createJobs(SELECTED_IDS), programCatalog)
+    schedule = buildSchedule(jobs, programCatalog, numDownloadWorkers=2)
+    scheduledJobs = {scheduledJob.job.wingetId : scheduledJob for scheduledJob in schedule.scheduledJobs}
+    order = [job.wingetId for job in schedule.getJobs()]
+    office1, office2 = scheduledJobs["Test.Office1"], scheduledJobs["Test.Office2"]
+
+    checks = dict()
+    checks["prerequisites are added once"] = sorted(job.wingetId for job in jobs) == sorted(SELECTED_IDS + ["Test.Runtime", "Test.Lib"])
+    checks["prerequisites are linked as dependencies"] = (
+        [job.wingetId for job in scheduledJobs["Test.App2"].job.dependencies] == ["Test.Runtime", "Test.Lib"]
+        and [job.wingetId for job in scheduledJobs["Test.Lib"].job.dependencies] == ["Test.Runtime"]
+    )
+    checks["prerequisites are ordered first"] = order.index("Test.Runtime") < order.index("Test.Lib") < order.index("Test.App2")
+    checks["the longest chain is started first"] = order[0] == "Test.Long"
+    checks["installs wait for their prerequisites"] = all(
+        scheduledJobs[dependency.wingetId].installEnd <= scheduledJob.installStart
+        for scheduledJob in schedule.scheduledJobs for dependency in scheduledJob.job.dependencies
+    )
+    installOrder = sorted(schedule.scheduledJobs, key=lambda scheduledJob: scheduledJob.installStart)
+    checks["installs never overlap"] = all(first.installEnd <= second.installStart for first, second in zip(installOrder, installOrder[1:]))
+    # the longer job of the group goes first
+    checks["exclusive group jobs are chained"] = office1.job.startAfter == [office2.job] and not office2.job.startAfter
+    checks["exclusive group jobs never overlap"] = office2.installEnd <= office1.downloadStart
+
+    # two independent 60 s jobs: both download from 0 to 30 s, then install one after the other
+    twoJobs = buildSchedule(createJobs(["Test.A", "Test.B"]), None, numDownloadWorkers=2, getExpectedDuration=lambda job: 60.0)
+    # one worker: the second download overlaps the first install
+    twoJobsSerial = buildSchedule(createJobs(["Test.A", "Test.B"]), None, numDownloadWorkers=1, getExpectedDuration=lambda job: 60.0)
+    # uninstalls download nothing
+    uninstalls = buildSchedule(createJobs(["Test.A", "Test.B"], OperationType.UNINSTALL), None, getExpectedDuration=lambda job: 60.0)
+    checks["makespan of parallel downloads"] = twoJobs.makespanSeconds == 90.0
+    checks["makespan of a single download worker"] = twoJobsSerial.makespanSeconds == 90.0
+    checks["makespan of uninstalls"] = uninstalls.makespanSeconds == 120.0
+    checks["makespan of an empty batch"] = buildSchedule([], None).makespanSeconds == 0.0
+    checks["more download workers never slow the batch down"] = all(
+        buildSchedule(addPrerequisiteJobs(createJobs(SELECTED_IDS), programCatalog), programCatalog, numDownloadWorkers).makespanSeconds
+        <= buildSchedule(addPrerequisiteJobs(createJobs(SELECTED_IDS), programCatalog), programCatalog, numDownloadWorkers - 1).makespanSeconds
+        for numDownloadWorkers in range(2, 6)
+    )
+
+    checks["a dependency cycle is rejected"] = isCycleRejected([
+        {"name" : "A", "id" : "Test.A", "dependsOn" : ["Test.B"]},
+        {"name" : "B", "id" : "Test.B", "dependsOn" : ["Test.C"]},
+        {"name" : "C", "id" : "Test.C", "dependsOn" : ["Test.A"]},
+    ])
+    checks["a program depending on itself is rejected"] = isCycleRejected([{"name" : "A", "id" : "Test.A", "dependsOn" : ["Test.A"]}])
+    checks["an acyclic catalog is accepted"] = not isCycleRejected(CATALOG_DATA["sections"][0]["programs"])
+
+    poolEvents = runOnWorkerPool(schedule.getJobs(), schedule.numDownloadWorkers)
+    def getEventIndex(event : str, phase : str, wingetId : str) -> int:
+        return next(index for index, (poolEvent, poolPhase, job) in enumerate(poolEvents) if (poolEvent, poolPhase, job.wingetId) == (event, phase, wingetId))
+    checks["the worker pool runs every job"] = sum(1 for event, phase, _ in poolEvents if (event, phase) == ("end", "install")) == len(jobs)
+    checks["the worker pool installs prerequisites first"] = all(
+        getEventIndex("end", "install", dependency.wingetId) < getEventIndex("start", "install", job.wingetId)
+        for job in jobs for dependency in job.dependencies
+    )
+    checks["the worker pool keeps exclusive group jobs apart"] = getEventIndex("end", "install", "Test.Office2") < getEventIndex("start", "download", "Test.Office1")
+
+    for description, passed in checks.items():
+        print(f"{'ok  ' if passed else 'FAIL'} {description}")
+
+    return 0 if all(checks.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
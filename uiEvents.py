@@ -0,0 +1,138 @@
+import time
+from queue import SimpleQueue, Empty
+from typing import Callable, List, Optional
+
+from wingetJobs import JobPhase, WingetQueueMessage
+
+DEFAULT_TICK_MILLISECONDS = 50
+MAX_EVENTS_PER_TICK = 5000
+
+class JobStartedEvent:
+    def __init__(self, job : WingetQueueMessage, phase : JobPhase, command : List[str]) -> None:
+        self.job = job
+        self.phase = phase
+        self.command = command
+
+class JobOutputEvent:
+    def __init__(self, job : WingetQueueMessage, text : str) -> None:
+        self.job = job
+        self.text = text
+
+class JobFinishedEvent:
+    def __init__(self, job : WingetQueueMessage, handledSuccessfully : bool) -> None:
+        self.job = job
+        self.handledSuccessfully = handledSuccessfully
+
+class AllJobsFinishedEvent:
+    pass
+
+class BatchProgressEvent:
+    """
+        The parsed progress of a job changed, the progress itself is read from the engine
+    """
+    pass
+
+class InstalledStateRefreshedEvent:
+    def __init__(self, installedStateIndex) -> None:
+        self.installedStateIndex = installedStateIndex
+
+class IconAtlasPreparedEvent:
+    """
+        The icon atlas was found or built in the background and can be loaded
+    """
+    pass
+
+class UpgradeJobsListedEvent:
+    """
+        The outdated programs were listed, jobs is None if winget could not be run
+    """
+
+    def __init__(self, jobs : Optional[List[WingetQueueMessage]]) -> None:
+        self.jobs = jobs
+
+def coalesceEvents(events : list) -> list:
+    """
+        Merges output events of the same job into a single event, keeping the
+        order of events relative to the other events of that job.
+        Progress events carry no data, only the first one is kept.
+    """
+    coalescedEvents = list()
+    openOutputEvents = dict()
+    hasProgressEvent = False
+
+    for event in events:
+        if isinstance(event, BatchProgressEvent):
+            if not hasProgressEvent:
+                coalescedEvents.append(event)
+                hasProgressEvent = True
+        elif isinstance(event, JobOutputEvent):
+            openOutputEvent = openOutputEvents.get(event.job)
+            if openOutputEvent is None:
+                openOutputEvent = JobOutputEvent(event.job, [event.text])
+                openOutputEvents[event.job] = openOutputEvent
+                coalescedEvents.append(openOutputEvent)
+            else:
+                openOutputEvent.text.append(event.text)
+        else:
+            openOutputEvents.pop(getattr(event, "job", None), None)
+            coalescedEvents.append(event)
+
+    for event in coalescedEvents:
+        if isinstance(event, JobOutputEvent):
+            event.text = "".join(event.text)
+
+    return coalescedEvents
+
+class UiEventPump:
+    """
+        Carries events from worker threads to the tkinter main loop.
+        Workers only post events, the main loop drains them in batches on a
+        fixed after() tick so the redraw cost depends on the tick rate and not
+        on how much output the workers produce.
+        recordRefresh(startPerfCounter, durationSeconds, numEvents) is called after
+        every tick that handled events, to measure how long the UI was busy.
+    """
+
+    def __init__(self, rootElement, handleEvent : Callable[[object], None], tickMilliseconds : int = DEFAULT_TICK_MILLISECONDS,
+                 recordRefresh : Optional[Callable[[float, float, int], None]] = None) -> None:
+        self.rootElement = rootElement
+        self.handleEvent = handleEvent
+        self.tickMilliseconds = tickMilliseconds
+        self.recordRefresh = recordRefresh
+        self.eventQueue = SimpleQueue()
+        self.afterId = None
+
+    def post(self, event) -> None:
+        """
+            Can be called from any thread
+        """
+        self.eventQueue.put(event)
+
+    def start(self) -> None:
+        if self.afterId is None:
+            self.afterId = self.rootElement.after(self.tickMilliseconds, self.tick)
+
+    def stop(self) -> None:
+        if self.afterId is not None:
+            self.rootElement.after_cancel(self.afterId)
+            self.afterId = None
+
+    def drain(self) -> list:
+        events = list()
+        try:
+            while len(events) < MAX_EVENTS_PER_TICK:
+                events.append(self.eventQueue.get_nowait())
+        except Empty:
+            pass
+        return events
+
+    def tick(self) -> None:
+        try:
+            startPerfCounter = time.perf_counter()
+            events = self.drain()
+            for event in coalesceEvents(events):
+                self.handleEvent(event)
+            if events and self.recordRefresh is not None:
+                self.recordRefresh(startPerfCounter, time.perf_counter() - startPerfCounter, len(events))
+        finally:
+            self.afterId = self.rootElement.after(self.tickMilliseconds, self.tick)
@@ -0,0 +1,112 @@
+import json
+import re
+from datetime import datetime
+from enum import Enum
+from typing import Dict, List, Optional
+
+from wingetJobs import WingetQueueMessage
+
+WINGET_IMPORT_SCHEMA = "https://aka.ms/winget-packages.schema.2.0.json"
+WINGET_SOURCE_DETAILS = {
+    "Argument" : "https://cdn.winget.microsoft.com/cache",
+    "Identifier" : "Microsoft.Winget.Source_8wekyb3d8bbwe",
+    "Name" : "winget",
+    "Type" : "Microsoft.PreIndexed.Package",
+}
+
+FOUND_PACKAGE_PATTERN = re.compile(r"^Found .* \[(?P<wingetId>[^\]\s]+)\]")
+ALREADY_INSTALLED_PATTERN = re.compile(r"already installed", re.IGNORECASE)
+NOT_FOUND_PATTERN = re.compile(r"package not found|no package found", re.IGNORECASE)
+SUCCESS_PATTERN = re.compile(r"^Successfully installed", re.IGNORECASE)
+
+class ImportResult(str, Enum):
+    INSTALLED = "installed",
+    ALREADY_INSTALLED = "already installed",
+    FAILED = "failed",
+    UNKNOWN = "unknown"
+
+def buildImportManifest(jobs : List[WingetQueueMessage]) -> dict:
+    """
+        Builds a winget import manifest (packages schema 2.0) for the given jobs
+    """
+    return {
+        "$schema" : WINGET_IMPORT_SCHEMA,
+        "CreationDate" : datetime.now().astimezone().isoformat(),
+        "Sources" : [
+            {
+                "Packages" : [{"PackageIdentifier" : job.wingetId} for job in jobs],
+                "SourceDetails" : WINGET_SOURCE_DETAILS,
+            }
+        ],
+    }
+
+def writeImportManifest(jobs : List[WingetQueueMessage], manifestPath : str) -> None:
+    with open(manifestPath, "w", encoding="utf-8") as manifestFile:
+        json.dump(buildImportManifest(jobs), manifestFile, indent=4)
+
+def buildWingetImportCommand(manifestPath : str, requireUserInput : bool, wingetExecutable : List[str] = ["winget"]) -> List[str]:
+    wingetOptions = [
+        *wingetExecutable, "import",
+        "--import-file", manifestPath,
+        "--accept-package-agreements",
+        "--accept-source-agreements",
+    ]
+
+    if requireUserInput == False:
+        wingetOptions.append("--disable-interactivity")
+
+    return wingetOptions
+
+class ImportOutputParser:
+    """
+        Splits the output of a single winget import run back into per package results.
+        Lines are fed one at a time, feed() returns the winget id of the package
+        the line belongs to so output can be routed to that package's log.
+    """
+
+    def __init__(self, wingetIds : List[str]) -> None:
+        self.wingetIdsByLowerCase = {wingetId.lower() : wingetId for wingetId in wingetIds}
+        self.results = {wingetId : ImportResult.UNKNOWN for wingetId in wingetIds}
+        self.currentWingetId = None
+
+    def findMentionedWingetId(self, line : str) -> Optional[str]:
+        for word in re.split(r"[\s:\[\]]+", line):
+            wingetId = self.wingetIdsByLowerCase.get(word.lower())
+            if wingetId is not None:
+                return wingetId
+        return None
+
+    def feed(self, line : str) -> Optional[str]:
+        foundPackage = FOUND_PACKAGE_PATTERN.match(line)
+        if foundPackage is not None:
+            wingetId = self.wingetIdsByLowerCase.get(foundPackage.group("wingetId").lower())
+            if wingetId is not None:
+                self.currentWingetId = wingetId
+                # a package counts as failed until winget reports otherwise
+                self.results[wingetId] = ImportResult.FAILED
+            return self.currentWingetId
+
+        if ALREADY_INSTALLED_PATTERN.search(line) or NOT_FOUND_PATTERN.search(line):
+            # these messages name the package and are not preceded by a "Found" line
+            wingetId = self.findMentionedWingetId(line) or self.currentWingetId
+            if wingetId is not None:
+                isAlreadyInstalled = ALREADY_INSTALLED_PATTERN.search(line) is not None
+                self.results[wingetId] = ImportResult.ALREADY_INSTALLED if isAlreadyInstalled else ImportResult.FAILED
+            return wingetId
+
+        if SUCCESS_PATTERN.match(line) and self.currentWingetId is not None:
+            self.results[self.currentWingetId] = ImportResult.INSTALLED
+
+        return self.currentWingetId
+
+    def getResults(self, returncode : int) -> Dict[str, ImportResult]:
+        """
+            Final per package results. When the whole import succeeded, packages
+            whose output could not be recognized are assumed to be installed.
+        """
+        if returncode != 0:
+            return dict(self.results)
+        return {
+            wingetId : ImportResult.INSTALLED if result == ImportResult.UNKNOWN else result
+            for wingetId, result in self.results.items()
+        }
@@ -0,0 +1,332 @@
+import shutil
+import tempfile
+from enum import Enum
+from queue import Queue
+from threading import Lock, Thread, Timer
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_NUM_DOWNLOAD_WORKERS = 4
+MAX_NUM_DOWNLOAD_WORKERS = 16
+
+class OperationType(str, Enum):
+    INSTALL = "install",
+    UNINSTALL = "uninstall",
+    UPGRADE = "upgrade"
+
+    def downloadsInstaller(self) -> bool:
+        return self in (OperationType.INSTALL, OperationType.UPGRADE)
+
+    def getPastTense(self) -> str:
+        return f"{self.value.rstrip('e')}ed"
+
+    def getPresentParticiple(self) -> str:
+        return f"{self.value.rstrip('e')}ing"
+
+class JobPhase(str, Enum):
+    DOWNLOAD = "download",
+    INSTALL = "install",
+    IMPORT = "import"
+
+class WingetQueueMessage:
+    def __init__(self, programName : str, wingetId : str, operation : OperationType) -> None:
+        self.programName = programName
+        self.wingetId = wingetId
+        self.operation = operation
+        self.downloadDirectory = None
+        # installer from the package cache, put into downloadDirectory by the download phase
+        self.installer = None
+        # exit code of the last winget run of this job, and why it failed
+        self.returncode = None
+        self.failureCategory = None
+        self.numRetries = 0
+        # jobs of the same batch that have to be finished before this job is installed / started at all
+        self.dependencies = list()
+        self.startAfter = list()
+
+def buildWingetCommand(job : WingetQueueMessage, phase : JobPhase, requireUserInput : bool, wingetExecutable : List[str] = ["winget"]) -> List[str]:
+    """
+        Builds the winget command line for a single phase of a job
+    """
+    if phase == JobPhase.DOWNLOAD:
+        wingetOptions = [*wingetExecutable, "download", "-e", "--id", job.wingetId, "--download-directory", job.downloadDirectory]
+    else:
+        wingetOptions = [*wingetExecutable, job.operation.value, "-e", "--id", job.wingetId]
+
+    if job.operation.downloadsInstaller():
+        wingetOptions.append("--accept-package-agreements")
+        wingetOptions.append("--accept-source-agreements")
+
+    if phase == JobPhase.DOWNLOAD or requireUserInput == False:
+        wingetOptions.append("--disable-interactivity")
+
+    if phase == JobPhase.INSTALL and requireUserInput == False:
+        wingetOptions.append("--silent")
+
+    return wingetOptions
+
+class ImportBatch:
+    """
+        Install jobs that are handled by a single winget import run
+    """
+
+    def __init__(self, jobs : List[WingetQueueMessage]) -> None:
+        self.jobs = jobs
+
+class JobCounters:
+    """
+        Job counters that can be safely updated from multiple worker threads
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.numJobs = 0
+        self.totalCompletedJobs = 0
+        self.successfulJobs = 0
+        self.failedJobs = 0
+        self.failureCategories = dict()
+
+    def reset(self, numJobs : int = 0) -> None:
+        with self.lock:
+            self.numJobs = numJobs
+            self.totalCompletedJobs = 0
+            self.successfulJobs = 0
+            self.failedJobs = 0
+            self.failureCategories = dict()
+
+    def addJobs(self, numJobs : int) -> None:
+        with self.lock:
+            self.numJobs += numJobs
+
+    def recordResult(self, handledSuccessfully : bool, failureCategory : Optional[str] = None) -> int:
+        """
+            Records the result of a finished job and returns the number of completed jobs.
+            failureCategory is counted even for successful jobs, e.g. already installed programs.
+        """
+        with self.lock:
+            if failureCategory is not None:
+                self.failureCategories[failureCategory] = self.failureCategories.get(failureCategory, 0) + 1
+            if handledSuccessfully:
+                self.successfulJobs += 1
+            else:
+                self.failedJobs += 1
+            self.totalCompletedJobs += 1
+            return self.totalCompletedJobs
+
+class WingetWorkerPool:
+    """
+        Runs winget jobs on a pool of worker threads.
+        Install jobs are split into a download phase, which runs in parallel on
+        up to numDownloadWorkers threads, and an install phase. Installer runs
+        are kept on a single thread because MSI installs cannot overlap.
+        With prefetchInstallers off there is no download phase, the install phase
+        downloads the installer itself.
+
+        handlePhase(job, phase) does the actual work of a phase and returns True on success.
+        onJobFinished(job, handledSuccessfully) is called once per job from a worker thread.
+        onAllJobsFinished() is called from a worker thread when every submitted job is done.
+        handleImportBatch(jobs), when given, installs a whole batch with one winget process
+        and returns a dict of job to True/False, or None for jobs that should fall back to
+        a per package run.
+        getRetryDelay(job, phase), when given, is called after a failed install phase and
+        returns the seconds after which the phase is retried, or None to fail the job.
+        The install thread moves on to other jobs while a retried job waits.
+        onJobQueued(job), when given, is called whenever a job is put on a queue.
+
+        A job is only queued for download once its startAfter jobs are finished, and is
+        only installed once its dependencies are finished.
+    """
+
+    STOP_WORKER = object()
+
+    def __init__(self, handlePhase : Callable[[WingetQueueMessage, JobPhase], bool],
+                 onJobFinished : Callable[[WingetQueueMessage, bool], None],
+                 onAllJobsFinished : Callable[[], None],
+                 numDownloadWorkers : int = DEFAULT_NUM_DOWNLOAD_WORKERS,
+                 handleImportBatch : Optional[Callable[[List[WingetQueueMessage]], Dict[WingetQueueMessage, Optional[bool]]]] = None,
+                 getRetryDelay : Optional[Callable[[WingetQueueMessage, JobPhase], Optional[float]]] = None,
+                 onJobQueued : Optional[Callable[[WingetQueueMessage], None]] = None) -> None:
+        self.handlePhase = handlePhase
+        self.getRetryDelay = getRetryDelay
+        self.onJobQueued = onJobQueued
+        self.onJobFinished = onJobFinished
+        self.onAllJobsFinished = onAllJobsFinished
+        self.handleImportBatch = handleImportBatch
+        self.prefetchInstallers = True
+        self.counters = JobCounters()
+
+        self.downloadQueue = Queue()
+        self.installQueue = Queue()
+        self.pendingJobsLock = Lock()
+        self.numPendingJobs = 0
+        self.finishedJobs = set()
+        self.heldJobs = list()
+        self.waitingInstalls = list()
+        self.numDownloadWorkers = 0
+
+        self.installThread = Thread(target=self.installThreadFunc, daemon=True)
+        self.installThread.start()
+        self.setNumDownloadWorkers(numDownloadWorkers)
+
+    def setNumDownloadWorkers(self, numDownloadWorkers : int) -> None:
+        """
+            Grows or shrinks the download worker pool. Should be called between batches.
+        """
+        numDownloadWorkers = max(1, min(numDownloadWorkers, MAX_NUM_DOWNLOAD_WORKERS))
+
+        while self.numDownloadWorkers < numDownloadWorkers:
+            Thread(target=self.downloadThreadFunc, daemon=True).start()
+            self.numDownloadWorkers += 1
+
+        while self.numDownloadWorkers > numDownloadWorkers:
+            self.downloadQueue.put(WingetWorkerPool.STOP_WORKER)
+            self.numDownloadWorkers -= 1
+
+    def submitBatch(self, jobs : List[WingetQueueMessage], useImport : bool = False) -> None:
+        """
+            Queues jobs for execution. With useImport, install jobs are handled by
+            a single winget import run on the install thread.
+        """
+        if not jobs:
+            self.onAllJobsFinished()
+            return
+
+        # count the whole batch up front so a fast first job can not look like the end of the batch
+        with self.pendingJobsLock:
+            self.numPendingJobs += len(jobs)
+        self.counters.addJobs(len(jobs))
+
+        if useImport and self.handleImportBatch is not None:
+            importJobs = [job for job in jobs if job.operation == OperationType.INSTALL]
+            if importJobs:
+                for job in importJobs:
+                    self.recordQueued(job)
+                self.installQueue.put(ImportBatch(importJobs))
+            jobs = [job for job in jobs if job.operation != OperationType.INSTALL]
+
+        self.queueJobs(jobs)
+
+    def queueJobs(self, jobs : List[WingetQueueMessage]) -> None:
+        """
+            Queues jobs of a submitted batch for download, jobs whose startAfter jobs
+            are not finished yet are held until they are
+        """
+        with self.pendingJobsLock:
+            for job in jobs:
+                if all(startAfterJob in self.finishedJobs for startAfterJob in job.startAfter):
+                    self.queueDownload(job)
+                else:
+                    self.heldJobs.append(job)
+
+    def stop(self) -> None:
+        for _ in range(self.numDownloadWorkers):
+            self.downloadQueue.put(WingetWorkerPool.STOP_WORKER)
+        self.numDownloadWorkers = 0
+        self.installQueue.put(WingetWorkerPool.STOP_WORKER)
+
+    def downloadThreadFunc(self) -> None:
+        while True:
+            job = self.downloadQueue.get()
+            if job is WingetWorkerPool.STOP_WORKER:
+                break
+
+            if self.prefetchInstallers and job.operation.downloadsInstaller():
+                job.downloadDirectory = tempfile.mkdtemp(prefix="simpleDownloader-")
+                # a failed download is not fatal, winget install will fetch the installer itself
+                self.runPhase(job, JobPhase.DOWNLOAD)
+
+            self.installQueue.put(job)
+
+    def installThreadFunc(self) -> None:
+        while True:
+            job = self.installQueue.get()
+            if job is WingetWorkerPool.STOP_WORKER:
+                break
+
+            if isinstance(job, ImportBatch):
+                self.runImportBatch(job)
+                continue
+
+            with self.pendingJobsLock:
+                if not all(dependency in self.finishedJobs for dependency in job.dependencies):
+                    # put back on the install queue by finishJob once its dependencies are installed
+                    self.waitingInstalls.append(job)
+                    continue
+
+            handledSuccessfully = self.runPhase(job, JobPhase.INSTALL)
+
+            if not handledSuccessfully and self.getRetryDelay is not None:
+                retryDelay = self.getRetryDelay(job, JobPhase.INSTALL)
+                if retryDelay is not None:
+                    # the downloaded installer is kept for the retry
+                    self.retryLater(job, retryDelay)
+                    continue
+
+            if job.downloadDirectory is not None:
+                shutil.rmtree(job.downloadDirectory, ignore_errors=True)
+                job.downloadDirectory = None
+                job.installer = None
+
+            self.finishJob(job, handledSuccessfully)
+
+    def runImportBatch(self, importBatch : ImportBatch) -> None:
+        try:
+            results = self.handleImportBatch(importBatch.jobs)
+        except Exception:
+            results = dict()
+
+        fallbackJobs = list()
+        for job in importBatch.jobs:
+            handledSuccessfully = results.get(job)
+            if handledSuccessfully is None:
+                fallbackJobs.append(job)
+            else:
+                self.finishJob(job, handledSuccessfully)
+
+        # fall back to a regular download + install run of these packages, in the order and
+        # with the exclusive groups of the schedule, once the imported jobs count as finished
+        self.queueJobs(fallbackJobs)
+
+    def recordQueued(self, job : WingetQueueMessage) -> None:
+        if self.onJobQueued is not None:
+            self.onJobQueued(job)
+
+    def queueDownload(self, job : WingetQueueMessage) -> None:
+        self.recordQueued(job)
+        self.downloadQueue.put(job)
+
+    def retryLater(self, job : WingetQueueMessage, delaySeconds : float) -> None:
+        # the job stays pending, so the batch is not finished while it waits
+        retryTimer = Timer(delaySeconds, self.installQueue.put, args=(job,))
+        retryTimer.daemon = True
+        retryTimer.start()
+
+    def runPhase(self, job : WingetQueueMessage, phase : JobPhase) -> bool:
+        try:
+            return self.handlePhase(job, phase)
+        except Exception:
+            return False
+
+    def finishJob(self, job : WingetQueueMessage, handledSuccessfully : bool) -> None:
+        self.counters.recordResult(handledSuccessfully, job.failureCategory.value if job.failureCategory is not None else None)
+        self.onJobFinished(job, handledSuccessfully)
+
+        with self.pendingJobsLock:
+            self.finishedJobs.add(job)
+            self.releaseJobs()
+            self.numPendingJobs -= 1
+            allJobsFinished = self.numPendingJobs == 0
+            if allJobsFinished:
+                self.finishedJobs.clear()
+
+        if allJobsFinished:
+            self.onAllJobsFinished()
+
+    def releaseJobs(self) -> None:
+        # must be called with pendingJobsLock held
+        for job in [job for job in self.heldJobs if all(startAfterJob in self.finishedJobs for startAfterJob in job.startAfter)]:
+            self.heldJobs.remove(job)
+            self.queueDownload(job)
+
+        for job in [job for job in self.waitingInstalls if all(dependency in self.finishedJobs for dependency in job.dependencies)]:
+            self.waitingInstalls.remove(job)
+            self.installQueue.put(job)